@@ -265,6 +265,59 @@ ALTER TABLE reservation_details
 GO
 
 
+-- ---------------------------------
+-- 5. SEARCH INDEXES
+-- ---------------------------------
+-- The GUI search matches names and emails by prefix (LIKE 'term%'), which
+-- seeks on these indexes. Emails, phones and category names are already
+-- covered by their UNIQUE constraints.
+
+-- Prefix search on author name
+CREATE NONCLUSTERED INDEX IX_author_name ON author (name);
+GO
+
+-- Prefix search on book title (fallback when full-text search is unavailable)
+CREATE NONCLUSTERED INDEX IX_book_title ON book (title);
+GO
+
+-- Prefix search on member names
+CREATE NONCLUSTERED INDEX IX_member_lname ON member (lname);
+GO
+
+CREATE NONCLUSTERED INDEX IX_member_fname ON member (fname);
+GO
+
+-- Prefix search on staff names
+CREATE NONCLUSTERED INDEX IX_staff_lname ON staff (lname);
+GO
+
+CREATE NONCLUSTERED INDEX IX_staff_fname ON staff (fname);
+GO
+
+
+-- ---------------------------------
+-- 6. FULL-TEXT SEARCH
+-- ---------------------------------
+-- Word searches on titles and descriptions use CONTAINS() against this
+-- catalog. Requires the Full-Text Search feature (SQL Server Express
+-- "with Advanced Services" or any higher edition); the GUI falls back to
+-- prefix search when these indexes are missing.
+
+CREATE FULLTEXT CATALOG ft_book_haven AS DEFAULT;
+GO
+
+-- Full-text index on book.title
+CREATE FULLTEXT INDEX ON book (title LANGUAGE 1033)
+    KEY INDEX PK_book ON ft_book_haven
+    WITH CHANGE_TRACKING AUTO;
+GO
+
+-- Full-text index on description.description
+CREATE FULLTEXT INDEX ON description (description LANGUAGE 1033)
+    KEY INDEX PK_description ON ft_book_haven
+    WITH CHANGE_TRACKING AUTO;
+GO
+
 -- Create the SQL Server Login (The credential to connect to the server)
 USE master;
 GO
@@ -0,0 +1,29 @@
+import argparse
+import time
+
+from migrate import add_connection_args, connect
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Close every open reservation past its expiration date and promote the waiting queues. "
+                    "Meant for a nightly scheduled task (SQL Server Express has no Agent).")
+    add_connection_args(parser)
+    parser.add_argument('--as-of', help='Expire reservations due before this date (YYYY-MM-DD, default today)')
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='Reservations closed per transaction; small batches keep locks row-level')
+    args = parser.parse_args()
+
+    conn = connect(args)
+    try:
+        started = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute("EXEC expire_reservations @as_of=?, @batch_size=?", [args.as_of, args.batch_size])
+        expired = cursor.fetchone()[0]
+        print(f"Expired {expired} reservation(s) in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
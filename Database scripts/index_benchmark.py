@@ -0,0 +1,190 @@
+import argparse
+import json
+import re
+import statistics
+import time
+import xml.etree.ElementTree as ET
+
+from migrate import add_connection_args, connect, migrate
+
+SHOWPLAN_NS = {'p': 'http://schemas.microsoft.com/sqlserver/2004/07/showplan'}
+
+# name: (query, query that samples parameter values from the loaded data).
+# VARCHAR parameters are cast the same way the GUI binds them, so plans match what the app gets.
+WORKLOAD = {
+    'member reservations': (
+        "SELECT reservation_id, reservation_date, expiration_date, returned_at FROM reservation WHERE member_id = ?",
+        "SELECT TOP 20 member_id FROM reservation GROUP BY member_id ORDER BY COUNT(*) DESC"),
+    'staff reservations': (
+        "SELECT reservation_id, reservation_date FROM reservation WHERE staff_id = ?",
+        "SELECT TOP 20 staff_id FROM staff ORDER BY staff_id"),
+    'copies of a book': (
+        "SELECT copy_id, status FROM book_copy WHERE ISBN = CAST(? AS VARCHAR(40))",
+        "SELECT TOP 20 ISBN FROM book_copy GROUP BY ISBN ORDER BY COUNT(*) DESC"),
+    'queue for a copy': (
+        "SELECT reservation_id, position_in_queue FROM reservation_details WHERE copy_id = ?",
+        "SELECT TOP 20 copy_id FROM reservation_details GROUP BY copy_id ORDER BY COUNT(*) DESC"),
+    'next queue position': (
+        "SELECT MAX(position_in_queue) FROM reservation_details WHERE copy_id = ? AND position_in_queue > 0",
+        "SELECT TOP 20 copy_id FROM reservation_details GROUP BY copy_id ORDER BY COUNT(*) DESC"),
+    'books by author': (
+        "SELECT ISBN FROM book_author WHERE author_id = ?",
+        "SELECT TOP 20 author_id FROM book_author GROUP BY author_id ORDER BY COUNT(*) DESC"),
+    'books in category': (
+        "SELECT ISBN FROM book_category WHERE category_id = ?",
+        "SELECT TOP 20 category_id FROM book_category GROUP BY category_id ORDER BY COUNT(*) DESC"),
+    'open overdue reservations': (
+        "SELECT reservation_id, member_id, expiration_date FROM reservation WHERE returned_at IS NULL AND expiration_date < ?",
+        "SELECT DISTINCT TOP 20 expiration_date FROM reservation ORDER BY expiration_date"),
+    'title prefix': (
+        "SELECT ISBN, title FROM book WHERE title LIKE CAST(? AS VARCHAR(256))",
+        "SELECT DISTINCT TOP 20 LEFT(title, 3) + '%' FROM book"),
+    'author name prefix': (
+        "SELECT author_id, name FROM author WHERE name LIKE CAST(? AS VARCHAR(201))",
+        "SELECT DISTINCT TOP 20 LEFT(name, 3) + '%' FROM author"),
+    'member history join': (
+        "SELECT r.reservation_id, rd.copy_id, bc.ISBN FROM reservation r "
+        "JOIN reservation_details rd ON rd.reservation_id = r.reservation_id "
+        "JOIN book_copy bc ON bc.copy_id = rd.copy_id WHERE r.member_id = ?",
+        "SELECT TOP 20 member_id FROM reservation GROUP BY member_id ORDER BY COUNT(*) DESC"),
+    'delete copy (FK check, rolled back)': (
+        "BEGIN TRAN; DELETE FROM reservation_details WHERE copy_id = ?; "
+        "DELETE FROM book_copy WHERE copy_id = ?; ROLLBACK TRAN;",
+        "SELECT TOP 20 copy_id, copy_id FROM book_copy ORDER BY copy_id DESC"),
+}
+
+
+def literal(value):
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def inline(query, params):
+    parts = query.split('?')
+    return ''.join(part + (literal(params[i]) if i < len(params) else '') for i, part in enumerate(parts))
+
+
+def drain(cursor):
+    reads = 0
+    while True:
+        reads += logical_reads(cursor)
+        if cursor.description:
+            cursor.fetchall()
+        if not cursor.nextset():
+            return reads
+
+
+def plan_summary(cursor, query, params):
+    cursor.execute("SET SHOWPLAN_XML ON")
+    try:
+        cursor.execute(inline(query, params))
+        plans = [row[0] for row in cursor.fetchall()]
+        while cursor.nextset():
+            plans.extend(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.execute("SET SHOWPLAN_XML OFF")
+    operators, cost = [], 0.0
+    for plan in plans:
+        root = ET.fromstring(plan)
+        for statement in root.iter('{%s}StmtSimple' % SHOWPLAN_NS['p']):
+            cost += float(statement.get('StatementSubTreeCost', 0))
+        for relop in root.iter('{%s}RelOp' % SHOWPLAN_NS['p']):
+            obj = relop.find('./*/p:Object', SHOWPLAN_NS)
+            if obj is not None:
+                index = (obj.get('Index') or obj.get('Table') or '').strip('[]')
+                operators.append(f"{relop.get('PhysicalOp')}({index})")
+    return operators, round(cost, 5)
+
+
+def logical_reads(cursor):
+    messages = getattr(cursor, 'messages', None) or []
+    return sum(int(match) for _, text in messages for match in re.findall(r'logical reads (\d+)', text))
+
+
+def run_workload(conn, iterations):
+    cursor = conn.cursor()
+    results = {}
+    for name, (query, sample_query) in WORKLOAD.items():
+        cursor.execute(sample_query)
+        samples = [list(row) for row in cursor.fetchall()]
+        if not samples:
+            print(f"  {name}: no sample data, skipped")
+            continue
+        operators, cost = plan_summary(cursor, query, samples[0])
+        timings, reads = [], []
+        cursor.execute("SET STATISTICS IO ON")
+        for i in range(iterations):
+            params = samples[i % len(samples)]
+            started = time.perf_counter()
+            cursor.execute(query, params)
+            reads.append(drain(cursor))
+            timings.append((time.perf_counter() - started) * 1000)
+        cursor.execute("SET STATISTICS IO OFF")
+        timings.sort()
+        results[name] = {
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'logical_reads': round(statistics.mean(reads), 1),
+            'plan_cost': cost,
+            'operators': operators,
+        }
+        print(f"  {name}: {results[name]['median_ms']} ms median, {results[name]['logical_reads']} reads, "
+              f"{', '.join(operators)}")
+    return results
+
+
+def compare(before, after):
+    print(f"{'query':38} {'before ms':>10} {'after ms':>10} {'speedup':>8} {'reads':>17}")
+    for name, old in before['queries'].items():
+        new = after['queries'].get(name)
+        if not new:
+            continue
+        speedup = old['median_ms'] / new['median_ms'] if new['median_ms'] else float('inf')
+        print(f"{name:38} {old['median_ms']:>10.3f} {new['median_ms']:>10.3f} {speedup:>7.1f}x "
+              f"{old['logical_reads']:>8} -> {new['logical_reads']:<6}")
+        if old['operators'] != new['operators']:
+            print(f"{'':38} plan: {', '.join(old['operators'])}")
+            print(f"{'':38}    -> {', '.join(new['operators'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the GUI's lookup/join workload and capture query plans, optionally around a migration.")
+    add_connection_args(parser)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--migrate', action='store_true',
+                        help='Run the workload, apply pending migrations, run it again and compare')
+    parser.add_argument('--target', type=int, help='With --migrate, stop after this migration version')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two saved result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        compare(before, after)
+        return
+
+    conn = connect(args)
+    try:
+        print("Running workload ...")
+        report = {'database': args.database, 'queries': run_workload(conn, args.iterations)}
+        if args.migrate:
+            applied = migrate(conn, args.target)
+            print(f"Applied migrations: {applied or 'none'}")
+            print("Running workload after migration ...")
+            report = {'database': args.database, 'before': report['queries'],
+                      'queries': run_workload(conn, args.iterations)}
+            compare({'queries': report['before']}, report)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import os
+import re
+import sys
+
+# The connection helpers are shared with the app and the bulk loader (GUI/database.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'GUI'))
+from database import add_connection_args, connect
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_PATTERN = re.compile(r'^(\d+)_(.+)\.sql$')
+BATCH_SEPARATOR = re.compile(r'^\s*GO\s*;?\s*$', re.IGNORECASE | re.MULTILINE)
+
+
+def split_batches(sql):
+    return [batch.strip() for batch in BATCH_SEPARATOR.split(sql) if batch.strip()]
+
+
+def available_migrations():
+    migrations = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_PATTERN.match(name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, name)))
+    return migrations
+
+
+def applied_versions(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        IF OBJECT_ID('dbo.schema_migrations') IS NULL
+            CREATE TABLE dbo.schema_migrations (
+                version INT NOT NULL CONSTRAINT PK_schema_migrations PRIMARY KEY,
+                name VARCHAR(200) NOT NULL,
+                applied_at DATETIME2 NOT NULL CONSTRAINT DF_schema_migrations_applied_at DEFAULT SYSUTCDATETIME()
+            )""")
+    cursor.execute("SELECT version FROM dbo.schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migration(conn, version, name, path):
+    with open(path, encoding='utf-8') as f:
+        batches = split_batches(f.read())
+    cursor = conn.cursor()
+    # Full-text DDL cannot run inside a user transaction, so each batch commits on its own;
+    # migrations are written with IF NOT EXISTS guards so a failed run can simply be re-run.
+    for batch in batches:
+        cursor.execute(batch)
+        while cursor.nextset():
+            pass
+    cursor.execute("INSERT INTO dbo.schema_migrations (version, name) VALUES (?, ?)", [version, name])
+
+
+def migrate(conn, target=None):
+    done = applied_versions(conn)
+    applied = []
+    for version, name, path in available_migrations():
+        if version in done or (target is not None and version > target):
+            continue
+        print(f"Applying {version:03d} {name} ...")
+        apply_migration(conn, version, name, path)
+        applied.append(version)
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending Book Haven schema migrations in version order.")
+    add_connection_args(parser)
+    parser.add_argument('--target', type=int, help='Stop after this migration version')
+    parser.add_argument('--list', action='store_true', help='Show migration status without applying anything')
+    args = parser.parse_args()
+
+    conn = connect(args)
+    try:
+        if args.list:
+            done = applied_versions(conn)
+            for version, name, _ in available_migrations():
+                print(f"{version:03d} {name}: {'applied' if version in done else 'pending'}")
+            return
+        applied = migrate(conn, args.target)
+        print(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+-- ---------------------------------
+-- Migration 001: secondary index pack
+-- ---------------------------------
+-- Nonclustered indexes for foreign-key columns (joins and the FK checks
+-- SQL Server runs on every parent-row delete) and for hot lookup columns.
+-- Every index is guarded so the migration is safe on databases that were
+-- created from a DDL script which already contains some of them.
+--
+-- Apply with:  python "Database scripts/migrate.py"
+
+
+-- FK: book.description_id (checked when a description is deleted)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_book_description_id' AND object_id = OBJECT_ID('dbo.book'))
+    CREATE NONCLUSTERED INDEX IX_book_description_id ON book (description_id);
+GO
+
+-- FK: book_author.author_id (the PK leads with ISBN, so author lookups scan without this)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_book_author_author_id' AND object_id = OBJECT_ID('dbo.book_author'))
+    CREATE NONCLUSTERED INDEX IX_book_author_author_id ON book_author (author_id);
+GO
+
+-- FK: book_category.category_id
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_book_category_category_id' AND object_id = OBJECT_ID('dbo.book_category'))
+    CREATE NONCLUSTERED INDEX IX_book_category_category_id ON book_category (category_id);
+GO
+
+-- FK: book_copy.ISBN, covering status so "copies of this book / how many available" never touches the base table
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_book_copy_ISBN' AND object_id = OBJECT_ID('dbo.book_copy'))
+    CREATE NONCLUSTERED INDEX IX_book_copy_ISBN ON book_copy (ISBN) INCLUDE (status);
+GO
+
+-- FK: reservation.member_id, covering the columns shown in a member's reservation history
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_reservation_member_id' AND object_id = OBJECT_ID('dbo.reservation'))
+    CREATE NONCLUSTERED INDEX IX_reservation_member_id ON reservation (member_id)
+        INCLUDE (reservation_date, expiration_date, returned_at);
+GO
+
+-- FK: reservation.staff_id
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_reservation_staff_id' AND object_id = OBJECT_ID('dbo.reservation'))
+    CREATE NONCLUSTERED INDEX IX_reservation_staff_id ON reservation (staff_id) INCLUDE (reservation_date);
+GO
+
+-- FK: reservation_details.copy_id (the PK leads with reservation_id), covering the queue position
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_reservation_details_copy_id' AND object_id = OBJECT_ID('dbo.reservation_details'))
+    CREATE NONCLUSTERED INDEX IX_reservation_details_copy_id ON reservation_details (copy_id) INCLUDE (position_in_queue);
+GO
+
+-- Filtered: only open reservations, ordered by due date, for overdue/expiry sweeps
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_reservation_open_expiration' AND object_id = OBJECT_ID('dbo.reservation'))
+    CREATE NONCLUSTERED INDEX IX_reservation_open_expiration ON reservation (expiration_date)
+        INCLUDE (member_id, staff_id)
+        WHERE returned_at IS NULL;
+GO
+
+-- Lookup: author name (prefix search); also created by the DDL script since the search indexes were added
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_author_name' AND object_id = OBJECT_ID('dbo.author'))
+    CREATE NONCLUSTERED INDEX IX_author_name ON author (name);
+GO
+
+-- Lookup: book title (prefix search); also created by the DDL script since the search indexes were added
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_book_title' AND object_id = OBJECT_ID('dbo.book'))
+    CREATE NONCLUSTERED INDEX IX_book_title ON book (title);
+GO
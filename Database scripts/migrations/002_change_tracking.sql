@@ -0,0 +1,68 @@
+-- ---------------------------------
+-- Migration 002: change tracking
+-- ---------------------------------
+-- Enables SQL Server Change Tracking on the database and every Book_haven
+-- table. The GUI keeps the version each view was read at and, on Refresh or
+-- auto-refresh, reads only the keys changed since then from CHANGETABLE.
+-- Change Tracking records primary keys and versions (deletes included)
+-- without adding columns, so SELECT * and the edit forms are unaffected.
+--
+-- Apply with:  python "Database scripts/migrate.py"
+
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_databases WHERE database_id = DB_ID())
+BEGIN
+    DECLARE @sql NVARCHAR(400) = N'ALTER DATABASE ' + QUOTENAME(DB_NAME())
+        + N' SET CHANGE_TRACKING = ON (CHANGE_RETENTION = 2 DAYS, AUTO_CLEANUP = ON)';
+    EXEC (@sql);
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.author'))
+    ALTER TABLE author ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.description'))
+    ALTER TABLE description ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.category'))
+    ALTER TABLE category ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.book'))
+    ALTER TABLE book ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.book_author'))
+    ALTER TABLE book_author ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.book_category'))
+    ALTER TABLE book_category ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.book_copy'))
+    ALTER TABLE book_copy ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.member'))
+    ALTER TABLE member ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.staff'))
+    ALTER TABLE staff ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.reservation'))
+    ALTER TABLE reservation ENABLE CHANGE_TRACKING;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.reservation_details'))
+    ALTER TABLE reservation_details ENABLE CHANGE_TRACKING;
+GO
+
+-- CHANGETABLE needs VIEW CHANGE TRACKING in addition to SELECT
+IF DATABASE_PRINCIPAL_ID('flask_book_user') IS NOT NULL
+    GRANT VIEW CHANGE TRACKING ON SCHEMA::dbo TO flask_book_user;
+GO
@@ -0,0 +1,160 @@
+-- ---------------------------------
+-- Migration 003: book catalog summary
+-- ---------------------------------
+-- One row per ISBN with the book's authors, categories, copy counts and a
+-- description snippet, for the GUI's Catalog screen. An indexed view cannot
+-- hold STRING_AGG or outer joins, so this is a summary table kept current by
+-- triggers on the seven source tables through refresh_book_catalog.
+--
+-- Apply with:  python "Database scripts/migrate.py"
+
+
+IF OBJECT_ID('dbo.book_catalog') IS NULL
+    CREATE TABLE book_catalog (
+        ISBN VARCHAR(40) NOT NULL CONSTRAINT PK_book_catalog PRIMARY KEY,
+        title VARCHAR(255) NOT NULL,
+        publication_year INT,
+        authors VARCHAR(1000),
+        categories VARCHAR(500),
+        total_copies INT NOT NULL,
+        available_copies INT NOT NULL,
+        description_snippet VARCHAR(200)
+    );
+GO
+
+-- Prefix search on the catalog title
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_book_catalog_title' AND object_id = OBJECT_ID('dbo.book_catalog'))
+    CREATE NONCLUSTERED INDEX IX_book_catalog_title ON book_catalog (title);
+GO
+
+IF TYPE_ID('dbo.isbn_list') IS NULL
+    CREATE TYPE isbn_list AS TABLE (ISBN VARCHAR(40) NOT NULL PRIMARY KEY);
+GO
+
+-- Rebuilds the catalog rows of the given ISBNs; rows of deleted books are removed
+CREATE OR ALTER PROCEDURE refresh_book_catalog @isbns isbn_list READONLY
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DELETE c FROM book_catalog c JOIN @isbns i ON i.ISBN = c.ISBN;
+
+    INSERT INTO book_catalog (ISBN, title, publication_year, authors, categories,
+                              total_copies, available_copies, description_snippet)
+    SELECT b.ISBN, b.title, b.publication_year,
+           (SELECT LEFT(STRING_AGG(a.name, ', ') WITHIN GROUP (ORDER BY a.name), 1000)
+            FROM book_author ba JOIN author a ON a.author_id = ba.author_id
+            WHERE ba.ISBN = b.ISBN),
+           (SELECT LEFT(STRING_AGG(c.category_name, ', ') WITHIN GROUP (ORDER BY c.category_name), 500)
+            FROM book_category bc JOIN category c ON c.category_id = bc.category_id
+            WHERE bc.ISBN = b.ISBN),
+           ISNULL(copies.total, 0), ISNULL(copies.available, 0),
+           LEFT(d.description, 200)
+    FROM book b
+    JOIN @isbns i ON i.ISBN = b.ISBN
+    LEFT JOIN description d ON d.description_id = b.description_id
+    OUTER APPLY (SELECT COUNT(*) AS total, SUM(CASE WHEN bc.status = 'Available' THEN 1 ELSE 0 END) AS available
+                 FROM book_copy bc WHERE bc.ISBN = b.ISBN) AS copies;
+END
+GO
+
+CREATE OR ALTER TRIGGER TR_book_catalog_book ON book AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @isbns isbn_list;
+    INSERT INTO @isbns SELECT ISBN FROM inserted UNION SELECT ISBN FROM deleted;
+    IF EXISTS (SELECT 1 FROM @isbns)
+        EXEC refresh_book_catalog @isbns;
+END
+GO
+
+CREATE OR ALTER TRIGGER TR_book_catalog_book_author ON book_author AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @isbns isbn_list;
+    INSERT INTO @isbns SELECT ISBN FROM inserted UNION SELECT ISBN FROM deleted;
+    IF EXISTS (SELECT 1 FROM @isbns)
+        EXEC refresh_book_catalog @isbns;
+END
+GO
+
+CREATE OR ALTER TRIGGER TR_book_catalog_book_category ON book_category AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @isbns isbn_list;
+    INSERT INTO @isbns SELECT ISBN FROM inserted UNION SELECT ISBN FROM deleted;
+    IF EXISTS (SELECT 1 FROM @isbns)
+        EXEC refresh_book_catalog @isbns;
+END
+GO
+
+CREATE OR ALTER TRIGGER TR_book_catalog_book_copy ON book_copy AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    -- Condition and price edits do not change the counts
+    IF EXISTS (SELECT 1 FROM inserted) AND EXISTS (SELECT 1 FROM deleted) AND NOT (UPDATE(status) OR UPDATE(ISBN))
+        RETURN;
+    DECLARE @isbns isbn_list;
+    INSERT INTO @isbns SELECT ISBN FROM inserted UNION SELECT ISBN FROM deleted;
+    IF EXISTS (SELECT 1 FROM @isbns)
+        EXEC refresh_book_catalog @isbns;
+END
+GO
+
+-- Renames reach every book that references the row (deletes are blocked by the foreign keys)
+CREATE OR ALTER TRIGGER TR_book_catalog_author ON author AFTER UPDATE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @isbns isbn_list;
+    INSERT INTO @isbns SELECT DISTINCT ba.ISBN FROM book_author ba JOIN inserted i ON i.author_id = ba.author_id;
+    IF EXISTS (SELECT 1 FROM @isbns)
+        EXEC refresh_book_catalog @isbns;
+END
+GO
+
+CREATE OR ALTER TRIGGER TR_book_catalog_category ON category AFTER UPDATE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @isbns isbn_list;
+    INSERT INTO @isbns SELECT DISTINCT bc.ISBN FROM book_category bc JOIN inserted i ON i.category_id = bc.category_id;
+    IF EXISTS (SELECT 1 FROM @isbns)
+        EXEC refresh_book_catalog @isbns;
+END
+GO
+
+CREATE OR ALTER TRIGGER TR_book_catalog_description ON description AFTER UPDATE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @isbns isbn_list;
+    INSERT INTO @isbns SELECT b.ISBN FROM book b JOIN inserted i ON i.description_id = b.description_id;
+    IF EXISTS (SELECT 1 FROM @isbns)
+        EXEC refresh_book_catalog @isbns;
+END
+GO
+
+-- Initial build for the books already loaded
+DECLARE @isbns isbn_list;
+INSERT INTO @isbns SELECT ISBN FROM book;
+EXEC refresh_book_catalog @isbns;
+GO
+
+-- Word search over titles, authors and categories where Full-Text Search is installed
+IF EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = 'ft_book_haven')
+   AND NOT EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('dbo.book_catalog'))
+    CREATE FULLTEXT INDEX ON book_catalog (title LANGUAGE 1033, authors LANGUAGE 1033, categories LANGUAGE 1033)
+        KEY INDEX PK_book_catalog ON ft_book_haven
+        WITH CHANGE_TRACKING AUTO;
+GO
+
+-- Delta refresh for the Catalog screen (migration 002)
+IF EXISTS (SELECT 1 FROM sys.change_tracking_databases WHERE database_id = DB_ID())
+   AND NOT EXISTS (SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID('dbo.book_catalog'))
+    ALTER TABLE book_catalog ENABLE CHANGE_TRACKING;
+GO
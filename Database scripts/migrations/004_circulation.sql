@@ -0,0 +1,231 @@
+-- ---------------------------------
+-- Migration 004: circulation procedures
+-- ---------------------------------
+-- Reserve, return, expire and queue promotion as set-based procedures, so
+-- queue positions are assigned on the server instead of typed in by hand.
+--
+-- Queue model: for each copy, the open reservations (returned_at IS NULL)
+-- hold positions 1..n without gaps; position 1 is the member the copy is
+-- held for or lent to. Closed reservations keep their detail rows with
+-- position 0. A filtered unique index enforces one holder per position.
+--
+-- Locking: every procedure first takes update locks on the affected
+-- book_copy rows in copy_id order, so concurrent desks serialize per copy
+-- (never per table) and always lock in the same order.
+--
+-- Apply with:  python "Database scripts/migrate.py"
+
+
+-- Expired holds are closed like returns but flagged, so history tells them apart
+IF COL_LENGTH('dbo.reservation', 'expired') IS NULL
+    ALTER TABLE reservation ADD expired BIT NOT NULL CONSTRAINT DF_reservation_expired DEFAULT 0;
+GO
+
+-- Existing data: closed reservations leave the queue, open ones are renumbered 1..n per copy
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_reservation_details_queue' AND object_id = OBJECT_ID('dbo.reservation_details'))
+BEGIN
+    UPDATE rd SET position_in_queue = 0
+    FROM reservation_details rd JOIN reservation r ON r.reservation_id = rd.reservation_id
+    WHERE r.returned_at IS NOT NULL AND rd.position_in_queue <> 0;
+
+    WITH queue AS (
+        SELECT rd.position_in_queue,
+               ROW_NUMBER() OVER (PARTITION BY rd.copy_id ORDER BY rd.position_in_queue, rd.reservation_id) AS position
+        FROM reservation_details rd JOIN reservation r ON r.reservation_id = rd.reservation_id
+        WHERE r.returned_at IS NULL)
+    UPDATE queue SET position_in_queue = position WHERE position_in_queue <> position;
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.check_constraints WHERE name = 'CK_reservation_details_position')
+    ALTER TABLE reservation_details ADD CONSTRAINT CK_reservation_details_position CHECK (position_in_queue >= 0);
+GO
+
+-- One reservation per queue slot; the next free position is a single backward seek
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_reservation_details_queue' AND object_id = OBJECT_ID('dbo.reservation_details'))
+    CREATE UNIQUE NONCLUSTERED INDEX UX_reservation_details_queue ON reservation_details (copy_id, position_in_queue)
+        INCLUDE (reservation_id)
+        WHERE position_in_queue > 0;
+GO
+
+IF TYPE_ID('dbo.id_list') IS NULL
+    CREATE TYPE id_list AS TABLE (id INT NOT NULL PRIMARY KEY);
+GO
+
+-- Closes up each copy's queue to 1..n and sets copy status from it.
+-- Callers hold the book_copy update locks.
+CREATE OR ALTER PROCEDURE promote_queue @copies id_list READONLY
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    WITH queue AS (
+        SELECT rd.position_in_queue,
+               ROW_NUMBER() OVER (PARTITION BY rd.copy_id ORDER BY rd.position_in_queue, rd.reservation_id) AS position
+        FROM reservation_details rd JOIN @copies c ON c.id = rd.copy_id
+        WHERE rd.position_in_queue > 0)
+    UPDATE queue SET position_in_queue = position WHERE position_in_queue <> position;
+
+    -- Damaged and lost copies keep their status
+    UPDATE bc SET status = CASE
+            WHEN bc.status = 'Checked Out' THEN bc.status
+            WHEN EXISTS (SELECT 1 FROM reservation_details rd WHERE rd.copy_id = bc.copy_id AND rd.position_in_queue > 0)
+                THEN 'Reserved'
+            ELSE 'Available' END
+    FROM book_copy bc JOIN @copies c ON c.id = bc.copy_id
+    WHERE bc.status IS NULL OR bc.status IN ('Available', 'Reserved', 'Checked Out');
+END
+GO
+
+-- Creates a reservation (or adds copies to an open one) and queues each copy
+-- at the next free position. Returns one row per copy with its position.
+CREATE OR ALTER PROCEDURE reserve_copies
+    @copies id_list READONLY,
+    @member_id INT = NULL,
+    @staff_id INT = NULL,
+    @loan_days INT = 14,
+    @reservation_id INT = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRANSACTION;
+
+    DECLARE @locked INT;
+    SELECT @locked = COUNT(*) FROM book_copy WITH (UPDLOCK, ROWLOCK, HOLDLOCK)
+    WHERE copy_id IN (SELECT id FROM @copies);
+    IF @locked < (SELECT COUNT(*) FROM @copies)
+        THROW 50001, 'One or more copies do not exist.', 1;
+    IF EXISTS (SELECT 1 FROM book_copy bc JOIN @copies c ON c.id = bc.copy_id WHERE bc.status IN ('Damaged', 'Lost'))
+        THROW 50002, 'Damaged or lost copies cannot be reserved.', 1;
+
+    IF @reservation_id IS NULL
+    BEGIN
+        IF @member_id IS NULL OR @staff_id IS NULL
+            THROW 50003, 'A new reservation needs a member and a staff member.', 1;
+        INSERT INTO reservation (member_id, staff_id, reservation_date, expiration_date)
+        VALUES (@member_id, @staff_id, CAST(GETDATE() AS DATE), DATEADD(DAY, @loan_days, CAST(GETDATE() AS DATE)));
+        SET @reservation_id = SCOPE_IDENTITY();
+    END
+    ELSE
+    BEGIN
+        SELECT @member_id = member_id FROM reservation WITH (UPDLOCK) WHERE reservation_id = @reservation_id AND returned_at IS NULL;
+        IF @member_id IS NULL
+            THROW 50004, 'The reservation does not exist or is already closed.', 1;
+    END
+
+    IF EXISTS (SELECT 1 FROM reservation_details rd
+               JOIN reservation r ON r.reservation_id = rd.reservation_id
+               JOIN @copies c ON c.id = rd.copy_id
+               WHERE r.member_id = @member_id AND rd.position_in_queue > 0)
+        THROW 50005, 'The member is already queued for one or more of these copies.', 1;
+
+    INSERT INTO reservation_details (reservation_id, copy_id, position_in_queue)
+    SELECT @reservation_id, c.id, ISNULL(q.last_position, 0) + 1
+    FROM @copies c
+    OUTER APPLY (SELECT MAX(rd.position_in_queue) AS last_position FROM reservation_details rd
+                 WHERE rd.copy_id = c.id AND rd.position_in_queue > 0) AS q;
+
+    EXEC promote_queue @copies;
+
+    COMMIT TRANSACTION;
+
+    SELECT rd.reservation_id, rd.copy_id, rd.position_in_queue
+    FROM reservation_details rd JOIN @copies c ON c.id = rd.copy_id
+    WHERE rd.reservation_id = @reservation_id
+    ORDER BY rd.copy_id;
+END
+GO
+
+-- Shared by return and expiry: closes the open reservations given, takes them
+-- out of their copies' queues and promotes whoever is next.
+CREATE OR ALTER PROCEDURE close_reservations
+    @reservations id_list READONLY,
+    @closed_on DATE,
+    @expired BIT,
+    @closed INT OUTPUT
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @copies id_list;
+    INSERT INTO @copies SELECT DISTINCT rd.copy_id
+    FROM reservation_details rd JOIN @reservations r ON r.id = rd.reservation_id;
+
+    BEGIN TRANSACTION;
+
+    DECLARE @locked INT;
+    SELECT @locked = COUNT(*) FROM book_copy WITH (UPDLOCK, ROWLOCK, HOLDLOCK)
+    WHERE copy_id IN (SELECT id FROM @copies);
+
+    UPDATE res SET returned_at = @closed_on, expired = @expired
+    FROM reservation res JOIN @reservations r ON r.id = res.reservation_id
+    WHERE res.returned_at IS NULL;
+    SET @closed = @@ROWCOUNT;
+
+    -- A returned copy is back on the shelf; an expired hold never had it lent out
+    IF @expired = 0
+        UPDATE bc SET status = 'Available'
+        FROM book_copy bc
+        JOIN reservation_details rd ON rd.copy_id = bc.copy_id
+        JOIN @reservations r ON r.id = rd.reservation_id
+        WHERE rd.position_in_queue = 1 AND bc.status = 'Checked Out';
+
+    UPDATE rd SET position_in_queue = 0
+    FROM reservation_details rd JOIN @reservations r ON r.id = rd.reservation_id
+    WHERE rd.position_in_queue > 0;
+
+    EXEC promote_queue @copies;
+
+    COMMIT TRANSACTION;
+END
+GO
+
+CREATE OR ALTER PROCEDURE return_reservations @reservations id_list READONLY
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @today DATE = CAST(GETDATE() AS DATE), @closed INT;
+    EXEC close_reservations @reservations, @today, 0, @closed OUTPUT;
+    SELECT @closed AS returned;
+END
+GO
+
+-- Batch job: closes every open reservation past its expiration date. Works in
+-- batches of @batch_size, each its own transaction, so locks stay row-level and short.
+CREATE OR ALTER PROCEDURE expire_reservations @as_of DATE = NULL, @batch_size INT = 500
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    SET @as_of = ISNULL(@as_of, CAST(GETDATE() AS DATE));
+
+    DECLARE @batch id_list, @closed INT, @expired INT = 0;
+    WHILE 1 = 1
+    BEGIN
+        DELETE FROM @batch;
+        -- Seeks the filtered open-reservation index from migration 001
+        INSERT INTO @batch SELECT TOP (@batch_size) reservation_id FROM reservation
+        WHERE returned_at IS NULL AND expiration_date < @as_of
+        ORDER BY expiration_date;
+        IF @@ROWCOUNT = 0
+            BREAK;
+        EXEC close_reservations @batch, @as_of, 1, @closed OUTPUT;
+        SET @expired += @closed;
+    END
+
+    SELECT @expired AS expired;
+END
+GO
+
+-- Circulation runs through these procedures
+IF DATABASE_PRINCIPAL_ID('flask_book_user') IS NOT NULL
+BEGIN
+    GRANT EXECUTE ON OBJECT::reserve_copies TO flask_book_user;
+    GRANT EXECUTE ON OBJECT::return_reservations TO flask_book_user;
+    GRANT EXECUTE ON OBJECT::expire_reservations TO flask_book_user;
+    GRANT EXECUTE ON TYPE::id_list TO flask_book_user;
+END
+GO
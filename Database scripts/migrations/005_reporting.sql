@@ -0,0 +1,312 @@
+-- ---------------------------------
+-- Migration 005: reporting summaries
+-- ---------------------------------
+-- Summary tables for the GUI's Reports screen and the Power BI dashboard,
+-- so neither aggregates over the full reservation history.
+--
+-- refresh_reports reads the reservations changed since its last run from
+-- Change Tracking (migration 002), replaces their rows in two fact
+-- snapshots, and recounts only the summary rows those reservations fell in
+-- before or after the change: their reservation dates, open due dates and
+-- copies. A run costs what changed since the last one, not the history.
+-- The first run, --full, or a gap longer than the Change Tracking retention
+-- (2 days) rebuilds everything.
+--
+-- Run after this migration and then on a schedule:
+--     python "Database scripts/refresh_reports.py"
+--
+-- Apply with:  python "Database scripts/migrate.py"
+
+
+-- One row per reservation, as of the last refresh. Holds the values the
+-- summaries were counted from, so a changed reservation can be taken out of
+-- the rows it used to count in.
+IF OBJECT_ID('dbo.report_reservation_facts') IS NULL
+CREATE TABLE report_reservation_facts (
+    reservation_id INT NOT NULL,
+    reservation_date DATE NOT NULL,
+    staff_id INT NOT NULL,
+    member_id INT NOT NULL,
+    expiration_date DATE NOT NULL,
+    returned_at DATE,
+    expired BIT NOT NULL,
+    copies INT NOT NULL
+);
+GO
+
+-- One row per reserved copy, as of the last refresh
+IF OBJECT_ID('dbo.report_loan_facts') IS NULL
+CREATE TABLE report_loan_facts (
+    reservation_id INT NOT NULL,
+    copy_id INT NOT NULL,
+    reservation_date DATE NOT NULL,
+    is_open BIT NOT NULL,
+    days_reserved INT
+);
+GO
+
+-- Reservations made per day by each staff member, and how they ended
+IF OBJECT_ID('dbo.report_daily_staff') IS NULL
+CREATE TABLE report_daily_staff (
+    reservation_date DATE NOT NULL,
+    staff_id INT NOT NULL,
+    reservations INT NOT NULL,
+    copies INT NOT NULL,
+    returned INT NOT NULL,
+    expired INT NOT NULL
+);
+GO
+
+-- Reservations made per day for each member
+IF OBJECT_ID('dbo.report_daily_member') IS NULL
+CREATE TABLE report_daily_member (
+    reservation_date DATE NOT NULL,
+    member_id INT NOT NULL,
+    reservations INT NOT NULL,
+    copies INT NOT NULL
+);
+GO
+
+-- Open reservations by due date; overdue is every row before today
+IF OBJECT_ID('dbo.report_open_by_due_date') IS NULL
+CREATE TABLE report_open_by_due_date (
+    expiration_date DATE NOT NULL,
+    reservations INT NOT NULL,
+    copies INT NOT NULL
+);
+GO
+
+-- Lifetime use of each copy that has ever been reserved
+IF OBJECT_ID('dbo.report_copy_usage') IS NULL
+CREATE TABLE report_copy_usage (
+    copy_id INT NOT NULL,
+    loans INT NOT NULL,
+    open_loans INT NOT NULL,
+    days_reserved INT NOT NULL,
+    last_reserved DATE NOT NULL
+);
+GO
+
+IF OBJECT_ID('dbo.report_refresh') IS NULL
+CREATE TABLE report_refresh (
+    refresh_id INT NOT NULL,
+    last_version BIGINT NOT NULL,
+    refreshed_at DATETIME2 NOT NULL,
+    full_rebuild BIT NOT NULL,
+    changed_reservations INT NOT NULL,
+    duration_ms INT NOT NULL
+);
+GO
+
+IF OBJECT_ID('dbo.PK_report_reservation_facts') IS NULL
+    ALTER TABLE report_reservation_facts ADD CONSTRAINT PK_report_reservation_facts PRIMARY KEY (reservation_id);
+GO
+
+IF OBJECT_ID('dbo.PK_report_loan_facts') IS NULL
+    ALTER TABLE report_loan_facts ADD CONSTRAINT PK_report_loan_facts PRIMARY KEY (reservation_id, copy_id);
+GO
+
+IF OBJECT_ID('dbo.PK_report_daily_staff') IS NULL
+    ALTER TABLE report_daily_staff ADD CONSTRAINT PK_report_daily_staff PRIMARY KEY (reservation_date, staff_id);
+GO
+
+IF OBJECT_ID('dbo.PK_report_daily_member') IS NULL
+    ALTER TABLE report_daily_member ADD CONSTRAINT PK_report_daily_member PRIMARY KEY (reservation_date, member_id);
+GO
+
+IF OBJECT_ID('dbo.PK_report_open_by_due_date') IS NULL
+    ALTER TABLE report_open_by_due_date ADD CONSTRAINT PK_report_open_by_due_date PRIMARY KEY (expiration_date);
+GO
+
+IF OBJECT_ID('dbo.PK_report_copy_usage') IS NULL
+    ALTER TABLE report_copy_usage ADD CONSTRAINT PK_report_copy_usage PRIMARY KEY (copy_id);
+GO
+
+IF OBJECT_ID('dbo.PK_report_refresh') IS NULL
+    ALTER TABLE report_refresh ADD CONSTRAINT PK_report_refresh PRIMARY KEY (refresh_id);
+GO
+
+-- Recounts read the facts of one reservation date, due date or copy at a time
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_report_reservation_facts_date' AND object_id = OBJECT_ID('dbo.report_reservation_facts'))
+    CREATE NONCLUSTERED INDEX IX_report_reservation_facts_date ON report_reservation_facts (reservation_date)
+        INCLUDE (staff_id, member_id, returned_at, expired, copies);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_report_reservation_facts_open_due' AND object_id = OBJECT_ID('dbo.report_reservation_facts'))
+    CREATE NONCLUSTERED INDEX IX_report_reservation_facts_open_due ON report_reservation_facts (expiration_date)
+        INCLUDE (copies)
+        WHERE returned_at IS NULL;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_report_loan_facts_copy_id' AND object_id = OBJECT_ID('dbo.report_loan_facts'))
+    CREATE NONCLUSTERED INDEX IX_report_loan_facts_copy_id ON report_loan_facts (copy_id)
+        INCLUDE (reservation_date, is_open, days_reserved);
+GO
+
+-- Dates the refresh has to recount
+IF TYPE_ID('dbo.date_list') IS NULL
+    CREATE TYPE date_list AS TABLE (day DATE NOT NULL PRIMARY KEY);
+GO
+
+-- Brings the summaries up to date with the reservations changed since the last
+-- run. Returns whether it rebuilt everything and how many reservations it re-read.
+-- Runs as owner because TRUNCATE needs ALTER on the tables, which the app login lacks.
+CREATE OR ALTER PROCEDURE refresh_reports @full BIT = 0
+WITH EXECUTE AS OWNER
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @started DATETIME2 = SYSUTCDATETIME();
+    -- Read before the changes, so anything committed during the run is picked up again next time
+    DECLARE @version BIGINT = CHANGE_TRACKING_CURRENT_VERSION();
+    DECLARE @last BIGINT = (SELECT last_version FROM report_refresh WHERE refresh_id = 1);
+    IF @last IS NULL
+       OR @last < CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('dbo.reservation'))
+       OR @last < CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('dbo.reservation_details'))
+        SET @full = 1;
+
+    DECLARE @changed id_list, @dates date_list, @due date_list, @copies id_list;
+
+    BEGIN TRANSACTION;
+
+    IF @full = 1
+    BEGIN
+        TRUNCATE TABLE report_reservation_facts;
+        TRUNCATE TABLE report_loan_facts;
+        TRUNCATE TABLE report_daily_staff;
+        TRUNCATE TABLE report_daily_member;
+        TRUNCATE TABLE report_open_by_due_date;
+        TRUNCATE TABLE report_copy_usage;
+        INSERT INTO @changed SELECT reservation_id FROM reservation;
+    END
+    ELSE
+        INSERT INTO @changed
+        SELECT reservation_id FROM CHANGETABLE(CHANGES reservation, @last) AS c
+        UNION
+        SELECT reservation_id FROM CHANGETABLE(CHANGES reservation_details, @last) AS c;
+
+    -- Summary rows the changed reservations counted in before the change...
+    INSERT INTO @dates SELECT DISTINCT f.reservation_date FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id;
+    INSERT INTO @due SELECT DISTINCT f.expiration_date FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id
+                     WHERE f.returned_at IS NULL;
+    INSERT INTO @copies SELECT DISTINCT f.copy_id FROM report_loan_facts f JOIN @changed c ON c.id = f.reservation_id;
+
+    DELETE f FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id;
+    DELETE f FROM report_loan_facts f JOIN @changed c ON c.id = f.reservation_id;
+
+    INSERT INTO report_reservation_facts (reservation_id, reservation_date, staff_id, member_id, expiration_date,
+                                          returned_at, expired, copies)
+    SELECT r.reservation_id, r.reservation_date, r.staff_id, r.member_id, r.expiration_date, r.returned_at, r.expired,
+           (SELECT COUNT(*) FROM reservation_details rd WHERE rd.reservation_id = r.reservation_id)
+    FROM reservation r JOIN @changed c ON c.id = r.reservation_id;
+
+    INSERT INTO report_loan_facts (reservation_id, copy_id, reservation_date, is_open, days_reserved)
+    SELECT rd.reservation_id, rd.copy_id, r.reservation_date,
+           CASE WHEN r.returned_at IS NULL THEN 1 ELSE 0 END,
+           DATEDIFF(DAY, r.reservation_date, r.returned_at)
+    FROM reservation_details rd
+    JOIN @changed c ON c.id = rd.reservation_id
+    JOIN reservation r ON r.reservation_id = rd.reservation_id;
+
+    -- ...and the rows they count in now
+    INSERT INTO @dates SELECT DISTINCT f.reservation_date FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id
+                       WHERE NOT EXISTS (SELECT 1 FROM @dates d WHERE d.day = f.reservation_date);
+    INSERT INTO @due SELECT DISTINCT f.expiration_date FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id
+                     WHERE f.returned_at IS NULL AND NOT EXISTS (SELECT 1 FROM @due d WHERE d.day = f.expiration_date);
+    INSERT INTO @copies SELECT DISTINCT f.copy_id FROM report_loan_facts f JOIN @changed c ON c.id = f.reservation_id
+                        WHERE NOT EXISTS (SELECT 1 FROM @copies p WHERE p.id = f.copy_id);
+
+    DELETE s FROM report_daily_staff s JOIN @dates d ON d.day = s.reservation_date;
+    INSERT INTO report_daily_staff (reservation_date, staff_id, reservations, copies, returned, expired)
+    SELECT f.reservation_date, f.staff_id, COUNT(*), SUM(f.copies),
+           SUM(CASE WHEN f.returned_at IS NOT NULL AND f.expired = 0 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN f.expired = 1 THEN 1 ELSE 0 END)
+    FROM report_reservation_facts f JOIN @dates d ON d.day = f.reservation_date
+    GROUP BY f.reservation_date, f.staff_id;
+
+    DELETE m FROM report_daily_member m JOIN @dates d ON d.day = m.reservation_date;
+    INSERT INTO report_daily_member (reservation_date, member_id, reservations, copies)
+    SELECT f.reservation_date, f.member_id, COUNT(*), SUM(f.copies)
+    FROM report_reservation_facts f JOIN @dates d ON d.day = f.reservation_date
+    GROUP BY f.reservation_date, f.member_id;
+
+    DELETE o FROM report_open_by_due_date o JOIN @due d ON d.day = o.expiration_date;
+    INSERT INTO report_open_by_due_date (expiration_date, reservations, copies)
+    SELECT f.expiration_date, COUNT(*), SUM(f.copies)
+    FROM report_reservation_facts f JOIN @due d ON d.day = f.expiration_date
+    WHERE f.returned_at IS NULL
+    GROUP BY f.expiration_date;
+
+    DELETE u FROM report_copy_usage u JOIN @copies p ON p.id = u.copy_id;
+    INSERT INTO report_copy_usage (copy_id, loans, open_loans, days_reserved, last_reserved)
+    SELECT f.copy_id, COUNT(*), SUM(CASE WHEN f.is_open = 1 THEN 1 ELSE 0 END), ISNULL(SUM(f.days_reserved), 0),
+           MAX(f.reservation_date)
+    FROM report_loan_facts f JOIN @copies p ON p.id = f.copy_id
+    GROUP BY f.copy_id;
+
+    DECLARE @count INT = (SELECT COUNT(*) FROM @changed);
+    DECLARE @ms INT = DATEDIFF(MILLISECOND, @started, SYSUTCDATETIME());
+    UPDATE report_refresh SET last_version = @version, refreshed_at = SYSUTCDATETIME(), full_rebuild = @full,
+                              changed_reservations = @count, duration_ms = @ms
+    WHERE refresh_id = 1;
+    IF @@ROWCOUNT = 0
+        INSERT INTO report_refresh (refresh_id, last_version, refreshed_at, full_rebuild, changed_reservations, duration_ms)
+        VALUES (1, @version, SYSUTCDATETIME(), @full, @count, @ms);
+
+    COMMIT TRANSACTION;
+
+    SELECT @full AS full_rebuild, @count AS changed_reservations;
+END
+GO
+
+
+-- Views for Power BI. Each reads the summaries plus the catalog tables, so
+-- their cost follows the size of the collection, not the reservation history.
+
+CREATE OR ALTER VIEW report_overdue AS
+SELECT expiration_date, DATEDIFF(DAY, expiration_date, CAST(GETDATE() AS DATE)) AS days_overdue, reservations, copies
+FROM report_open_by_due_date
+WHERE expiration_date < CAST(GETDATE() AS DATE);
+GO
+
+CREATE OR ALTER VIEW report_copy_condition AS
+SELECT bc.condition, COUNT(*) AS copies,
+       SUM(CASE WHEN u.open_loans > 0 THEN 1 ELSE 0 END) AS reserved_now,
+       SUM(CASE WHEN u.loans > 0 THEN 1 ELSE 0 END) AS ever_reserved,
+       ISNULL(SUM(u.loans), 0) AS loans,
+       SUM(bc.price) AS stock_value,
+       ISNULL(SUM(bc.price * u.loans), 0) AS reserved_value
+FROM book_copy bc LEFT JOIN report_copy_usage u ON u.copy_id = bc.copy_id
+GROUP BY bc.condition;
+GO
+
+CREATE OR ALTER VIEW report_category_usage AS
+SELECT c.category_id, c.category_name, SUM(u.loans) AS loans, SUM(u.open_loans) AS open_loans,
+       SUM(u.days_reserved) AS days_reserved
+FROM report_copy_usage u
+JOIN book_copy bc ON bc.copy_id = u.copy_id
+JOIN book_category bk ON bk.ISBN = bc.ISBN
+JOIN category c ON c.category_id = bk.category_id
+GROUP BY c.category_id, c.category_name;
+GO
+
+CREATE OR ALTER VIEW report_author_usage AS
+SELECT a.author_id, a.name, SUM(u.loans) AS loans, SUM(u.open_loans) AS open_loans,
+       SUM(u.days_reserved) AS days_reserved
+FROM report_copy_usage u
+JOIN book_copy bc ON bc.copy_id = u.copy_id
+JOIN book_author ba ON ba.ISBN = bc.ISBN
+JOIN author a ON a.author_id = ba.author_id
+GROUP BY a.author_id, a.name;
+GO
+
+-- Initial build
+EXEC refresh_reports @full = 1;
+GO
+
+-- The Reports screen refreshes before it reads
+IF DATABASE_PRINCIPAL_ID('flask_book_user') IS NOT NULL
+    GRANT EXECUTE ON OBJECT::refresh_reports TO flask_book_user;
+GO
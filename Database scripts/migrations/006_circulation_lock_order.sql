@@ -0,0 +1,123 @@
+-- ---------------------------------
+-- Migration 006: circulation lock order
+-- ---------------------------------
+-- close_reservations (migration 004) listed the copies of the reservations
+-- it closes before its transaction, with nothing locking the detail rows. A
+-- copy that reserve_copies added to one of those reservations in between was
+-- never promoted, leaving a gap in its queue and a stale copy status.
+--
+-- Both procedures now lock in one order: the reservation row first, then
+-- its copies. close_reservations reads the copies only once it holds the
+-- reservations, and reserve_copies takes the reservation's update lock
+-- before the copy locks when adding to an open reservation.
+--
+-- Apply with:  python "Database scripts/migrate.py"
+
+
+CREATE OR ALTER PROCEDURE reserve_copies
+    @copies id_list READONLY,
+    @member_id INT = NULL,
+    @staff_id INT = NULL,
+    @loan_days INT = 14,
+    @reservation_id INT = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRANSACTION;
+
+    IF @reservation_id IS NOT NULL
+    BEGIN
+        SET @member_id = (SELECT member_id FROM reservation WITH (UPDLOCK, ROWLOCK, HOLDLOCK)
+                          WHERE reservation_id = @reservation_id AND returned_at IS NULL);
+        IF @member_id IS NULL
+            THROW 50004, 'The reservation does not exist or is already closed.', 1;
+    END
+
+    DECLARE @locked INT;
+    SELECT @locked = COUNT(*) FROM book_copy WITH (UPDLOCK, ROWLOCK, HOLDLOCK)
+    WHERE copy_id IN (SELECT id FROM @copies);
+    IF @locked < (SELECT COUNT(*) FROM @copies)
+        THROW 50001, 'One or more copies do not exist.', 1;
+    IF EXISTS (SELECT 1 FROM book_copy bc JOIN @copies c ON c.id = bc.copy_id WHERE bc.status IN ('Damaged', 'Lost'))
+        THROW 50002, 'Damaged or lost copies cannot be reserved.', 1;
+
+    IF @reservation_id IS NULL
+    BEGIN
+        IF @member_id IS NULL OR @staff_id IS NULL
+            THROW 50003, 'A new reservation needs a member and a staff member.', 1;
+        INSERT INTO reservation (member_id, staff_id, reservation_date, expiration_date)
+        VALUES (@member_id, @staff_id, CAST(GETDATE() AS DATE), DATEADD(DAY, @loan_days, CAST(GETDATE() AS DATE)));
+        SET @reservation_id = SCOPE_IDENTITY();
+    END
+
+    IF EXISTS (SELECT 1 FROM reservation_details rd
+               JOIN reservation r ON r.reservation_id = rd.reservation_id
+               JOIN @copies c ON c.id = rd.copy_id
+               WHERE r.member_id = @member_id AND rd.position_in_queue > 0)
+        THROW 50005, 'The member is already queued for one or more of these copies.', 1;
+
+    INSERT INTO reservation_details (reservation_id, copy_id, position_in_queue)
+    SELECT @reservation_id, c.id, ISNULL(q.last_position, 0) + 1
+    FROM @copies c
+    OUTER APPLY (SELECT MAX(rd.position_in_queue) AS last_position FROM reservation_details rd
+                 WHERE rd.copy_id = c.id AND rd.position_in_queue > 0) AS q;
+
+    EXEC promote_queue @copies;
+
+    COMMIT TRANSACTION;
+
+    SELECT rd.reservation_id, rd.copy_id, rd.position_in_queue
+    FROM reservation_details rd JOIN @copies c ON c.id = rd.copy_id
+    WHERE rd.reservation_id = @reservation_id
+    ORDER BY rd.copy_id;
+END
+GO
+
+CREATE OR ALTER PROCEDURE close_reservations
+    @reservations id_list READONLY,
+    @closed_on DATE,
+    @expired BIT,
+    @closed INT OUTPUT
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @copies id_list, @locked INT;
+
+    BEGIN TRANSACTION;
+
+    -- Held to the end, so no copy can join these reservations before they close
+    SELECT @locked = COUNT(*) FROM reservation WITH (UPDLOCK, ROWLOCK, HOLDLOCK)
+    WHERE reservation_id IN (SELECT id FROM @reservations);
+
+    INSERT INTO @copies SELECT DISTINCT rd.copy_id
+    FROM reservation_details rd JOIN @reservations r ON r.id = rd.reservation_id;
+
+    SELECT @locked = COUNT(*) FROM book_copy WITH (UPDLOCK, ROWLOCK, HOLDLOCK)
+    WHERE copy_id IN (SELECT id FROM @copies);
+
+    UPDATE res SET returned_at = @closed_on, expired = @expired
+    FROM reservation res JOIN @reservations r ON r.id = res.reservation_id
+    WHERE res.returned_at IS NULL;
+    SET @closed = @@ROWCOUNT;
+
+    -- A returned copy is back on the shelf; an expired hold never had it lent out
+    IF @expired = 0
+        UPDATE bc SET status = 'Available'
+        FROM book_copy bc
+        JOIN reservation_details rd ON rd.copy_id = bc.copy_id
+        JOIN @reservations r ON r.id = rd.reservation_id
+        WHERE rd.position_in_queue = 1 AND bc.status = 'Checked Out';
+
+    UPDATE rd SET position_in_queue = 0
+    FROM reservation_details rd JOIN @reservations r ON r.id = rd.reservation_id
+    WHERE rd.position_in_queue > 0;
+
+    EXEC promote_queue @copies;
+
+    COMMIT TRANSACTION;
+END
+GO
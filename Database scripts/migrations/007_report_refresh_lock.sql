@@ -0,0 +1,130 @@
+-- ---------------------------------
+-- Migration 007: one report refresh at a time
+-- ---------------------------------
+-- refresh_reports (migration 005) read its last version outside any lock.
+-- Two runs that overlapped, say the scheduled job and the Reports screen,
+-- both re-read the same changes and counted them into the summaries twice,
+-- and the slower one could set last_version back.
+--
+-- The procedure now takes an exclusive application lock at the start of its
+-- transaction and reads the versions after it, so a second run waits for
+-- the first to commit and then starts from where it stopped.
+--
+-- Apply with:  python "Database scripts/migrate.py"
+
+
+-- Brings the summaries up to date with the reservations changed since the last
+-- run. Returns whether it rebuilt everything and how many reservations it re-read.
+-- Runs as owner because TRUNCATE needs ALTER on the tables, which the app login lacks.
+CREATE OR ALTER PROCEDURE refresh_reports @full BIT = 0
+WITH EXECUTE AS OWNER
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @started DATETIME2 = SYSUTCDATETIME();
+    DECLARE @changed id_list, @dates date_list, @due date_list, @copies id_list;
+
+    BEGIN TRANSACTION;
+
+    -- One run at a time; the next one waits and then starts from this one's version
+    EXEC sp_getapplock @Resource = 'refresh_reports', @LockMode = 'Exclusive', @LockOwner = 'Transaction';
+
+    -- Read before the changes, so anything committed during the run is picked up again next time
+    DECLARE @version BIGINT = CHANGE_TRACKING_CURRENT_VERSION();
+    DECLARE @last BIGINT = (SELECT last_version FROM report_refresh WHERE refresh_id = 1);
+    IF @last IS NULL
+       OR @last < CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('dbo.reservation'))
+       OR @last < CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('dbo.reservation_details'))
+        SET @full = 1;
+
+    IF @full = 1
+    BEGIN
+        TRUNCATE TABLE report_reservation_facts;
+        TRUNCATE TABLE report_loan_facts;
+        TRUNCATE TABLE report_daily_staff;
+        TRUNCATE TABLE report_daily_member;
+        TRUNCATE TABLE report_open_by_due_date;
+        TRUNCATE TABLE report_copy_usage;
+        INSERT INTO @changed SELECT reservation_id FROM reservation;
+    END
+    ELSE
+        INSERT INTO @changed
+        SELECT reservation_id FROM CHANGETABLE(CHANGES reservation, @last) AS c
+        UNION
+        SELECT reservation_id FROM CHANGETABLE(CHANGES reservation_details, @last) AS c;
+
+    -- Summary rows the changed reservations counted in before the change...
+    INSERT INTO @dates SELECT DISTINCT f.reservation_date FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id;
+    INSERT INTO @due SELECT DISTINCT f.expiration_date FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id
+                     WHERE f.returned_at IS NULL;
+    INSERT INTO @copies SELECT DISTINCT f.copy_id FROM report_loan_facts f JOIN @changed c ON c.id = f.reservation_id;
+
+    DELETE f FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id;
+    DELETE f FROM report_loan_facts f JOIN @changed c ON c.id = f.reservation_id;
+
+    INSERT INTO report_reservation_facts (reservation_id, reservation_date, staff_id, member_id, expiration_date,
+                                          returned_at, expired, copies)
+    SELECT r.reservation_id, r.reservation_date, r.staff_id, r.member_id, r.expiration_date, r.returned_at, r.expired,
+           (SELECT COUNT(*) FROM reservation_details rd WHERE rd.reservation_id = r.reservation_id)
+    FROM reservation r JOIN @changed c ON c.id = r.reservation_id;
+
+    INSERT INTO report_loan_facts (reservation_id, copy_id, reservation_date, is_open, days_reserved)
+    SELECT rd.reservation_id, rd.copy_id, r.reservation_date,
+           CASE WHEN r.returned_at IS NULL THEN 1 ELSE 0 END,
+           DATEDIFF(DAY, r.reservation_date, r.returned_at)
+    FROM reservation_details rd
+    JOIN @changed c ON c.id = rd.reservation_id
+    JOIN reservation r ON r.reservation_id = rd.reservation_id;
+
+    -- ...and the rows they count in now
+    INSERT INTO @dates SELECT DISTINCT f.reservation_date FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id
+                       WHERE NOT EXISTS (SELECT 1 FROM @dates d WHERE d.day = f.reservation_date);
+    INSERT INTO @due SELECT DISTINCT f.expiration_date FROM report_reservation_facts f JOIN @changed c ON c.id = f.reservation_id
+                     WHERE f.returned_at IS NULL AND NOT EXISTS (SELECT 1 FROM @due d WHERE d.day = f.expiration_date);
+    INSERT INTO @copies SELECT DISTINCT f.copy_id FROM report_loan_facts f JOIN @changed c ON c.id = f.reservation_id
+                        WHERE NOT EXISTS (SELECT 1 FROM @copies p WHERE p.id = f.copy_id);
+
+    DELETE s FROM report_daily_staff s JOIN @dates d ON d.day = s.reservation_date;
+    INSERT INTO report_daily_staff (reservation_date, staff_id, reservations, copies, returned, expired)
+    SELECT f.reservation_date, f.staff_id, COUNT(*), SUM(f.copies),
+           SUM(CASE WHEN f.returned_at IS NOT NULL AND f.expired = 0 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN f.expired = 1 THEN 1 ELSE 0 END)
+    FROM report_reservation_facts f JOIN @dates d ON d.day = f.reservation_date
+    GROUP BY f.reservation_date, f.staff_id;
+
+    DELETE m FROM report_daily_member m JOIN @dates d ON d.day = m.reservation_date;
+    INSERT INTO report_daily_member (reservation_date, member_id, reservations, copies)
+    SELECT f.reservation_date, f.member_id, COUNT(*), SUM(f.copies)
+    FROM report_reservation_facts f JOIN @dates d ON d.day = f.reservation_date
+    GROUP BY f.reservation_date, f.member_id;
+
+    DELETE o FROM report_open_by_due_date o JOIN @due d ON d.day = o.expiration_date;
+    INSERT INTO report_open_by_due_date (expiration_date, reservations, copies)
+    SELECT f.expiration_date, COUNT(*), SUM(f.copies)
+    FROM report_reservation_facts f JOIN @due d ON d.day = f.expiration_date
+    WHERE f.returned_at IS NULL
+    GROUP BY f.expiration_date;
+
+    DELETE u FROM report_copy_usage u JOIN @copies p ON p.id = u.copy_id;
+    INSERT INTO report_copy_usage (copy_id, loans, open_loans, days_reserved, last_reserved)
+    SELECT f.copy_id, COUNT(*), SUM(CASE WHEN f.is_open = 1 THEN 1 ELSE 0 END), ISNULL(SUM(f.days_reserved), 0),
+           MAX(f.reservation_date)
+    FROM report_loan_facts f JOIN @copies p ON p.id = f.copy_id
+    GROUP BY f.copy_id;
+
+    DECLARE @count INT = (SELECT COUNT(*) FROM @changed);
+    DECLARE @ms INT = DATEDIFF(MILLISECOND, @started, SYSUTCDATETIME());
+    UPDATE report_refresh SET last_version = @version, refreshed_at = SYSUTCDATETIME(), full_rebuild = @full,
+                              changed_reservations = @count, duration_ms = @ms
+    WHERE refresh_id = 1;
+    IF @@ROWCOUNT = 0
+        INSERT INTO report_refresh (refresh_id, last_version, refreshed_at, full_rebuild, changed_reservations, duration_ms)
+        VALUES (1, @version, SYSUTCDATETIME(), @full, @count, @ms);
+
+    COMMIT TRANSACTION;
+
+    SELECT @full AS full_rebuild, @count AS changed_reservations;
+END
+GO
@@ -0,0 +1,29 @@
+import argparse
+import time
+
+from migrate import add_connection_args, connect
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fold the reservations changed since the last run into the reporting summaries "
+                    "(migration 005). Schedule it ahead of the Power BI refresh, e.g. every 15 minutes; "
+                    "it must run at least once per Change Tracking retention period (2 days) to stay incremental.")
+    add_connection_args(parser)
+    parser.add_argument('--full', action='store_true', help='Rebuild every summary from the raw tables')
+    args = parser.parse_args()
+
+    conn = connect(args)
+    try:
+        started = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute("EXEC refresh_reports @full=?", [int(args.full)])
+        full_rebuild, changed = cursor.fetchone()
+        print(f"{'Rebuilt from' if full_rebuild else 'Refreshed'} {changed} reservation(s) "
+              f"in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlencode
+
+from circulation import Circulation
+from data_access import LibraryData
+from export import open_export
+from instrumentation import Instrumentation
+from paging import KeysetPager
+from reports import Reports
+from schema import SchemaCatalog
+from search import SearchEngine
+
+# Reconnect rather than reuse a keep-alive connection idle this long; the service closes them at 60 s
+IDLE_SECONDS = 30
+# GET responses kept for revalidation with If-None-Match
+ETAG_ENTRIES = 256
+# The service's MAX_LIMIT: rows per request when exporting or looking up keys
+MAX_ROWS = 1000
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Abort:
+    # Registered with an executor task like a cursor is, so cancelling the task cuts the request off
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cancel(self):
+        if self.conn.sock is not None:
+            self.conn.sock.shutdown(socket.SHUT_RDWR)
+
+
+class ApiClient:
+    # DatabaseConnection's counterpart for desks that use the service (api_server.py): one
+    # keep-alive HTTP connection per worker thread, the login token on every request, and GET
+    # responses revalidated by ETag so unchanged pages and schema come back as an empty 304.
+    def __init__(self, url, metrics=None, timeout=60):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.server = url
+        self.database = 'api'
+        self.metrics = metrics or Instrumentation()
+        self.token = None
+        self.etags = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and time.monotonic() - self._local.used > IDLE_SECONDS:
+            self.drop()
+            conn = None
+        if conn is None:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            conn = connection_class(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            self._local.used = time.monotonic()
+        return conn
+
+    def drop(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    @contextmanager
+    def cancellable(self, token):
+        self._local.token = token
+        try:
+            yield
+        finally:
+            self._local.token = None
+
+    def send(self, method, path, payload, headers):
+        # A reused connection the service has closed meanwhile fails before any response; only
+        # GETs are retried on a fresh one, since a write may have been applied.
+        for attempt in range(2):
+            conn = self.connect()
+            token = getattr(self._local, 'token', None)
+            if token is not None:
+                token.track(Abort(conn))
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    # http.client writes a request's body apart from its headers; without this
+                    # Nagle holds the body back until the service's delayed ACK, ~40 ms a write
+                    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                conn.request(method, self.prefix + path, payload, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.drop()
+                if attempt or method != 'GET':
+                    raise
+                continue
+            except BaseException:
+                self.drop()
+                raise
+            self._local.used = time.monotonic()
+            return response.status, response.getheader('ETag'), data
+
+    def request(self, method, path, body=None, params=None, token=None):
+        params = {name: value for name, value in (params or {}).items() if value not in (None, '')}
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        headers = {'Accept': 'application/json'}
+        token = token or self.token
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        with self._lock:
+            cached = self.etags.get(path) if method == 'GET' else None
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        payload = None
+        if body is not None:
+            payload = json.dumps(body, default=str).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        status, data, error = None, b'', None
+        try:
+            status, tag, data = self.send(method, path, payload, headers)
+            if status == 304 and cached:
+                data = cached[1]
+            elif status >= 400:
+                try:
+                    reply = json.loads(data)
+                    # An internal error comes with the id of its line in the service's diagnostics log
+                    message = f"{reply['error']} (id {reply['id']})" if 'id' in reply else reply['error']
+                except (ValueError, KeyError, TypeError):
+                    message = f"HTTP {status}"
+                raise ApiError(status, message)
+            elif method == 'GET' and tag:
+                with self._lock:
+                    self.etags[path] = (tag, data)
+                    self.etags.move_to_end(path)
+                    while len(self.etags) > ETAG_ENTRIES:
+                        self.etags.popitem(last=False)
+            # Parsed per call: callers keep and patch the rows they get
+            return json.loads(data) if data else {}
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.metrics.record_query(f"{method} {path}", (time.perf_counter() - started) * 1000,
+                                      size=len(data), error=error, source='api', status=status)
+
+    def login(self, email, password):
+        body = self.request('POST', '/login', {'email': email, 'password': password})
+        self.token = body['token']
+        return body['staff']
+
+    def logout(self):
+        # Forgets the token at once and revokes it on a daemon thread, so a slow or unreachable
+        # service never holds up the window; an unrevoked token lapses on the service when idle
+        token, self.token = self.token, None
+        with self._lock:
+            self.etags.clear()
+        if token:
+            threading.Thread(target=self.revoke, args=(token,), daemon=True).start()
+
+    def revoke(self, token):
+        try:
+            self.request('POST', '/logout', token=token)
+        except Exception as e:
+            self.metrics.record_error(e, action="logout")
+        finally:
+            self.drop()
+
+    def close_all(self):
+        self.drop()
+
+
+class RemoteSchema(SchemaCatalog):
+    # The service's SchemaCatalog, for the tables the logged-in role may open
+    def fetch(self):
+        return self.db.request('GET', '/schema')
+
+    def fetch_version(self):
+        return self.fetch()['version']
+
+    def load(self):
+        self.refresh()
+
+    def refresh(self, version=None):
+        body = self.fetch()
+        with self._lock:
+            self.tables, self.version = body['tables'], body['version']
+
+
+class RemoteTracker:
+    # ChangeTracker's interface: the service runs the Change Tracking query for the view
+    def __init__(self, client):
+        self.client = client
+        self.tables = None
+
+    def load(self):
+        self.tables = {table['name'] for table in self.client.request('GET', '/tables')['tables'] if table['tracked']}
+
+    def tracks(self, table_name):
+        if self.tables is None:
+            self.load()
+        return table_name in self.tables
+
+    def sync(self, pager):
+        body = self.client.request('GET', f"/tables/{pager.table_name}/changes",
+                                   params={'since': pager.version, 'q': pager.where})
+        changes = body['changes']
+        if changes is None:
+            return body['version'], None
+        return body['version'], [(operation, tuple(key), row) for operation, key, row in changes]
+
+
+class RemoteSearch(SearchEngine):
+    # The service builds the SQL; a predicate here is just the term, sent as ?q=. Full-text
+    # columns are never loaded, so cached results are not narrowed locally either.
+    def predicate(self, table_name, term):
+        return (term, []) if self.has_fields(table_name) else None
+
+
+class RemotePager(KeysetPager):
+    # Pages come from GET /tables/<table>, keyset-seeked like the local pager's; where holds the
+    # search term. full asks for whole (MAX) values rather than grid previews.
+    def __init__(self, client, schema, table_name, where='', params=(), full=False, **options):
+        super().__init__(client, schema, table_name, where, params, **options)
+        self.full = full
+        if full:
+            self.preview_columns = []
+
+    def get(self, **params):
+        return self.db.request('GET', f"/tables/{self.table_name}",
+                               params=dict({'q': self.where, 'limit': self.page_size, 'full': 'true' if self.full else None},
+                                           **params))
+
+    def count(self):
+        if self.total is None:
+            self.total = self.get(count='true', limit=1)['total']
+        return self.total
+
+    def read(self, offset=0, after=None, before=None):
+        if after is not None:
+            body = self.get(after=json.dumps(after, default=str))
+        elif before is not None:
+            body = self.get(before=json.dumps(before, default=str))
+        else:
+            body = self.get(offset=offset)
+        if self.version is None:
+            self.version = body['version']
+        return body['rows']
+
+    def fetch_keys(self, keys, chunk_size=MAX_ROWS):
+        rows = []
+        for start in range(0, len(keys), chunk_size):
+            rows.extend(self.db.request('POST', f"/tables/{self.table_name}/lookup",
+                                        {'keys': [list(key) for key in keys[start:start + chunk_size]]})['rows'])
+        return rows
+
+
+class RemoteCirculation(Circulation):
+    # The service records the logged-in staff member on new reservations, so staff_id is not sent
+    def reserve(self, copy_ids, member_id=None, staff_id=None, loan_days=14, reservation_id=None):
+        body = self.db.request('POST', '/reservations', {'copy_ids': [int(i) for i in copy_ids], 'member_id': member_id,
+                                                         'loan_days': loan_days, 'reservation_id': reservation_id})
+        return [tuple(row) for row in body['reservations']]
+
+    def return_reservations(self, reservation_ids):
+        return self.db.request('POST', '/reservations/return', {'reservation_ids': [int(i) for i in reservation_ids]})['returned']
+
+    def expire(self, as_of=None, batch_size=500):
+        return self.db.request('POST', '/reservations/expire')['expired']
+
+
+class RemoteReports(Reports):
+    # Dates are the service's: today is wherever the summaries are kept
+    def refresh(self, full=False):
+        body = self.db.request('POST', '/reports/refresh', {'full': full})
+        return body['full_rebuild'], body['changed']
+
+    def summary(self, days, today=None):
+        return self.db.request('GET', '/reports/summary', params={'days': days})
+
+    def report(self, title, days, today=None):
+        body = self.db.request('GET', '/reports', params={'title': title, 'days': days})
+        return body['columns'], body['rows']
+
+
+class RemoteData(LibraryData):
+    # LibraryData over the service. Statements are (operation, columns) pairs rather than SQL,
+    # which execute_many() sends as POST, PATCH or DELETE /tables/<table>.
+    def __init__(self, client, schema):
+        super().__init__(client, schema, RemoteTracker(client), circulation=RemoteCirculation(client),
+                         reports=RemoteReports(client))
+        self.search = RemoteSearch(client, schema)
+
+    def authenticate(self, email, password):
+        try:
+            staff = self.db.login(email, password)
+        except ApiError as e:
+            if e.status == 401:
+                return []
+            raise
+        return [(staff['staff_id'], staff['fname'], staff['lname'], staff['role'])]
+
+    def pager(self, table_name, predicate=('', []), **options):
+        return RemotePager(self.db, self.schema, table_name, *predicate, **options)
+
+    def full_rows(self, table_name, key):
+        return self.db.request('POST', f"/tables/{table_name}/lookup", {'keys': [list(key)], 'full': True})['rows']
+
+    def insert_statement(self, table_name, columns):
+        return ('insert', list(columns))
+
+    def update_statement(self, table_name, columns):
+        return ('update', list(columns))
+
+    def delete_statement(self, table_name):
+        return ('delete', None)
+
+    def execute(self, table_name, query, params):
+        self.execute_many(table_name, query, [params])
+
+    def execute_many(self, table_name, query, param_rows, reload=None):
+        # One request, applied in one transaction by the service
+        operation, columns = query
+        rows = [list(row) for row in param_rows]
+        if operation == 'insert':
+            self.db.request('POST', f"/tables/{table_name}", {'columns': columns, 'rows': rows})
+        elif operation == 'update':
+            self.db.request('PATCH', f"/tables/{table_name}", {'columns': columns, 'rows': rows})
+        else:
+            self.db.request('DELETE', f"/tables/{table_name}", {'keys': rows})
+        return reload() if reload else None
+
+    def export(self, table_name, path, predicate=('', []), progress=None, batch_size=MAX_ROWS):
+        # Same contract as LibraryData.export, one keyset page of whole values per request
+        pager = self.pager(table_name, predicate, full=True, page_size=min(batch_size, MAX_ROWS))
+        columns = self.schema.columns(table_name)
+        base, extension = os.path.splitext(path)
+        partial = f"{base}.partial{extension}"
+        written = 0
+        out = open_export(partial, columns, {col: self.schema.column_type(table_name, col) for col in columns},
+                          self.schema.precisions(table_name))
+        try:
+            rows = pager.read()
+            while rows:
+                out.write(rows)
+                written += len(rows)
+                if progress:
+                    progress(written)
+                if len(rows) < pager.page_size:
+                    break
+                rows = pager.read(after=pager.key_of(rows[-1]))
+            out.close()
+        except BaseException:
+            out.close()
+            os.remove(partial)
+            raise
+        os.replace(partial, path)
+        return written
+
+
+class RemoteSession:
+    # Session's interface with the service as the backend, for library_app.py --api URL: the
+    # desk holds no database connections, only HTTP ones to the service. Schema and tracked
+    # tables depend on the role, so they load once logged in and are dropped at logout.
+    def __init__(self, url):
+        self.db = ApiClient(url)
+        self.metrics = self.db.metrics
+        self.schema = RemoteSchema(self.db)
+        self.data = RemoteData(self.db, self.schema)
+        self.tracker = self.data.tracker
+        self.catalog = None
+        self.warmed = False
+        self.metadata_error = None
+        self._lock = threading.Lock()
+
+    def warm(self):
+        # Before login this only checks the service is up; the first call after it loads the metadata
+        with self._lock:
+            if self.warmed:
+                return None
+            timer = self.metrics.start("startup: warm-up", api=True)
+            started = time.perf_counter()
+            try:
+                self.db.request('GET', '/health')
+            except Exception as e:
+                timer.finish(e)
+                raise
+            steps = {'connect_ms': (time.perf_counter() - started) * 1000}
+            if self.db.token:
+                try:
+                    self.schema.load()
+                    self.tracker.load()
+                    self.metadata_error = None
+                except Exception as e:
+                    self.metadata_error = e
+                steps['metadata_ms'] = (time.perf_counter() - started) * 1000 - steps['connect_ms']
+                self.warmed = True
+            steps = {name: round(ms, 1) for name, ms in steps.items()}
+            timer.finish(**steps)
+            return steps
+
+    def logout(self):
+        with self._lock:
+            self.warmed = False
+            self.schema.invalidate()
+            self.tracker.tables = None
+        self.db.logout()
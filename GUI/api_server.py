@@ -0,0 +1,517 @@
+import argparse
+import hashlib
+import json
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from database import DatabaseConnection, PoolExhaustedError
+from local_cache import CATALOG_TABLES
+from permissions import CIRCULATION_TABLES, REPORT_ROLES, has_permission, viewable_tables
+from session import Session
+
+# Rows per page when the client does not say, and the most one request may ask for
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+# Seconds a catalog response is served from memory before it is read again
+CACHE_TTL = 30
+CACHE_ENTRIES = 512
+# A login lapses after this many idle seconds
+TOKEN_TTL = 8 * 3600
+# Seconds between catch-ups of the service's catalog mirror
+CATALOG_SYNC = 60
+MAX_BODY = 10 * 1024 * 1024
+
+# Everything else needs the bearer token POST /login hands out
+PUBLIC_PATHS = {'/health', '/login'}
+
+# Columns no client is sent; the login query checks the password on the server
+HIDDEN_COLUMNS = {'staff': {'password'}}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def encode(body):
+    # Dates, times and decimals go out as their str(), the same text the grid shows
+    return json.dumps(body, default=str, separators=(',', ':')).encode('utf-8')
+
+
+def entity_tag(payload):
+    return f'"{hashlib.sha1(payload).hexdigest()}"'
+
+
+def shown(table_name, columns):
+    # Positions of the columns a client may read
+    hidden = HIDDEN_COLUMNS.get(table_name, ())
+    return [i for i, col in enumerate(columns) if col not in hidden]
+
+
+def table_entry(table_name, info):
+    # A SchemaCatalog table without its hidden columns
+    hidden = HIDDEN_COLUMNS.get(table_name, ())
+    return {name: [col for col in value if col not in hidden] if isinstance(value, list)
+            else {col: v for col, v in value.items() if col not in hidden} for name, value in info.items()}
+
+
+class ResponseCache:
+    # Encoded catalog responses by request path, each kept for ttl seconds or until a write or
+    # a mirror sync touches its table. Permissions are checked before the lookup, so one entry
+    # serves every role that may see the table.
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[2], entry[3]
+            self.misses += 1
+            return None
+
+    def put(self, key, table_name, payload, tag):
+        if not self.ttl:
+            return
+        with self._lock:
+            self.entries[key] = (time.monotonic() + self.ttl, table_name, payload, tag)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, tables=None):
+        with self._lock:
+            for key in [key for key, entry in self.entries.items() if tables is None or entry[1] in tables]:
+                del self.entries[key]
+
+
+class TokenStore:
+    # Bearer tokens of logged-in staff, in memory only: restarting the service logs everyone out.
+    def __init__(self, ttl=TOKEN_TTL):
+        self.ttl = ttl
+        self.tokens = {}
+        self._lock = threading.Lock()
+
+    def issue(self, staff):
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            self.tokens = {key: entry for key, entry in self.tokens.items() if entry[1] > now}
+            self.tokens[token] = [staff, now + self.ttl]
+        return token
+
+    def staff(self, token):
+        now = time.monotonic()
+        with self._lock:
+            entry = self.tokens.get(token)
+            if entry is None or entry[1] <= now:
+                self.tokens.pop(token, None)
+                return None
+            entry[1] = now + self.ttl
+            return entry[0]
+
+    def revoke(self, token):
+        with self._lock:
+            self.tokens.pop(token, None)
+
+
+class Fields(dict):
+    # Request body or query string; a field the handler needs but the client left out is a 400
+    def __missing__(self, name):
+        raise ApiError(400, f"Missing field: {name}")
+
+
+class Request:
+    def __init__(self, staff, token, query, body):
+        self.staff = staff
+        self.token = token
+        self.query = Fields(query)
+        self.body = Fields(body)
+
+    def role(self):
+        return self.staff['role']
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes, which Nagle would hold back on a keep-alive connection
+    disable_nagle_algorithm = True
+    # Idle keep-alive connections are closed after this long; api_client.py reconnects before then
+    timeout = 60
+
+    def do_GET(self):
+        self.respond('GET')
+
+    def do_POST(self):
+        self.respond('POST')
+
+    def do_PATCH(self):
+        self.respond('PATCH')
+
+    def do_DELETE(self):
+        self.respond('DELETE')
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            # The body is left unread, so the connection cannot carry another request
+            self.close_connection = True
+            raise ApiError(413, "Request body too large")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            raise ApiError(400, "Request body is not valid JSON") from e
+        if not isinstance(body, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return body
+
+    def respond(self, method):
+        api = self.server
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        label, table_name, cached, error, body = 'unmatched', None, False, None, None
+        try:
+            label, handler, action, cacheable, args = api.route(method, url.path)
+            table_name = args[0] if args else None
+            header = self.headers.get('Authorization') or ''
+            token = header[7:] if header.startswith('Bearer ') else None
+            staff = api.tokens.staff(token) if token else None
+            if staff is None and label not in PUBLIC_PATHS:
+                raise ApiError(401, "Not logged in or the session expired")
+            if action and not has_permission(staff['role'], action, table_name):
+                raise ApiError(403, "No permission")
+            # Only now, so an unauthenticated client cannot make the service read and parse a body
+            body = self.read_body()
+            cacheable = cacheable and table_name in CATALOG_TABLES
+            hit = api.cache.get(self.path) if cacheable else None
+            if hit:
+                status, (payload, tag), cached = 200, hit, True
+            else:
+                status, result = handler(Request(staff, token, {name: values[-1] for name, values in parse_qs(url.query).items()},
+                                                 body), *args)
+                payload = encode(result)
+                tag = entity_tag(payload) if method == 'GET' else None
+                if cacheable:
+                    api.cache.put(self.path, table_name, payload, tag)
+            self.send(status, payload, tag, api.cache.ttl if cacheable else None)
+        except Exception as e:
+            error = e
+            if body is None and self.headers.get('Content-Length', '0') != '0':
+                # The body was never read, so the connection cannot carry another request
+                self.close_connection = True
+            status = e.status if isinstance(e, ApiError) else 503 if isinstance(e, PoolExhaustedError) \
+                else 400 if isinstance(e, ValueError) else 500
+            if status == 500:
+                # Driver messages name the server, tables and SQL: they stay in the diagnostics log,
+                # and the client gets an id to find the line by
+                error_id = secrets.token_hex(6)
+                api.metrics.record_error(e, action=f"api: {method} {label}", error_id=error_id)
+                reply = {'error': 'internal error', 'id': error_id}
+            else:
+                if status > 500:
+                    api.metrics.record_error(e, action=f"api: {method} {label}")
+                reply = {'error': str(e)}
+            self.send(status, encode(reply))
+        api.metrics.record_action(f"api: {method} {label}", (time.perf_counter() - started) * 1000,
+                                  error if status >= 500 else None, status=status, table=table_name, cached=cached)
+
+    def send(self, status, payload, tag=None, max_age=None):
+        if tag and tag == self.headers.get('If-None-Match'):
+            status, payload = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        if tag:
+            self.send_header('ETag', tag)
+            # Catalog responses may be reused for the cache TTL; anything else is revalidated every time
+            self.send_header('Cache-Control', f"private, max-age={int(max_age)}" if max_age else "no-cache")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Requests are already in the diagnostics log as "api: ..." actions
+        pass
+
+
+class LibraryApi(ThreadingHTTPServer):
+    # The data paths of LibraryManagementSystem as JSON endpoints, for any number of desks.
+    # Every request thread draws from the one pool of data.db, so the service holds at most
+    # pool_size connections however many clients there are; requests beyond that wait for a
+    # free connection (and get 503 after the pool's acquire timeout).
+    daemon_threads = True
+
+    def __init__(self, address, data, ttl=CACHE_TTL, token_ttl=TOKEN_TTL):
+        super().__init__(address, ApiHandler)
+        self.data = data
+        self.metrics = data.db.metrics
+        self.cache = ResponseCache(ttl)
+        self.tokens = TokenStore(token_ttl)
+        self.stopped = threading.Event()
+        # (method, path, handler, permission needed on the table in the path, cacheable)
+        routes = [
+            ('GET', '/health', self.health, None, False),
+            ('POST', '/login', self.login, None, False),
+            ('POST', '/logout', self.logout, None, False),
+            ('GET', '/schema', self.schema, None, False),
+            ('GET', '/tables', self.tables, None, False),
+            ('GET', '/tables/{table}', self.rows, 'view', True),
+            ('POST', '/tables/{table}', self.insert, 'add', False),
+            ('PATCH', '/tables/{table}', self.update, 'edit', False),
+            ('DELETE', '/tables/{table}', self.delete, 'delete', False),
+            ('POST', '/tables/{table}/lookup', self.lookup, 'view', False),
+            ('GET', '/tables/{table}/changes', self.changes, 'view', False),
+            ('POST', '/reservations', self.reserve, None, False),
+            ('POST', '/reservations/return', self.return_reservations, None, False),
+            ('POST', '/reservations/expire', self.expire, None, False),
+            ('GET', '/reports', self.report, None, False),
+            ('GET', '/reports/summary', self.report_summary, None, False),
+            ('POST', '/reports/refresh', self.refresh_reports, None, False),
+        ]
+        self.routes = [(method, path, re.compile('^' + path.replace('{table}', r'(\w+)') + '$'), handler, action, cacheable)
+                       for method, path, handler, action, cacheable in routes]
+
+    def route(self, method, path):
+        allowed = False
+        for route_method, label, pattern, handler, action, cacheable in self.routes:
+            match = pattern.match(path.rstrip('/') or '/')
+            if match:
+                if route_method == method:
+                    return label, handler, action, cacheable, match.groups()
+                allowed = True
+        raise ApiError(405 if allowed else 404, "Method not allowed" if allowed else "Not found")
+
+    def start_catalog_sync(self, interval=CATALOG_SYNC):
+        # Keeps the service's catalog mirror current and drops cached responses of tables that moved
+        catalog = self.data.catalog
+        if not catalog or not interval:
+            return
+        def run():
+            while not self.stopped.wait(interval):
+                try:
+                    changed = catalog.sync_all()
+                except Exception as e:
+                    self.metrics.record_error(e, action="catalog sync")
+                    continue
+                if changed:
+                    self.cache.invalidate(changed)
+        threading.Thread(target=run, name="catalog-sync", daemon=True).start()
+
+    def server_close(self):
+        self.stopped.set()
+        super().server_close()
+
+    def written(self):
+        # book_catalog is maintained from the tables under it, so any write may have moved it
+        self.cache.invalidate()
+
+    def columns_of(self, table_name, columns):
+        known = self.data.schema.columns(table_name)
+        if not isinstance(columns, list) or not columns:
+            raise ApiError(400, "columns must be a non-empty list")
+        unknown = [col for col in columns if col not in known]
+        if unknown:
+            raise ApiError(400, f"Unknown column(s): {', '.join(map(str, unknown))}")
+        return columns
+
+    def rows_of(self, body, field, width):
+        rows = body[field]
+        if not isinstance(rows, list) or not rows or any(not isinstance(row, list) or len(row) != width for row in rows):
+            raise ApiError(400, f"{field} must be a non-empty list of {width}-value lists")
+        return rows
+
+    def key_of(self, table_name, value):
+        key = json.loads(value)
+        if not isinstance(key, list) or len(key) != len(self.data.schema.primary_key(table_name)):
+            raise ApiError(400, "A key must be a JSON list of the primary key values")
+        return key
+
+    def health(self, request):
+        return 200, {'status': 'ok'}
+
+    def login(self, request):
+        rows = self.data.authenticate(request.body['email'], request.body['password'])
+        if not rows:
+            raise ApiError(401, "Invalid credentials")
+        staff = dict(zip(['staff_id', 'fname', 'lname', 'role'], rows[0]))
+        return 200, {'token': self.tokens.issue(staff), 'staff': staff}
+
+    def logout(self, request):
+        self.tokens.revoke(request.token)
+        return 200, {}
+
+    def schema(self, request):
+        # Only the tables the role may open, in SchemaCatalog's own shape so a client can load it as is
+        schema = self.data.schema
+        schema.refresh_if_changed()
+        return 200, {'version': schema.version,
+                     'tables': {table_name: table_entry(table_name, schema.tables[table_name])
+                                for table_name in viewable_tables(request.role()) if table_name in schema.tables}}
+
+    def tables(self, request):
+        role = request.role()
+        return 200, {'tables': [{'name': table_name, 'tracked': self.data.tracker.tracks(table_name),
+                                 'searchable': self.data.search.has_fields(table_name),
+                                 **{action: has_permission(role, action, table_name) for action in ('add', 'edit', 'delete')}}
+                                for table_name in viewable_tables(role)]}
+
+    def rows(self, request, table_name):
+        # One page in key order: ?q= searches like the desk does, ?after= / ?before= seek from a
+        # key (the "next" of the previous page), ?offset= skips rows, ?count=true adds the total.
+        query = request.query
+        limit = max(1, min(int(query.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+        pager = self.data.pager(table_name, self.data.predicate(table_name, query.get('q', '')), page_size=limit)
+        if query.get('full') == 'true':
+            pager.preview_columns = []
+        version = pager.tracker.current_version(table_name) if pager.tracker else None
+        rows = pager.read(int(query.get('offset', 0)),
+                          self.key_of(table_name, query['after']) if 'after' in query else None,
+                          self.key_of(table_name, query['before']) if 'before' in query else None)
+        keep = shown(table_name, pager.columns)
+        body = {'columns': [pager.columns[i] for i in keep], 'rows': [[row[i] for i in keep] for row in rows],
+                'version': version}
+        if len(rows) == limit:
+            body['next'] = pager.key_of(rows[-1])
+        if query.get('count') == 'true':
+            body['total'] = pager.count()
+        return 200, body
+
+    def lookup(self, request, table_name):
+        # Rows by primary key: grid previews, or full values with "full": true
+        keys = self.rows_of(request.body, 'keys', len(self.data.schema.primary_key(table_name)))
+        if request.body.get('full'):
+            rows = [row for key in keys[:MAX_LIMIT] for row in self.data.full_rows(table_name, key)]
+        else:
+            rows = self.data.pager(table_name).fetch_keys(keys)
+        columns = self.data.schema.columns(table_name)
+        keep = shown(table_name, columns)
+        return 200, {'columns': [columns[i] for i in keep], 'rows': [[row[i] for i in keep] for row in rows]}
+
+    def changes(self, request, table_name):
+        # Change Tracking delta of a view since ?since= (a page's version); null changes means re-read
+        tracker = self.data.tracker
+        if not tracker.tracks(table_name):
+            return 200, {'version': None, 'changes': None}
+        pager = self.data.pager(table_name, self.data.predicate(table_name, request.query.get('q', '')))
+        pager.version = int(request.query['since']) if 'since' in request.query else None
+        version, changes = tracker.sync(pager)
+        keep = shown(table_name, pager.columns)
+        return 200, {'version': version,
+                     'changes': None if changes is None else [[operation, list(key), None if row is None else [row[i] for i in keep]]
+                                                              for operation, key, row in changes]}
+
+    def insert(self, request, table_name):
+        if table_name in CIRCULATION_TABLES:
+            raise ApiError(400, "Reservations are created with POST /reservations, which assigns queue positions")
+        columns = self.columns_of(table_name, request.body['columns'])
+        rows = self.rows_of(request.body, 'rows', len(columns))
+        self.data.insert_rows(table_name, columns, rows)
+        self.written()
+        return 201, {'rows': len(rows)}
+
+    def update(self, request, table_name):
+        # Each row holds the new values of columns followed by the key of the row to update
+        columns = self.columns_of(table_name, request.body['columns'])
+        rows = self.rows_of(request.body, 'rows', len(columns) + len(self.data.schema.primary_key(table_name)))
+        self.data.update_rows(table_name, columns, rows)
+        self.written()
+        return 200, {'rows': len(rows)}
+
+    def delete(self, request, table_name):
+        keys = self.rows_of(request.body, 'keys', len(self.data.schema.primary_key(table_name)))
+        self.data.delete_rows(table_name, keys)
+        self.written()
+        return 200, {'rows': len(keys)}
+
+    def reserve(self, request):
+        # A new reservation, or more copies on reservation_id; the staff member is whoever logged in
+        body = request.body
+        table_name = 'reservation_details' if body.get('reservation_id') is not None else 'reservation'
+        if not has_permission(request.role(), 'add', table_name):
+            raise ApiError(403, "No permission")
+        rows = self.data.circulation.reserve(body['copy_ids'], member_id=body.get('member_id'),
+                                             staff_id=request.staff['staff_id'], loan_days=body.get('loan_days', 14),
+                                             reservation_id=body.get('reservation_id'))
+        self.written()
+        return 201, {'reservations': [list(row) for row in rows]}
+
+    def return_reservations(self, request):
+        if not has_permission(request.role(), 'edit', 'reservation'):
+            raise ApiError(403, "No permission")
+        returned = self.data.circulation.return_reservations(request.body['reservation_ids'])
+        self.written()
+        return 200, {'returned': returned}
+
+    def expire(self, request):
+        if not has_permission(request.role(), 'edit', 'reservation'):
+            raise ApiError(403, "No permission")
+        expired = self.data.circulation.expire()
+        self.written()
+        return 200, {'expired': expired}
+
+    def reports_allowed(self, request):
+        if request.role() not in REPORT_ROLES:
+            raise ApiError(403, "No permission")
+        return int(request.query.get('days', 30))
+
+    def report(self, request):
+        days = self.reports_allowed(request)
+        columns, rows = self.data.reports.report(request.query['title'], days)
+        return 200, {'columns': columns, 'rows': [list(row) for row in rows]}
+
+    def report_summary(self, request):
+        return 200, self.data.reports.summary(self.reports_allowed(request))
+
+    def refresh_reports(self, request):
+        self.reports_allowed(request)
+        full_rebuild, changed = self.data.reports.refresh(bool(request.body.get('full')))
+        return 200, {'full_rebuild': full_rebuild, 'changed': changed}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the library's tables, search, catalog, circulation and reports as JSON to any number of "
+                    "desks over one shared connection pool. Start the desks with library_app.py --api http://HOST:PORT.")
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--pool-size', type=int, default=20, help='Database connections shared by all clients')
+    parser.add_argument('--cache-ttl', type=float, default=CACHE_TTL,
+                        help='Seconds a catalog response is reused before it is read again (0 disables the cache)')
+    parser.add_argument('--catalog-sync', type=float, default=CATALOG_SYNC,
+                        help='Seconds between catch-ups of the local catalog mirror (0 disables them)')
+    args = parser.parse_args()
+
+    session = Session(DatabaseConnection(pool_size=args.pool_size))
+    session.warm()
+    if session.metadata_error:
+        raise session.metadata_error
+    server = LibraryApi((args.host, args.port), session.data, ttl=args.cache_ttl)
+    server.start_catalog_sync(args.catalog_sync)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} with {args.pool_size} pooled connection(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        session.db.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+VERSIONS_QUERY = "SELECT CHANGE_TRACKING_CURRENT_VERSION(), CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID(?))"
+
+
+class ChangeTracker:
+    def __init__(self, db, schema):
+        self.db = db
+        self.schema = schema
+        self.tables = None
+
+    def load(self):
+        # Tables with SQL Server Change Tracking enabled (Database scripts/migrations/002);
+        # an older database simply has none and views fall back to re-reading the window.
+        try:
+            _, rows = self.db.query("SELECT OBJECT_NAME(object_id) FROM sys.change_tracking_tables")
+            self.tables = {row[0] for row in rows}
+        except Exception:
+            self.tables = set()
+
+    def tracks(self, table_name):
+        if self.tables is None:
+            self.load()
+        return table_name in self.tables
+
+    def current_version(self, table_name):
+        if not self.tracks(table_name):
+            return None
+        _, rows = self.db.query("SELECT CHANGE_TRACKING_CURRENT_VERSION()")
+        return rows[0][0]
+
+    def changes(self, table_name, since, where='', params=(), select='*'):
+        # Each changed key joined to its current row, restricted to the view's filter, so a
+        # missing row means it was deleted or no longer matches.
+        key = self.schema.primary_key(table_name)
+        join = ' AND '.join(f"v.{col} = ct.{col}" for col in key)
+        _, rows = self.db.query(
+            f"SELECT ct.SYS_CHANGE_OPERATION, {', '.join('ct.' + col for col in key)}, v.* "
+            f"FROM CHANGETABLE(CHANGES dbo.{table_name}, ?) AS ct "
+            f"LEFT JOIN (SELECT {select} FROM {table_name}{where}) AS v ON {join}", [since] + list(params))
+        present = 1 + len(key) + self.schema.columns(table_name).index(key[0])
+        changes = []
+        for row in rows:
+            changed_key = tuple(str(v).strip() for v in row[1:1 + len(key)])
+            current = tuple(row[1 + len(key):]) if row[present] is not None else None
+            changes.append((row[0], changed_key, current))
+        return changes
+
+    def sync(self, pager):
+        # Returns (version, changes); changes is None when the pager has no baseline yet or
+        # its version fell out of the retention window, and the caller must re-read instead.
+        _, rows = self.db.query(VERSIONS_QUERY, [pager.table_name])
+        version, min_valid = rows[0]
+        if pager.version is None or min_valid is None or pager.version < min_valid:
+            return version, None
+        if version == pager.version:
+            return version, []
+        return version, self.changes(pager.table_name, pager.version, pager.filtered(), pager.params, pager.projection())
@@ -0,0 +1,28 @@
+class Circulation:
+    # Thin client for the circulation procedures (Database scripts/migrations/004); queue
+    # positions and copy statuses are only ever assigned on the server, under copy row locks.
+    def __init__(self, db):
+        self.db = db
+
+    def id_list(self, ids):
+        ids = [(int(i),) for i in dict.fromkeys(ids)]
+        if not ids:
+            raise ValueError("No IDs given")
+        return ids
+
+    def reserve(self, copy_ids, member_id=None, staff_id=None, loan_days=14, reservation_id=None):
+        # Returns [(reservation_id, copy_id, position_in_queue)] for the queued copies.
+        with self.db.transaction() as cursor:
+            cursor.execute("EXEC reserve_copies @copies=?, @member_id=?, @staff_id=?, @loan_days=?, @reservation_id=?",
+                           [self.id_list(copy_ids), member_id, staff_id, loan_days, reservation_id])
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def return_reservations(self, reservation_ids):
+        with self.db.transaction() as cursor:
+            cursor.execute("EXEC return_reservations @reservations=?", [self.id_list(reservation_ids)])
+            return cursor.fetchone()[0]
+
+    def expire(self, as_of=None, batch_size=500):
+        # Commits batch by batch on the server, so it runs outside a client transaction.
+        _, rows = self.db.query("EXEC expire_reservations @as_of=?, @batch_size=?", [as_of, batch_size])
+        return rows[0][0]
@@ -0,0 +1,130 @@
+import os
+
+from changes import ChangeTracker
+from circulation import Circulation
+from export import EXPORT_BATCH, open_export
+from paging import KeysetPager
+from reports import Reports
+from search import SearchEngine
+
+LOGIN_QUERY = "SELECT staff_id, fname, lname, role FROM staff WHERE email=? AND password=?"
+
+# Rows a view shows before the user scrolls
+FIRST_SCREEN_ROWS = 50
+
+
+def authenticate(db, email, password):
+    return db.query(LOGIN_QUERY, [email, password])[1]
+
+
+class LibraryData:
+    # The data paths behind the screens, without Tk: the app runs these on its executor's
+    # workers, and benchmarks/ runs them directly against the SQLite stand-in (sqlite_backend.py).
+    # db is anything with DatabaseConnection's query/run/transaction/cursor interface.
+    def __init__(self, db, schema, tracker=None, catalog=None, circulation=None, reports=None):
+        self.db = db
+        self.schema = schema
+        self.search = SearchEngine(db, schema)
+        self.tracker = tracker or ChangeTracker(db, schema)
+        self.catalog = catalog
+        self.circulation = circulation or Circulation(db)
+        self.reports = reports or Reports(db)
+
+    def authenticate(self, email, password):
+        return authenticate(self.db, email, password)
+
+    def pager(self, table_name, predicate=('', []), **options):
+        # Catalog tables read from the local mirror once it has a copy, everything else from the server.
+        if self.catalog and self.catalog.covers(table_name):
+            return KeysetPager(self.catalog, self.schema, table_name, *predicate, tracker=self.catalog, **options)
+        return KeysetPager(self.db, self.schema, table_name, *predicate, tracker=self.tracker, **options)
+
+    def predicate(self, table_name, term):
+        if not term:
+            return '', []
+        return self.search.predicate(table_name, term) or ("(1=0)", [])
+
+    def open_view(self, table_name, term='', rows=FIRST_SCREEN_ROWS):
+        # The work behind opening a view or running a search: predicate, row count and first screen.
+        pager = self.pager(table_name, self.predicate(table_name, term))
+        pager.count()
+        pager.rows(0, rows)
+        return pager
+
+    def full_rows(self, table_name, key):
+        return self.db.query(f"SELECT * FROM {table_name} WHERE {self.schema.key_predicate(table_name)}", key)[1]
+
+    def insert_statement(self, table_name, columns):
+        return f"INSERT INTO {table_name} ({','.join(columns)}) VALUES ({','.join(['?'] * len(columns))})"
+
+    def update_statement(self, table_name, columns):
+        return f"UPDATE {table_name} SET {','.join(f'{col}=?' for col in columns)} WHERE {self.schema.key_predicate(table_name)}"
+
+    def delete_statement(self, table_name):
+        return f"DELETE FROM {table_name} WHERE {self.schema.key_predicate(table_name)}"
+
+    def caught_up(self, table_name):
+        if self.catalog:
+            self.catalog.catch_up(table_name)
+
+    def execute(self, table_name, query, params):
+        with self.db.transaction() as cursor:
+            cursor.execute(query, params)
+        self.caught_up(table_name)
+
+    def execute_many(self, table_name, query, param_rows, reload=None):
+        # One executemany in one transaction; reload re-reads the affected rows afterwards
+        # so the grid can patch them in place instead of reloading the table.
+        with self.db.transaction() as cursor:
+            # fast_executemany sends all rows in one round trip but buffers (MAX) columns at full size
+            cursor.fast_executemany = not self.schema.has_max_columns(table_name)
+            cursor.executemany(query, param_rows)
+        self.caught_up(table_name)
+        return reload() if reload else None
+
+    def insert(self, table_name, values):
+        self.execute(table_name, self.insert_statement(table_name, list(values)), list(values.values()))
+
+    def insert_rows(self, table_name, columns, rows):
+        self.execute_many(table_name, self.insert_statement(table_name, columns), rows)
+
+    def update_rows(self, table_name, columns, rows, pager=None):
+        # Each row holds the new values of columns followed by the key of the row to update
+        keys = [row[len(columns):] for row in rows]
+        return self.execute_many(table_name, self.update_statement(table_name, columns), rows,
+                                 reload=(lambda: pager.fetch_keys(keys)) if pager else None)
+
+    def delete_rows(self, table_name, keys):
+        self.execute_many(table_name, self.delete_statement(table_name), keys)
+
+    def export(self, table_name, path, predicate=('', []), progress=None, batch_size=EXPORT_BATCH):
+        # Streams a view or search result to disk in key order, one fetchmany batch at a time, over
+        # the forward-only result set pyodbc reads incrementally. The file only appears at path
+        # once complete; progress(rows written) runs after every batch and may raise to cancel.
+        where, params = predicate
+        columns = self.schema.columns(table_name)
+        base, extension = os.path.splitext(path)
+        partial = f"{base}.partial{extension}"
+        written = 0
+        with self.db.connection() as conn:
+            cursor = self.db.cursor(conn)
+            cursor.execute(f"SELECT * FROM {table_name}{f' WHERE {where}' if where else ''} "
+                           f"ORDER BY {', '.join(self.schema.primary_key(table_name))}", params)
+            out = open_export(partial, columns, {col: self.schema.column_type(table_name, col) for col in columns},
+                              self.schema.precisions(table_name))
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    out.write(rows)
+                    written += len(rows)
+                    if progress:
+                        progress(written)
+                out.close()
+            except BaseException:
+                out.close()
+                os.remove(partial)
+                raise
+        os.replace(partial, path)
+        return written
@@ -0,0 +1,227 @@
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+from instrumentation import Instrumentation, InstrumentedCursor
+
+
+class LazyModule:
+    # Imports the module on first attribute access. pyodbc loads the ODBC driver manager when
+    # imported, which holds up the login window on a cold start; Session.warm() calls load() on
+    # a worker thread instead.
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    def load(self):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return self.module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+pyodbc = LazyModule('pyodbc')
+
+# The instance the app, the migration scripts and the bulk loader all connect to by default
+SERVER = r'.\SQLEXPRESS'
+DATABASE = 'Book_haven'
+DRIVER = 'ODBC Driver 17 for SQL Server'
+
+# SQLSTATEs pyodbc reports when the server or network dropped the session
+DISCONNECT_STATES = {'08S01', '08001', '08003', '08004', '08007'}
+
+
+def is_disconnect(error):
+    return isinstance(error, pyodbc.Error) and bool(error.args) and error.args[0] in DISCONNECT_STATES
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+def add_connection_args(parser):
+    # Connection options of the command-line tools (Database scripts/, Notebooks/bulk_load.py)
+    parser.add_argument('--server', default=SERVER)
+    parser.add_argument('--database', default=DATABASE)
+    parser.add_argument('--user', help='SQL login; Windows authentication is used when omitted')
+    parser.add_argument('--password')
+
+
+def connect(args, autocommit=True):
+    conn_str = (
+        f'DRIVER={{{DRIVER}}};'
+        f'SERVER={args.server};'
+        f'DATABASE={args.database};'
+    )
+    if args.user:
+        conn_str += f'UID={args.user};PWD={args.password};'
+    else:
+        conn_str += 'Trusted_Connection=yes;'
+    return pyodbc.connect(conn_str, autocommit=autocommit)
+
+
+class DatabaseConnection:
+    # sys.partitions holds exact row counts, so unfiltered counts need no scan
+    metadata_counts = True
+
+    def __init__(self, pool_size=5, acquire_timeout=10, ping_after=30, metrics=None):
+        self.server = SERVER
+        self.database = DATABASE
+        self.username = 'flask_book_user'
+        self.password = '123456'
+        self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        self.ping_after = ping_after
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.metrics = metrics or Instrumentation()
+
+    def connection_string(self):
+        return (
+            f'DRIVER={{{DRIVER}}};'
+            f'SERVER={self.server};'
+            f'DATABASE={self.database};'
+            f'UID={self.username};'
+            f'PWD={self.password};'
+        )
+
+    def _connect(self):
+        # Idle pooled connections run in autocommit so they never sit on open
+        # transactions; transaction() switches it off for the duration of a write.
+        return pyodbc.connect(self.connection_string(), autocommit=True)
+
+    def warm(self):
+        # Loads the driver and parks one open connection in the pool for the first real query
+        with self.connection():
+            pass
+
+    def _is_alive(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def _purge_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def acquire(self):
+        started = time.perf_counter()
+        conn = self._acquire()
+        self.metrics.record_acquire((time.perf_counter() - started) * 1000)
+        return conn
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolExhaustedError(f"No free database connection after {self.acquire_timeout}s")
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    return self._connect()
+                conn, last_used = entry
+                if time.monotonic() - last_used < self.ping_after or self._is_alive(conn):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        try:
+            if broken:
+                self._discard(conn)
+                self._purge_idle()
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def cancellable(self, token):
+        # Cursors opened on this thread while the token is active are registered with
+        # token.track(), so another thread can abort the running statement via cursor.cancel().
+        self._local.token = token
+        try:
+            yield
+        finally:
+            self._local.token = None
+
+    def cursor(self, conn):
+        cursor = conn.cursor()
+        token = getattr(self._local, 'token', None)
+        if token is not None:
+            token.track(cursor)
+        return InstrumentedCursor(cursor, self.metrics)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except pyodbc.Error as e:
+            broken = is_disconnect(e)
+            raise
+        finally:
+            self.release(conn, broken)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.autocommit = False
+            try:
+                cursor = self.cursor(conn)
+                yield cursor
+                conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except pyodbc.Error:
+                    pass
+                raise
+            finally:
+                try:
+                    conn.autocommit = True
+                except pyodbc.Error:
+                    pass
+
+    def run(self, func, retries=1):
+        # Only safe for idempotent work: a dropped connection is replaced and func re-run.
+        for attempt in range(retries + 1):
+            try:
+                with self.connection() as conn:
+                    return func(conn)
+            except pyodbc.Error as e:
+                if attempt >= retries or not is_disconnect(e):
+                    raise
+
+    def query(self, sql, params=(), retries=1):
+        def fetch(conn):
+            cursor = self.cursor(conn)
+            cursor.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description]
+            return columns, cursor.fetchall()
+        return self.run(fetch, retries)
+
+    def close_all(self):
+        self._purge_idle()
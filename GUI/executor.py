@@ -0,0 +1,145 @@
+import queue
+import threading
+
+
+class CancelledError(Exception):
+    pass
+
+
+class Task:
+    def __init__(self, executor, func, on_done, on_error, on_batch, channel, background=False):
+        self.executor = executor
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_batch = on_batch
+        self.channel = channel
+        self.background = background
+        self.cancelled = False
+        self._cursors = []
+        self._lock = threading.Lock()
+
+    def track(self, cursor):
+        with self._lock:
+            if self.cancelled:
+                raise CancelledError()
+            self._cursors.append(cursor)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            cursors, self._cursors = self._cursors, []
+        for cursor in cursors:
+            try:
+                cursor.cancel()
+            except Exception:
+                pass
+
+    def emit(self, batch):
+        if self.cancelled:
+            raise CancelledError()
+        self.executor._results.put((self, 'batch', batch))
+
+
+class QueryExecutor:
+    def __init__(self, root, db, workers=2, poll_ms=25, on_error=None, on_busy=None):
+        self.root = root
+        self.db = db
+        self.poll_ms = poll_ms
+        self.on_error = on_error
+        self.on_busy = on_busy
+        self.channels = {}
+        self.active = set()
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._stopped = False
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+        self._after = self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, func, on_done=None, on_error=None, channel=None, background=False):
+        # Background tasks (e.g. auto-refresh polls) do not show the busy indicator.
+        return self._enqueue(lambda task: func(), on_done, on_error, None, channel, background)
+
+    def stream(self, func, on_batch, on_done=None, on_error=None, channel=None):
+        # func(task) runs on a worker and hands rows back with task.emit(batch);
+        # each batch reaches on_batch on the Tk thread in order.
+        return self._enqueue(func, on_done, on_error, on_batch, channel)
+
+    def _enqueue(self, func, on_done, on_error, on_batch, channel, background=False):
+        task = Task(self, func, on_done, on_error, on_batch, channel, background)
+        if channel is not None:
+            previous = self.channels.get(channel)
+            if previous:
+                previous.cancel()
+            self.channels[channel] = task
+        self.active.add(task)
+        self._notify_busy()
+        self._tasks.put(task)
+        return task
+
+    def cancel(self, channel):
+        task = self.channels.get(channel)
+        if task:
+            task.cancel()
+
+    def cancel_all(self):
+        for task in list(self.active):
+            task.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        self._stopped = True
+        for _ in self._threads:
+            self._tasks.put(None)
+        try:
+            self.root.after_cancel(self._after)
+        except Exception:
+            pass
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            if task.cancelled:
+                self._results.put((task, 'cancelled', None))
+                continue
+            try:
+                with self.db.cancellable(task):
+                    result = task.func(task)
+                self._results.put((task, 'done', result))
+            except Exception as e:
+                self._results.put((task, 'error', e))
+
+    def _poll(self):
+        try:
+            while True:
+                self._deliver(*self._results.get_nowait())
+        except queue.Empty:
+            pass
+        if not self._stopped:
+            self._after = self.root.after(self.poll_ms, self._poll)
+
+    def _deliver(self, task, kind, payload):
+        if kind != 'batch':
+            self.active.discard(task)
+            if self.channels.get(task.channel) is task:
+                del self.channels[task.channel]
+            self._notify_busy()
+        if task.cancelled or kind == 'cancelled':
+            return
+        if kind == 'batch':
+            task.on_batch(payload)
+        elif kind == 'done':
+            if task.on_done:
+                task.on_done(payload)
+        else:
+            handler = task.on_error or self.on_error
+            if handler:
+                handler(payload)
+
+    def _notify_busy(self):
+        if self.on_busy:
+            self.on_busy(sum(1 for task in self.active if not task.background))
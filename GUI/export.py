@@ -0,0 +1,97 @@
+import csv
+import datetime
+import os
+from decimal import Decimal
+
+from schema import DECIMAL_TYPES, INTEGER_TYPES
+
+# Rows fetched, written and reported per step; memory stays at one batch whatever the table size
+EXPORT_BATCH = 5000
+
+FORMATS = {'.csv': 'CSV', '.parquet': 'Parquet'}
+
+# SQL Server's fixed (precision, scale), for catalogs that do not report them
+MONEY_PRECISIONS = {'money': (19, 4), 'smallmoney': (10, 4)}
+
+
+def as_date(value):
+    return datetime.date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+
+def as_float(value):
+    return float(value) if isinstance(value, (Decimal, str)) else value
+
+
+def as_decimal(scale):
+    # Drivers hand back Decimal, SQLite a float; either way quantized to the column's scale
+    step = Decimal(1).scaleb(-scale)
+    return lambda value: Decimal(str(value)).quantize(step)
+
+
+class CsvExport:
+    def __init__(self, path, columns, types, precisions=None):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetExport:
+    # One row group per batch, typed from the schema catalog so readers get numbers and dates, not text.
+    # Decimal and money columns keep their exact precision and scale; only float and real are doubles.
+    def __init__(self, path, columns, types, precisions=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from e
+        self.pa = pa
+        precisions = precisions or {}
+        fields, self.converters = [], []
+        for col in columns:
+            data_type = types.get(col)
+            if data_type in INTEGER_TYPES:
+                fields.append(pa.field(col, pa.int64()))
+                self.converters.append(None)
+            elif data_type == 'bit':
+                fields.append(pa.field(col, pa.bool_()))
+                self.converters.append(bool)
+            elif data_type in DECIMAL_TYPES:
+                precision, scale = precisions.get(col) or MONEY_PRECISIONS.get(data_type, (38, 4))
+                fields.append(pa.field(col, pa.decimal128(precision, scale)))
+                self.converters.append(as_decimal(scale))
+            elif data_type in ('float', 'real'):
+                fields.append(pa.field(col, pa.float64()))
+                self.converters.append(as_float)
+            elif data_type == 'date':
+                fields.append(pa.field(col, pa.date32()))
+                self.converters.append(as_date)
+            else:
+                fields.append(pa.field(col, pa.string()))
+                self.converters.append(lambda value: value if isinstance(value, str) else str(value))
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(path, self.schema, compression='snappy')
+
+    def write(self, rows):
+        arrays = []
+        for i, (field, convert) in enumerate(zip(self.schema, self.converters)):
+            values = [row[i] for row in rows]
+            if convert:
+                values = [None if value is None else convert(value) for value in values]
+            arrays.append(self.pa.array(values, type=field.type))
+        self.writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_export(path, columns, types, precisions=None):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Export to {', '.join(FORMATS)} files")
+    return (ParquetExport if extension == '.parquet' else CsvExport)(path, columns, types, precisions)
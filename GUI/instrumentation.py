@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+DEFAULT_LOG_PATH = os.path.join(os.path.expanduser('~'), '.book_haven', 'diagnostics.log')
+SLOW_QUERY_MS = 500
+SAMPLES_PER_SERIES = 1000
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else None
+
+
+def estimate_bytes(rows):
+    # Rough wire size: text and binary by length, everything else as a fixed-width value.
+    return sum(len(v) if isinstance(v, (str, bytes)) else 8 for row in rows for v in row if v is not None)
+
+
+def statement_kind(sql):
+    words = sql.lstrip().split(None, 1)
+    return words[0].upper() if words else '?'
+
+
+class Timer:
+    def __init__(self, metrics, action, fields):
+        self.metrics = metrics
+        self.action = action
+        self.fields = fields
+        self.started = time.perf_counter()
+        self.done = False
+
+    def finish(self, error=None, **fields):
+        if self.done:
+            return
+        self.done = True
+        self.metrics.record_action(self.action, (time.perf_counter() - self.started) * 1000, error,
+                                   **dict(self.fields, **fields))
+
+
+class Instrumentation:
+    # Latency samples per series (UI actions, queries by statement kind, connection acquire) for
+    # the diagnostics panel, and a rotating JSON-lines log of actions, slow queries and errors.
+    # Query parameters are never logged, since the login query carries the password.
+    def __init__(self, log_path=DEFAULT_LOG_PATH, slow_ms=SLOW_QUERY_MS, max_bytes=5 * 1024 * 1024, backups=5):
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self.series = {}
+        self.slow = deque(maxlen=100)
+        self._lock = threading.Lock()
+        # A private logger, so repeated instances never stack handlers on a shared one
+        self.logger = logging.Logger('book_haven.diagnostics', logging.INFO)
+        # Without a file nothing is written, not even to stderr
+        self.logger.addHandler(logging.NullHandler())
+        if log_path:
+            try:
+                os.makedirs(os.path.dirname(log_path), exist_ok=True)
+                handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                self.logger.addHandler(handler)
+            except OSError:
+                pass
+
+    def log(self, event, level=logging.INFO, **fields):
+        self.logger.log(level, json.dumps(dict(ts=datetime.now().isoformat(timespec='milliseconds'), event=event,
+                                               thread=threading.current_thread().name, **fields), default=str))
+
+    def sample(self, name, ms):
+        with self._lock:
+            self.series.setdefault(name, deque(maxlen=SAMPLES_PER_SERIES)).append(ms)
+
+    def start(self, action, **fields):
+        return Timer(self, action, fields)
+
+    def record_action(self, action, ms, error=None, **fields):
+        self.sample(action, ms)
+        if error is None:
+            self.log('action', action=action, ms=round(ms, 1), **fields)
+        else:
+            self.log('action', logging.ERROR, action=action, ms=round(ms, 1), error=str(error), **fields)
+
+    def record_acquire(self, ms):
+        self.sample('db: acquire connection', ms)
+        if ms >= self.slow_ms:
+            self.log('slow_acquire', logging.WARNING, ms=round(ms, 1))
+
+    def record_query(self, sql, ms, rows=None, size=None, error=None, source='server', **fields):
+        self.sample(f"db: {statement_kind(sql)}" if source == 'server' else f"{source}: {statement_kind(sql)}", ms)
+        if error is not None:
+            self.log('query_error', logging.ERROR, source=source, sql=sql[:500], ms=round(ms, 1), error=str(error), **fields)
+        elif ms >= self.slow_ms:
+            entry = dict(source=source, sql=sql[:500], ms=round(ms, 1), rows=rows, bytes=size, **fields)
+            with self._lock:
+                self.slow.append(dict(entry, ts=datetime.now().strftime('%H:%M:%S')))
+            self.log('slow_query', logging.WARNING, **entry)
+
+    def record_error(self, error, **fields):
+        self.log('error', logging.ERROR, error=str(error), type=type(error).__name__, **fields)
+
+    def summary(self):
+        # [(series, count, p50, p95, max)] sorted by p95, slowest first
+        with self._lock:
+            series = {name: list(values) for name, values in self.series.items()}
+        rows = [(name, len(values), percentile(values, 0.5), percentile(values, 0.95), max(values))
+                for name, values in series.items() if values]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def slow_queries(self):
+        with self._lock:
+            return list(reversed(self.slow))
+
+    def reset(self):
+        with self._lock:
+            self.series.clear()
+            self.slow.clear()
+
+
+class InstrumentedCursor:
+    # Wraps a pyodbc cursor: execute time plus fetch time, rows and approximate bytes are
+    # recorded once per statement, when its results have been read or it has no result set.
+    def __init__(self, cursor, metrics):
+        self.__dict__.update(_cursor=cursor, _metrics=metrics, _pending=None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+    def _flush(self):
+        pending = self._pending
+        if pending:
+            self.__dict__['_pending'] = None
+            self._metrics.record_query(pending['sql'], pending['ms'], pending['rows'], pending['bytes'])
+
+    def _run(self, method, sql, args, executemany=False):
+        self._flush()
+        started = time.perf_counter()
+        try:
+            method(sql, *args)
+        except Exception as e:
+            self._metrics.record_query(sql, (time.perf_counter() - started) * 1000, error=e)
+            raise
+        pending = {'sql': sql, 'ms': (time.perf_counter() - started) * 1000, 'rows': 0, 'bytes': 0}
+        if executemany:
+            pending['rows'] = len(args[0]) if args else 0
+        self.__dict__['_pending'] = pending
+        if executemany or self._cursor.description is None:
+            self._flush()
+        return self
+
+    def execute(self, sql, *args):
+        return self._run(self._cursor.execute, sql, args)
+
+    def executemany(self, sql, *args):
+        return self._run(self._cursor.executemany, sql, args, executemany=True)
+
+    def _fetched(self, rows, started, complete):
+        pending = self._pending
+        if pending:
+            pending['ms'] += (time.perf_counter() - started) * 1000
+            pending['rows'] += len(rows)
+            pending['bytes'] += estimate_bytes(rows)
+            if complete:
+                self._flush()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        return self._fetched(self._cursor.fetchall(), started, True)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        return self._fetched(rows, started, not rows or (size is not None and len(rows) < size))
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched([row] if row is not None else [], started, True)
+        return row
+
+    def close(self):
+        self._flush()
+        self._cursor.close()
@@ -1,36 +1,52 @@
+import time
+
+# Process start, for the time-to-interactive figures in Tools > Diagnostics
+STARTED = time.perf_counter()
+
+import csv
+import io
 import tkinter as tk
-from tkinter import ttk, messagebox
-import pyodbc
+from decimal import Decimal
+from tkinter import ttk, messagebox, filedialog
+from virtual_grid import VirtualTreeview
+from executor import QueryExecutor
+from search import SearchCache
+from session import Session
+from reports import REPORTS, PERIODS
+from permissions import PERMISSIONS, CIRCULATION_TABLES, REPORT_ROLES, has_permission
+
+SEARCH_DEBOUNCE_MS = 300
+AUTO_REFRESH_CHOICES = {"Off": 0, "5 s": 5000, "15 s": 15000, "30 s": 30000, "1 min": 60000}
+CATALOG_SYNC_MS = 60000
+
+# Loan period the New Reservation dialog starts with
+DEFAULT_LOAN_DAYS = 14
+
+# Offered by the bulk update dialog alongside the values already in the selection
+COLUMN_CHOICES = {
+    ('book_copy', 'status'): ['Available', 'Reserved', 'Checked Out', 'Damaged', 'Lost'],
+    ('book_copy', 'condition'): ['New', 'Good', 'Fair', 'Poor'],
+    ('staff', 'role'): ['Manager', 'Librarian', 'Assistant', 'Technician'],
+}
+
+def reset_root(root):
+    # Login and main window take turns in the one Tk root
+    for widget in root.winfo_children():
+        widget.destroy()
+    root.config(menu="")
 
-class DatabaseConnection:
-    def __init__(self):
-        self.server = r'.\SQLEXPRESS'
-        self.database = 'Book_haven'
-        self.username = 'flask_book_user'
-        self.password = '123456'
-        
-    def get_connection(self):
-        try:
-            conn_str = (
-                f'DRIVER={{ODBC Driver 17 for SQL Server}};'
-                f'SERVER={self.server};'
-                f'DATABASE={self.database};'
-                f'UID={self.username};'
-                f'PWD={self.password};'
-            )
-            return pyodbc.connect(conn_str)
-        except Exception as e:
-            messagebox.showerror("Connection Error", f"Failed to connect:\n{str(e)}")
-            return None
 
 class LoginWindow:
-    def __init__(self, root, callback):
+    def __init__(self, root, callback, session=None):
         self.root = root
         self.callback = callback
         self.root.title("Library Management System - Login")
-        self.root.geometry("400x300")
-        self.db = DatabaseConnection()
+        self.root.geometry("400x320")
+        self.session = session or Session()
+        self.db = self.session.db
+        self.executor = QueryExecutor(self.root, self.db, on_error=self.on_auth_error)
         self.create_login_ui()
+        self.warm_up()
         
     def create_login_ui(self):
         header = tk.Frame(self.root, bg="#2c3e50", height=80)
@@ -51,13 +67,34 @@ class LoginWindow:
         self.password_entry = tk.Entry(form, font=("Arial", 11), width=25, show="*")
         self.password_entry.grid(row=1, column=1, pady=10)
         
-        tk.Button(form, text="Login", command=self.authenticate, bg="#27ae60", fg="white", 
-                 font=("Arial", 11, "bold"), padx=30, pady=8).grid(row=2, column=0, columnspan=2, pady=20)
+        self.login_button = tk.Button(form, text="Login", command=self.authenticate, bg="#27ae60", fg="white", 
+                                      font=("Arial", 11, "bold"), padx=30, pady=8)
+        self.login_button.grid(row=2, column=0, columnspan=2, pady=20)
+        self.status = tk.Label(form, text="", font=("Arial", 9), bg="#ecf0f1", fg="#7f8c8d")
+        self.status.grid(row=3, column=0, columnspan=2)
         
         self.email_entry.bind('<Return>', lambda e: self.authenticate())
         self.password_entry.bind('<Return>', lambda e: self.authenticate())
         self.email_entry.focus()
         
+    def warm_up(self):
+        # Driver, connection and schema load in the background while the user types
+        if self.session.warmed:
+            self.status.config(text="Connected")
+            return
+        self.status.config(text="Connecting to the database...")
+        self.executor.submit(self.session.warm, on_done=self.on_warm, on_error=self.on_warm_error,
+                             channel="warm-up", background=True)
+        
+    def on_warm(self, steps):
+        if steps:
+            self.status.config(text=f"Connected in {sum(steps.values()):.0f} ms", fg="#7f8c8d")
+            
+    def on_warm_error(self, error):
+        # Logging in tries again, so this only warns
+        self.db.metrics.record_error(error)
+        self.status.config(text="Database not reachable yet", fg="#c0392b")
+        
     def authenticate(self):
         email = self.email_entry.get().strip()
         password = self.password_entry.get().strip()
@@ -66,91 +103,73 @@ class LoginWindow:
             messagebox.showwarning("Login Failed", "Enter email and password")
             return
         
-        conn = self.db.get_connection()
-        if not conn:
-            return
+        self.login_button.config(state=tk.DISABLED, text="Logging in...")
+        self.login_timer = self.db.metrics.start("login")
+        def work():
+            self.session.warm()
+            return self.session.data.authenticate(email, password)
+        self.executor.submit(work, on_done=self.on_authenticated, channel="login")
         
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT staff_id, fname, lname, role FROM staff WHERE email=? AND password=?", [email, password])
-            result = cursor.fetchone()
+    def on_authenticated(self, rows):
+        self.login_timer.finish(success=bool(rows))
+        self.login_button.config(state=tk.NORMAL, text="Login")
+        if rows:
+            result = rows[0]
+            staff_data = {'staff_id': result[0], 'fname': result[1], 'lname': result[2], 'role': result[3]}
+            self.executor.shutdown()
+            self.callback(staff_data)
+        else:
+            messagebox.showerror("Login Failed", "Invalid credentials")
+            self.password_entry.delete(0, tk.END)
             
-            if result:
-                staff_data = {'staff_id': result[0], 'fname': result[1], 'lname': result[2], 'role': result[3]}
-                conn.close()
-                self.root.withdraw()
-                self.callback(staff_data)
-            else:
-                messagebox.showerror("Login Failed", "Invalid credentials")
-                self.password_entry.delete(0, tk.END)
-                conn.close()
-        except Exception as e:
-            messagebox.showerror("Error", f"Authentication failed: {str(e)}")
-            if conn:
-                conn.close()
+    def on_auth_error(self, error):
+        self.login_timer.finish(error)
+        self.login_button.config(state=tk.NORMAL, text="Login")
+        messagebox.showerror("Error", f"Authentication failed: {str(error)}")
 
 class LibraryManagementSystem:
-    def __init__(self, root, staff_data):
+    def __init__(self, root, staff_data, session=None, on_logout=None):
         self.root = root
         self.staff_data = staff_data
+        self.on_logout = on_logout
         self.root.title("Library Management System")
         self.root.geometry("1200x700")
-        self.db = DatabaseConnection()
-        
-        self.permissions = {
-            'Assistant': {'tables': ['member', 'reservation', 'reservation_details'], 
-                         'can_add': ['member', 'reservation', 'reservation_details'], 
-                         'can_edit': ['reservation', 'reservation_details'], 'can_delete': []},
-            'Librarian': {'tables': ['author', 'book', 'book_copy', 'category', 'description', 'book_author', 'book_category', 'member'],
-                         'can_add': ['author', 'book', 'book_copy', 'category', 'description', 'book_author', 'book_category'],
-                         'can_edit': ['author', 'book', 'book_copy', 'category', 'description', 'book_author', 'book_category'],
-                         'can_delete': ['book_copy', 'book_author', 'book_category']},
-            'Manager': {'tables': ['author', 'book', 'book_copy', 'category', 'description', 'staff', 'member', 'reservation', 'reservation_details', 'book_author', 'book_category'],
-                       'can_add': 'all', 'can_edit': 'all', 'can_delete': 'all'},
-            'Technician': {'tables': ['book_copy'], 'can_add': [], 'can_edit': ['book_copy'], 'can_delete': []}
-        }
-        
-        self.identity_columns = self.get_all_identity_columns()
-        self.create_menu()
-        self.create_main_layout()
+        self.session = session or Session()
+        self.db = self.session.db
+        
+        self.permissions = PERMISSIONS
         
-    def get_all_identity_columns(self):
-        conn = self.db.get_connection()
-        if not conn:
-            return {}
-        identity_cols = {}
+        self.metrics = self.db.metrics
+        ready_timer = self.metrics.start("startup: main window")
+        self.schema = self.session.schema
+        self.executor = QueryExecutor(self.root, self.db, on_error=self.show_error, on_busy=self.set_busy)
+        self.search_cache = SearchCache()
+        self.search_after = None
+        self.searched_term = None
+        self.tracker = self.session.tracker
+        self.auto_refresh = tk.StringVar(value="Off")
+        self.poll_after = None
+        self.catalog = self.session.catalog
+        self.catalog_after = None
+        self.data = self.session.data
+        self.search = self.data.search
+        self.circulation = self.data.circulation
+        self.reports = self.data.reports
+        # Already done by the login window's warm-up, unless started without one
         try:
-            cursor = conn.cursor()
-            query = """SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS 
-                      WHERE COLUMNPROPERTY(OBJECT_ID(TABLE_SCHEMA + '.' + TABLE_NAME), COLUMN_NAME, 'IsIdentity') = 1 
-                      AND TABLE_SCHEMA = 'dbo'"""
-            cursor.execute(query)
-            for row in cursor.fetchall():
-                if row[0] not in identity_cols:
-                    identity_cols[row[0]] = []
-                identity_cols[row[0]].append(row[1])
-        except:
-            pass
-        finally:
-            conn.close()
-        return identity_cols
+            self.session.warm()
+            if self.session.metadata_error:
+                raise self.session.metadata_error
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load schema:\n{str(e)}")
+        self.create_menu()
+        self.create_main_layout()
+        self.sync_catalog()
+        # Idle callbacks run once the window has been drawn
+        self.root.after_idle(ready_timer.finish)
         
     def has_permission(self, action, table_name):
-        role = self.staff_data['role']
-        if role not in self.permissions:
-            return False
-        perms = self.permissions[role]
-        if table_name not in perms['tables']:
-            return False
-        if action == 'view':
-            return True
-        elif action == 'add':
-            return perms['can_add'] == 'all' or table_name in perms['can_add']
-        elif action == 'edit':
-            return perms['can_edit'] == 'all' or table_name in perms['can_edit']
-        elif action == 'delete':
-            return perms['can_delete'] == 'all' or table_name in perms['can_delete']
-        return False
+        return has_permission(self.staff_data['role'], action, table_name, self.permissions)
         
     def create_menu(self):
         menubar = tk.Menu(self.root)
@@ -159,7 +178,7 @@ class LibraryManagementSystem:
         tables_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Tables", menu=tables_menu)
         
-        for label, table in [("Authors", "author"), ("Books", "book"), ("Book Copies", "book_copy"), 
+        for label, table in [("Catalog", "book_catalog"), ("Authors", "author"), ("Books", "book"), ("Book Copies", "book_copy"), 
                             ("Categories", "category"), ("Descriptions", "description"), ("Staff", "staff"), 
                             ("Members", "member"), ("Reservations", "reservation")]:
             if self.has_permission('view', table):
@@ -173,16 +192,29 @@ class LibraryManagementSystem:
             if self.has_permission('view', table):
                 rel_menu.add_command(label=label, command=lambda t=table: self.show_table_view(t))
         
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+        if self.staff_data['role'] in REPORT_ROLES:
+            tools_menu.add_command(label="Reports", command=self.show_reports)
+        tools_menu.add_command(label="Diagnostics", command=self.show_diagnostics)
+        
         account_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Account", menu=account_menu)
         account_menu.add_command(label="Logout", command=self.logout)
         
     def logout(self):
         if messagebox.askyesno("Logout", "Are you sure?"):
-            self.root.destroy()
-            new_root = tk.Tk()
-            LoginWindow(new_root, lambda sd: LibraryManagementSystem(new_root, sd))
-            new_root.mainloop()
+            # The root and the session (pool, schema, caches) stay for the next login
+            self.cancel_pending_search()
+            self.cancel_poll()
+            if self.catalog_after:
+                self.root.after_cancel(self.catalog_after)
+            self.executor.shutdown()
+            self.session.logout()
+            if self.on_logout:
+                self.on_logout()
+            else:
+                self.root.destroy()
         
     def create_main_layout(self):
         title_frame = tk.Frame(self.root, bg="#2c3e50", height=60)
@@ -192,10 +224,171 @@ class LibraryManagementSystem:
         tk.Label(title_frame, text=f"{self.staff_data['fname']} {self.staff_data['lname']} ({self.staff_data['role']})",
                 font=("Arial", 11), bg="#2c3e50", fg="#ecf0f1").pack(side=tk.RIGHT, padx=20, pady=15)
         
+        self.busy_frame = tk.Frame(title_frame, bg="#2c3e50")
+        self.busy_bar = ttk.Progressbar(self.busy_frame, mode="indeterminate", length=100)
+        self.busy_bar.pack(side=tk.LEFT, padx=5)
+        tk.Button(self.busy_frame, text="Cancel", command=self.cancel_queries,
+                 bg="#95a5a6", fg="white", padx=10).pack(side=tk.LEFT, padx=5)
+        
         self.content_frame = tk.Frame(self.root)
         self.content_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         self.show_welcome()
         
+    def set_busy(self, active):
+        if active and not self.busy_frame.winfo_ismapped():
+            self.busy_frame.pack(side=tk.RIGHT, padx=10)
+            self.busy_bar.start(10)
+        elif not active and self.busy_frame.winfo_ismapped():
+            self.busy_bar.stop()
+            self.busy_frame.pack_forget()
+            
+    def cancel_queries(self):
+        self.executor.cancel_all()
+        if getattr(self, 'grid', None) and self.grid.tree.winfo_exists():
+            self.grid.status.config(text="Cancelled")
+            
+    def show_error(self, error):
+        self.metrics.record_error(error)
+        messagebox.showerror("Error", str(error))
+        
+    def failed_action(self, timer):
+        def failed(error):
+            timer.finish(error)
+            self.show_error(error)
+        return failed
+        
+    def show_diagnostics(self):
+        # p50/p95 per UI action and query kind, plus the most recent slow queries
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Diagnostics")
+        dialog.geometry("900x560")
+        
+        top = tk.Frame(dialog)
+        top.pack(fill=tk.X, padx=10, pady=10)
+        tk.Label(top, text="Slow query threshold (ms):", font=("Arial", 10)).pack(side=tk.LEFT)
+        threshold = tk.IntVar(value=self.metrics.slow_ms)
+        def set_threshold():
+            try:
+                self.metrics.slow_ms = max(1, threshold.get())
+            except tk.TclError:
+                pass
+        tk.Spinbox(top, from_=10, to=60000, increment=50, textvariable=threshold, width=8,
+                   command=set_threshold).pack(side=tk.LEFT, padx=5)
+        threshold.trace_add("write", lambda *args: set_threshold())
+        tk.Label(top, text=f"Log: {self.metrics.log_path}", font=("Arial", 9), fg="#7f8c8d").pack(side=tk.RIGHT)
+        
+        tk.Label(dialog, text="Latency by action", font=("Arial", 11, "bold")).pack(anchor=tk.W, padx=10)
+        actions = ttk.Treeview(dialog, columns=("action", "count", "p50", "p95", "max"), show="headings", height=9)
+        for col, heading, width in [("action", "Action", 260), ("count", "Count", 80), ("p50", "p50 ms", 100),
+                                    ("p95", "p95 ms", 100), ("max", "Max ms", 100)]:
+            actions.heading(col, text=heading)
+            actions.column(col, width=width)
+        actions.pack(fill=tk.X, padx=10, pady=5)
+        
+        tk.Label(dialog, text="Recent slow queries", font=("Arial", 11, "bold")).pack(anchor=tk.W, padx=10)
+        slow = ttk.Treeview(dialog, columns=("ts", "ms", "rows", "bytes", "sql"), show="headings", height=9)
+        for col, heading, width in [("ts", "Time", 80), ("ms", "ms", 80), ("rows", "Rows", 70), ("bytes", "Bytes", 90),
+                                    ("sql", "SQL", 560)]:
+            slow.heading(col, text=heading)
+            slow.column(col, width=width)
+        slow.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def update():
+            if not dialog.winfo_exists():
+                return
+            actions.delete(*actions.get_children())
+            for name, count, p50, p95, longest in self.metrics.summary():
+                actions.insert("", tk.END, values=(name, count, f"{p50:.1f}", f"{p95:.1f}", f"{longest:.1f}"))
+            slow.delete(*slow.get_children())
+            for entry in self.metrics.slow_queries():
+                slow.insert("", tk.END, values=(entry['ts'], entry['ms'], entry['rows'] if entry['rows'] is not None else "",
+                                                entry['bytes'] if entry['bytes'] is not None else "",
+                                                ' '.join(entry['sql'].split())))
+            dialog.after(2000, update)
+        
+        btn_frame = tk.Frame(dialog)
+        btn_frame.pack(pady=10)
+        tk.Button(btn_frame, text="Reset", command=lambda: (self.metrics.reset(), update()),
+                 bg="#e67e22", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Close", command=dialog.destroy, bg="#95a5a6", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
+        update()
+        
+    def show_reports(self):
+        # Reads only the reporting summaries, after folding in the reservations changed since the last refresh
+        if self.staff_data['role'] not in REPORT_ROLES:
+            messagebox.showerror("Access Denied", "No permission")
+            return
+        self.cancel_pending_search()
+        self.cancel_poll()
+        self.clear_content()
+        
+        tk.Label(self.content_frame, text="Reports", font=("Arial", 16, "bold")).pack(pady=10)
+        top = tk.Frame(self.content_frame)
+        top.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(top, text="Period:", font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+        period = tk.StringVar(value="30 days")
+        period_box = ttk.Combobox(top, textvariable=period, values=list(PERIODS), state="readonly", width=8)
+        period_box.pack(side=tk.LEFT)
+        tk.Button(top, text="Refresh", command=lambda: load(refresh=True),
+                 bg="#3498db", fg="white", padx=20).pack(side=tk.LEFT, padx=10)
+        updated = tk.Label(top, text="", font=("Arial", 9), fg="#7f8c8d")
+        updated.pack(side=tk.RIGHT)
+        totals = tk.Label(self.content_frame, text="Loading...", font=("Arial", 11))
+        totals.pack(anchor=tk.W, padx=15, pady=5)
+        
+        notebook = ttk.Notebook(self.content_frame)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        trees = {}
+        for title, _, _ in REPORTS:
+            frame = tk.Frame(notebook)
+            notebook.add(frame, text=title)
+            tree = ttk.Treeview(frame, show="headings")
+            scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            tree.pack(fill=tk.BOTH, expand=True)
+            trees[title] = tree
+        
+        def cell(value):
+            if value is None:
+                return ""
+            return f"{value:,.2f}" if isinstance(value, (float, Decimal)) else value
+        
+        def read(days, refresh):
+            if refresh:
+                self.reports.refresh()
+            return self.reports.summary(days), {title: self.reports.report(title, days) for title, _, _ in REPORTS}
+        
+        def shown(result, timer):
+            timer.finish()
+            if not notebook.winfo_exists():
+                return
+            summary, reports = result
+            totals.config(text=f"Open reservations: {summary['open']:,}    Overdue: {summary['overdue']:,}    "
+                               f"Reserved in the last {period.get()}: {summary['reservations']:,} "
+                               f"({summary['copies']:,} copies)")
+            if summary['refreshed']:
+                refreshed_at, changed, ms = summary['refreshed']
+                updated.config(text=f"Summaries updated {str(refreshed_at)[:19]} UTC ({changed:,} reservation(s), {ms} ms)")
+            for title, (columns, rows) in reports.items():
+                tree = trees[title]
+                tree.delete(*tree.get_children())
+                tree["columns"] = columns
+                for col in columns:
+                    tree.heading(col, text=col.replace('_', ' ').title())
+                    tree.column(col, width=130)
+                for row in rows:
+                    tree.insert("", tk.END, values=[cell(value) for value in row])
+        
+        def load(refresh=False):
+            days = PERIODS[period.get()]
+            timer = self.metrics.start("reports", period=period.get(), refresh=refresh)
+            self.executor.submit(lambda: read(days, refresh), on_done=lambda result: shown(result, timer),
+                                 on_error=self.failed_action(timer), channel="reports")
+        
+        period_box.bind("<<ComboboxSelected>>", lambda e: load())
+        load(refresh=True)
+        
     def show_welcome(self):
         self.clear_content()
         tk.Label(self.content_frame, text=f"Welcome, {self.staff_data['fname']}!", 
@@ -211,6 +404,8 @@ class LibraryManagementSystem:
         if not self.has_permission('view', table_name):
             messagebox.showerror("Access Denied", "No permission")
             return
+        self.cancel_pending_search()
+        self.cancel_poll()
         self.clear_content()
         
         tk.Label(self.content_frame, text=f"Manage {table_name.replace('_', ' ').title()}", 
@@ -225,6 +420,10 @@ class LibraryManagementSystem:
                  bg="#9b59b6", fg="white", padx=15, pady=3).pack(side=tk.LEFT, padx=5)
         tk.Button(search_frame, text="Clear", command=lambda: self.clear_search(table_name),
                  bg="#95a5a6", fg="white", padx=15, pady=3).pack(side=tk.LEFT, padx=5)
+        self.instant_search = tk.BooleanVar(value=True)
+        tk.Checkbutton(search_frame, text="Search as you type", variable=self.instant_search).pack(side=tk.LEFT, padx=5)
+        self.search_entry.bind('<KeyRelease>', lambda e: self.schedule_search(table_name))
+        self.search_entry.bind('<Return>', lambda e: self.search_table(table_name))
         
         btn_frame = tk.Frame(self.content_frame)
         btn_frame.pack(pady=10)
@@ -235,69 +434,221 @@ class LibraryManagementSystem:
         if self.has_permission('edit', table_name):
             tk.Button(btn_frame, text="Edit Selected", command=lambda: self.edit_record(table_name),
                      bg="#f39c12", fg="white", padx=20, pady=5).pack(side=tk.LEFT, padx=5)
+            tk.Button(btn_frame, text="Bulk Update", command=lambda: self.bulk_update(table_name),
+                     bg="#d35400", fg="white", padx=20, pady=5).pack(side=tk.LEFT, padx=5)
+        if self.has_permission('add', table_name) or self.has_permission('edit', table_name):
+            tk.Button(btn_frame, text="Import", command=lambda: self.import_records(table_name),
+                     bg="#16a085", fg="white", padx=20, pady=5).pack(side=tk.LEFT, padx=5)
+        if table_name == 'reservation' and self.has_permission('edit', table_name):
+            tk.Button(btn_frame, text="Return Selected", command=self.return_reservations,
+                     bg="#2980b9", fg="white", padx=20, pady=5).pack(side=tk.LEFT, padx=5)
+            tk.Button(btn_frame, text="Expire Overdue", command=self.expire_reservations,
+                     bg="#7f8c8d", fg="white", padx=20, pady=5).pack(side=tk.LEFT, padx=5)
         if self.has_permission('delete', table_name):
             tk.Button(btn_frame, text="Delete Selected", command=lambda: self.delete_record(table_name),
                      bg="#e74c3c", fg="white", padx=20, pady=5).pack(side=tk.LEFT, padx=5)
-        tk.Button(btn_frame, text="Refresh", command=lambda: self.show_table_view(table_name),
+        tk.Button(btn_frame, text="Export", command=lambda: self.export_records(table_name),
+                 bg="#8e44ad", fg="white", padx=20, pady=5).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Refresh", command=lambda: self.refresh_table_view(table_name),
                  bg="#3498db", fg="white", padx=20, pady=5).pack(side=tk.LEFT, padx=5)
-        
-        tree_frame = tk.Frame(self.content_frame)
-        tree_frame.pack(fill=tk.BOTH, expand=True, pady=10)
-        
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
-        hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
+        tk.Label(btn_frame, text="Auto-refresh:", font=("Arial", 10)).pack(side=tk.LEFT, padx=(15, 5))
+        auto_box = ttk.Combobox(btn_frame, textvariable=self.auto_refresh, values=list(AUTO_REFRESH_CHOICES),
+                                state="readonly", width=6)
+        auto_box.pack(side=tk.LEFT)
+        auto_box.bind("<<ComboboxSelected>>", lambda e: self.schedule_poll())
         
         columns = self.get_table_columns(table_name)
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show="headings",
-                                yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.grid = VirtualTreeview(self.content_frame, columns, self.executor)
+        self.tree = self.grid.tree
         
-        vsb.config(command=self.tree.yview)
-        hsb.config(command=self.tree.xview)
+        self.load_table_data(table_name)
+        self.current_table = table_name
+        self.schedule_poll()
         
-        for col in columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=120)
+    def refresh_table_view(self, table_name):
+        pager = self.grid.pager
+        timer = self.metrics.start("refresh", table=table_name)
+        def checked(schema_changed):
+            if schema_changed:
+                timer.finish(schema_changed=True)
+                self.search_cache.invalidate(table_name)
+                self.show_table_view(table_name)
+            else:
+                self.sync_table(pager, timer=timer)
+        self.executor.submit(self.schema.refresh_if_changed, on_done=checked, on_error=self.failed_action(timer))
         
-        vsb.pack(side=tk.RIGHT, fill=tk.Y)
-        hsb.pack(side=tk.BOTTOM, fill=tk.X)
-        self.tree.pack(fill=tk.BOTH, expand=True)
+    def sync_table(self, pager, background=False, timer=None):
+        # With change tracking only rows changed since the view was read come back and are
+        # patched in place; otherwise the visible window is re-read.
+        grid = self.current_grid(pager)
+        if not grid:
+            return
+        if pager.db is self.catalog:
+            self.sync_local_table(pager, background, timer)
+            return
+        if not self.tracker.tracks(pager.table_name):
+            self.search_cache.invalidate(pager.table_name)
+            grid.refresh()
+            if timer:
+                timer.finish()
+            return
+        def synced(result):
+            version, changes = result
+            if timer:
+                timer.finish(changes=None if changes is None else len(changes))
+            grid = self.current_grid(pager)
+            if not grid:
+                return
+            if changes is None:
+                self.search_cache.invalidate(pager.table_name)
+                grid.refresh()
+            elif changes:
+                self.search_cache.invalidate(pager.table_name)
+                grid.apply_changes(changes)
+            pager.version = version
+        def failed(error):
+            self.metrics.record_error(error, action="sync", table=pager.table_name)
+            grid = self.current_grid(pager)
+            if grid:
+                grid.status.config(text=f"Refresh failed: {error}")
+        self.executor.submit(lambda: self.tracker.sync(pager), on_done=synced, channel="sync",
+                             on_error=failed if background else self.failed_action(timer) if timer else None,
+                             background=background)
         
-        self.load_table_data(table_name)
-        self.current_table = table_name
+    def sync_local_table(self, pager, background=False, timer=None):
+        # The mirror catches up from the server; re-reading the window locally is cheap.
+        def synced(version):
+            if timer:
+                timer.finish(local=True)
+            grid = self.current_grid(pager)
+            if grid and version != pager.version:
+                self.search_cache.invalidate(pager.table_name)
+                pager.version = version
+                grid.refresh()
+        def failed(error):
+            self.metrics.record_error(error, action="sync", table=pager.table_name)
+            grid = self.current_grid(pager)
+            if grid:
+                grid.status.config(text=f"Refresh failed: {error}")
+        self.executor.submit(lambda: self.catalog.sync(pager.table_name), on_done=synced, channel="sync",
+                             on_error=failed if background else self.failed_action(timer) if timer else None,
+                             background=background)
+
+    def sync_catalog(self):
+        # Keeps the local catalog mirror current in the background, copying tables on first run.
+        # Desks on the API service have no mirror; the service keeps its own.
+        if self.catalog is None:
+            return
+        def synced(changed):
+            for table_name in changed:
+                self.search_cache.invalidate(table_name)
+        if "catalog" not in self.executor.channels:
+            self.executor.submit(self.catalog.sync_all, on_done=synced,
+                                 on_error=lambda e: self.metrics.record_error(e, action="catalog sync"),
+                                 channel="catalog", background=True)
+        self.catalog_after = self.root.after(CATALOG_SYNC_MS, self.sync_catalog)
+
+    def schedule_poll(self):
+        self.cancel_poll()
+        interval = AUTO_REFRESH_CHOICES.get(self.auto_refresh.get(), 0)
+        if interval:
+            self.poll_after = self.root.after(interval, self.poll)
+            
+    def poll(self):
+        # Follows whatever the grid shows now, so searching does not stop the polling.
+        self.poll_after = None
+        grid = getattr(self, 'grid', None)
+        if grid and grid.tree.winfo_exists():
+            if grid.pager:
+                self.sync_table(grid.pager, background=True)
+            self.schedule_poll()
+            
+    def cancel_poll(self):
+        if self.poll_after:
+            self.root.after_cancel(self.poll_after)
+            self.poll_after = None
         
     def get_table_columns(self, table_name):
-        conn = self.db.get_connection()
-        if not conn:
-            return []
         try:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT TOP 0 * FROM {table_name}")
-            return [desc[0] for desc in cursor.description]
+            return self.schema.columns(table_name)
         except Exception as e:
             messagebox.showerror("Error", str(e))
             return []
-        finally:
-            conn.close()
+            
+    def selected_records(self, table_name):
+        # Treeview turns numeric-looking strings into ints (dropping ISBN leading zeros),
+        # so read rows back from what was inserted rather than tree.item(). The grid keeps
+        # selections made before scrolling, keyed by absolute row index.
+        columns = self.get_table_columns(table_name)
+        return [(index, dict(zip(columns, row))) for index, row in self.grid.selection()]
+
+    def current_grid(self, pager):
+        grid = getattr(self, 'grid', None)
+        if grid and grid.pager is pager and grid.tree.winfo_exists():
+            return grid
+        return None
             
     def load_table_data(self, table_name):
-        conn = self.db.get_connection()
-        if not conn:
-            return
+        self.searched_term = None
         try:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table_name}")
-            rows = cursor.fetchall()
+            self.show_results(table_name, "")
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            
+    def show_results(self, table_name, term, announce=False):
+        # Timed from here until the first page and row count are on screen
+        self.searched_term = term
+        timer = self.metrics.start("search" if term else "open view", table=table_name)
+        entry = self.search_cache.get(table_name, term)
+        if entry is None and term:
+            entry = self.search_cache.narrow(self.search, table_name, term)
+        if entry:
+            pager = self.data.pager(table_name, entry['predicate']).seed(entry['rows'], entry['total'], entry['version'])
+            def loaded(total):
+                timer.finish(rows=total, cached=True)
+                if announce:
+                    self.show_search_count(total)
+            self.grid.set_source(pager, on_loaded=loaded)
+        elif not term:
+            self.set_result_source(table_name, term, ('', []), announce, timer)
+        else:
+            self.executor.submit(lambda: self.search.predicate(table_name, term), channel="grid",
+                                 on_done=lambda predicate: self.set_result_source(table_name, term, predicate, announce, timer),
+                                 on_error=self.failed_action(timer))
             
-            for item in self.tree.get_children():
-                self.tree.delete(item)
+    def set_result_source(self, table_name, term, predicate, announce, timer=None):
+        predicate = predicate or ("(1=0)", [])
+        pager = self.data.pager(table_name, predicate)
+        def loaded(total):
+            if timer:
+                timer.finish(rows=total, local=pager.db is self.catalog)
+            first_page = pager.cached_page(0)
+            if first_page is not None:
+                self.search_cache.put(table_name, term, predicate, first_page, total, pager.version)
+            if announce:
+                self.show_search_count(total)
+        self.grid.set_source(pager, on_loaded=loaded)
+        
+    def cancel_pending_search(self):
+        if self.search_after:
+            self.root.after_cancel(self.search_after)
+            self.search_after = None
             
-            for row in rows:
-                cleaned_row = [str(v).strip() if v is not None else "" for v in row]
-                self.tree.insert("", tk.END, values=tuple(cleaned_row))
+    def schedule_search(self, table_name):
+        if not self.instant_search.get():
+            return
+        self.cancel_pending_search()
+        self.search_after = self.root.after(SEARCH_DEBOUNCE_MS, lambda: self.incremental_search(table_name))
+        
+    def incremental_search(self, table_name):
+        self.search_after = None
+        term = self.search_entry.get().strip()
+        if term == self.searched_term or (term and not self.search.has_fields(table_name)):
+            return
+        try:
+            self.show_results(table_name, term)
         except Exception as e:
             messagebox.showerror("Error", str(e))
-        finally:
-            conn.close()
             
     def search_table(self, table_name):
         search_term = self.search_entry.get().strip()
@@ -305,44 +656,24 @@ class LibraryManagementSystem:
             messagebox.showwarning("Search", "Enter search term")
             return
         
-        conn = self.db.get_connection()
-        if not conn:
+        if not self.search.has_fields(table_name):
+            messagebox.showinfo("Search", "No searchable columns")
             return
+        
+        self.cancel_pending_search()
         try:
-            cursor = conn.cursor()
-            columns = self.get_table_columns(table_name)
-            
-            search_conditions = []
-            search_params = []
-            for col in columns:
-                if any(x in col.lower() for x in ['id', 'name', 'title', 'email', 'isbn', 'fname', 'lname']):
-                    search_conditions.append(f"CAST({col} AS VARCHAR(MAX)) LIKE ?")
-                    search_params.append(f"%{search_term}%")
-            
-            if not search_conditions:
-                messagebox.showinfo("Search", "No searchable columns")
-                return
-            
-            query = f"SELECT * FROM {table_name} WHERE {' OR '.join(search_conditions)}"
-            cursor.execute(query, search_params)
-            rows = cursor.fetchall()
-            
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            
-            if rows:
-                for row in rows:
-                    cleaned_row = [str(v).strip() if v is not None else "" for v in row]
-                    self.tree.insert("", tk.END, values=tuple(cleaned_row))
-                messagebox.showinfo("Search Results", f"Found {len(rows)} record(s)")
-            else:
-                messagebox.showinfo("Search Results", "No records found")
+            self.show_results(table_name, search_term, announce=True)
         except Exception as e:
             messagebox.showerror("Error", str(e))
-        finally:
-            conn.close()
+        
+    def show_search_count(self, total):
+        if total:
+            messagebox.showinfo("Search Results", f"Found {total} record(s)")
+        else:
+            messagebox.showinfo("Search Results", "No records found")
     
     def clear_search(self, table_name):
+        self.cancel_pending_search()
         self.search_entry.delete(0, tk.END)
         self.load_table_data(table_name)
             
@@ -350,12 +681,15 @@ class LibraryManagementSystem:
         if not self.has_permission('add', table_name):
             messagebox.showerror("Access Denied", "No permission")
             return
+        if table_name in CIRCULATION_TABLES:
+            self.reserve_copies(table_name)
+            return
         
         columns = self.get_table_columns(table_name)
         if not columns:
             return
         
-        identity_cols = self.identity_columns.get(table_name, [])
+        identity_cols = self.schema.identity_columns(table_name)
         editable_columns = [col for col in columns if col not in identity_cols]
         
         dialog = tk.Toplevel(self.root)
@@ -392,50 +726,84 @@ class LibraryManagementSystem:
                     values[col] = entries[col].get("1.0", tk.END).strip()
                 else:
                     values[col] = entries[col].get()
-            if self.insert_record(table_name, values):
-                dialog.destroy()
-                self.show_table_view(table_name)
+            self.insert_record(table_name, values, lambda: self.close_and_refresh(dialog, pager))
+        
+        pager = self.grid.pager
         
         tk.Button(btn_frame, text="Save", command=save, bg="#27ae60", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Cancel", command=dialog.destroy, bg="#95a5a6", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
         
-    def insert_record(self, table_name, values):
-        conn = self.db.get_connection()
-        if not conn:
-            return False
-        try:
-            filtered_values = {col: str(val).strip() for col, val in values.items() if str(val).strip()}
-            if not filtered_values:
-                messagebox.showwarning("Warning", "Fill at least one field")
-                return False
-            
-            columns = list(filtered_values.keys())
-            query = f"INSERT INTO {table_name} ({','.join(columns)}) VALUES ({','.join(['?']*len(columns))})"
-            cursor = conn.cursor()
-            cursor.execute(query, list(filtered_values.values()))
-            conn.commit()
-            messagebox.showinfo("Success", "Record added!")
-            return True
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-            return False
-        finally:
-            conn.close()
+    def close_and_refresh(self, dialog, pager):
+        dialog.destroy()
+        grid = self.current_grid(pager)
+        if grid:
+            grid.refresh()
+        
+    def execute_write(self, table_name, query, params, message, on_saved=None):
+        timer = self.metrics.start("save", table=table_name)
+        def done(_):
+            timer.finish()
+            self.search_cache.invalidate(table_name)
+            messagebox.showinfo("Success", message)
+            if on_saved:
+                on_saved()
+        self.executor.submit(lambda: self.data.execute(table_name, query, params), on_done=done,
+                             on_error=self.failed_action(timer))
+        
+    def execute_batch(self, table_name, query, param_rows, message, on_saved=None, reload=None):
+        timer = self.metrics.start("save", table=table_name, rows=len(param_rows))
+        def done(rows):
+            timer.finish()
+            self.search_cache.invalidate(table_name)
+            messagebox.showinfo("Success", message(rows) if callable(message) else message)
+            if on_saved:
+                on_saved(rows)
+        self.executor.submit(lambda: self.data.execute_many(table_name, query, param_rows, reload), on_done=done,
+                             on_error=self.failed_action(timer))
+        
+    def insert_record(self, table_name, values, on_saved=None):
+        filtered_values = {col: str(val).strip() for col, val in values.items() if str(val).strip()}
+        if not filtered_values:
+            messagebox.showwarning("Warning", "Fill at least one field")
+            return
+        query = self.data.insert_statement(table_name, list(filtered_values))
+        self.execute_write(table_name, query, list(filtered_values.values()), "Record added!", on_saved)
             
     def edit_record(self, table_name):
         if not self.has_permission('edit', table_name):
             messagebox.showerror("Access Denied", "No permission")
             return
         
-        selected = self.tree.selection()
+        selected = self.selected_records(table_name)
         if not selected:
             messagebox.showwarning("Warning", "Select a record")
             return
+        if len(selected) > 1:
+            self.bulk_update(table_name)
+            return
         
-        item = self.tree.item(selected[0])
-        values = item['values']
-        columns = self.get_table_columns(table_name)
-        identity_cols = self.identity_columns.get(table_name, [])
+        row = selected[0][1]
+        preview_columns = self.schema.max_columns(table_name)
+        if not preview_columns:
+            self.edit_dialog(table_name, row)
+            return
+        # The grid only holds a preview of (MAX) columns, so the full values are read before editing
+        try:
+            key = self.schema.key_values(table_name, row)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return
+        def loaded(full_rows):
+            if not full_rows:
+                messagebox.showerror("Error", "The record no longer exists")
+                return
+            full = dict(zip(self.schema.columns(table_name), full_rows[0]))
+            self.edit_dialog(table_name, dict(row, **{col: "" if full[col] is None else str(full[col]) for col in preview_columns}))
+        self.executor.submit(lambda: self.data.full_rows(table_name, key), on_done=loaded)
+        
+    def edit_dialog(self, table_name, row):
+        columns = list(row.keys())
+        identity_cols = self.schema.identity_columns(table_name)
         
         dialog = tk.Toplevel(self.root)
         dialog.title(f"Edit {table_name}")
@@ -453,10 +821,10 @@ class LibraryManagementSystem:
             tk.Label(scrollable_frame, text=f"{col}:", font=("Arial", 10)).grid(row=i, column=0, sticky=tk.W, padx=10, pady=5)
             if col.lower() == 'description':
                 entry = tk.Text(scrollable_frame, width=35, height=4)
-                entry.insert("1.0", str(values[i]))
+                entry.insert("1.0", row[col])
             else:
                 entry = tk.Entry(scrollable_frame, width=35)
-                entry.insert(0, str(values[i]))
+                entry.insert(0, row[col])
             entry.grid(row=i, column=1, padx=10, pady=5)
             if col in identity_cols:
                 entry.config(state='disabled')
@@ -471,71 +839,394 @@ class LibraryManagementSystem:
         def save():
             new_values = {}
             for col in columns:
+                if col in identity_cols:
+                    continue
                 if isinstance(entries[col], tk.Text):
                     new_values[col] = entries[col].get("1.0", tk.END).strip()
                 else:
                     new_values[col] = entries[col].get()
-            if self.update_record(table_name, columns[0], values[0], new_values):
-                dialog.destroy()
-                self.show_table_view(table_name)
+            self.update_record(table_name, row, new_values, dialog.destroy)
         
         tk.Button(btn_frame, text="Save", command=save, bg="#27ae60", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Cancel", command=dialog.destroy, bg="#95a5a6", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
         
-    def update_record(self, table_name, pk_column, pk_value, values):
-        conn = self.db.get_connection()
-        if not conn:
-            return False
+    def update_record(self, table_name, key_row, values, on_saved=None):
         try:
-            query = f"UPDATE {table_name} SET {','.join([f'{col}=?' for col in values.keys()])} WHERE {pk_column}=?"
-            cursor = conn.cursor()
-            cursor.execute(query, list(values.values()) + [pk_value])
-            conn.commit()
-            messagebox.showinfo("Success", "Record updated!")
-            return True
+            query = self.data.update_statement(table_name, list(values))
+            key = self.schema.key_values(table_name, key_row)
         except Exception as e:
             messagebox.showerror("Error", str(e))
-            return False
-        finally:
-            conn.close()
+            return
+        # A changed key moves the row, so only then is the visible window re-read.
+        key_changed = any(str(values[col]).strip() != key_row[col] for col in self.schema.primary_key(table_name) if col in values)
+        pager = self.grid.pager
+        def saved(rows):
+            grid = self.current_grid(pager)
+            if grid:
+                if key_changed:
+                    grid.refresh()
+                else:
+                    grid.update_rows(rows)
+            if on_saved:
+                on_saved()
+        self.execute_batch(table_name, query, [list(values.values()) + key], "Record updated!", saved,
+                           reload=None if key_changed else lambda: pager.fetch_keys([key]))
+        
+    def bulk_update(self, table_name):
+        if not self.has_permission('edit', table_name):
+            messagebox.showerror("Access Denied", "No permission")
+            return
+        
+        selected = self.selected_records(table_name)
+        if not selected:
+            messagebox.showwarning("Warning", "Select one or more records")
+            return
+        
+        rows = [row for _, row in selected]
+        fixed = set(self.schema.identity_columns(table_name)) | set(self.schema.primary_key(table_name))
+        editable = [col for col in rows[0] if col not in fixed]
+        if not editable:
+            messagebox.showinfo("Bulk Update", "No editable columns")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Update {table_name}")
+        dialog.geometry("420x200")
+        tk.Label(dialog, text=f"Set a column on {len(rows)} selected record(s)", font=("Arial", 11, "bold")).pack(pady=10)
+        
+        form = tk.Frame(dialog)
+        form.pack(pady=5)
+        tk.Label(form, text="Column:", font=("Arial", 10)).grid(row=0, column=0, sticky=tk.W, padx=10, pady=5)
+        column_box = ttk.Combobox(form, values=editable, state="readonly", width=30)
+        column_box.grid(row=0, column=1, padx=10, pady=5)
+        tk.Label(form, text="New value:", font=("Arial", 10)).grid(row=1, column=0, sticky=tk.W, padx=10, pady=5)
+        value_box = ttk.Combobox(form, width=30)
+        value_box.grid(row=1, column=1, padx=10, pady=5)
+        
+        def on_column(event=None):
+            column = column_box.get()
+            # Values of (MAX) columns in the grid are previews, never offered as choices
+            seen = set() if column in self.schema.max_columns(table_name) else {row[column] for row in rows if row[column]}
+            choices = set(COLUMN_CHOICES.get((table_name, column), [])) | seen
+            value_box.config(values=sorted(choices))
+        column_box.bind("<<ComboboxSelected>>", on_column)
+        column_box.set('status' if 'status' in editable else editable[0])
+        on_column()
+        
+        pager = self.grid.pager
+        
+        def apply():
+            column = column_box.get()
+            try:
+                value = self.schema.coerce(table_name, column, value_box.get().strip())
+                keys = [self.schema.key_values(table_name, row) for row in rows]
+            except Exception as e:
+                messagebox.showerror("Error", str(e), parent=dialog)
+                return
+            def saved(updated):
+                dialog.destroy()
+                grid = self.current_grid(pager)
+                if grid:
+                    grid.update_rows(updated)
+            self.execute_batch(table_name, self.data.update_statement(table_name, [column]),
+                               [[value] + key for key in keys], f"{len(keys)} record(s) updated!", saved,
+                               reload=lambda: pager.fetch_keys(keys))
+        
+        btn_frame = tk.Frame(dialog)
+        btn_frame.pack(side="bottom", pady=15)
+        tk.Button(btn_frame, text="Apply", command=apply, bg="#27ae60", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Cancel", command=dialog.destroy, bg="#95a5a6", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
+        
+    def reserve_copies(self, table_name):
+        # A new reservation, or more copies on an open one; the server queues each copy
+        # at its next free position.
+        new_reservation = table_name == 'reservation'
+        dialog = tk.Toplevel(self.root)
+        dialog.title("New Reservation" if new_reservation else "Add Copies to Reservation")
+        dialog.geometry("420x230")
+        
+        form = tk.Frame(dialog)
+        form.pack(pady=15)
+        fields = [("Member ID", ""), ("Copy IDs", ""), ("Loan days", str(DEFAULT_LOAN_DAYS))] if new_reservation \
+            else [("Reservation ID", ""), ("Copy IDs", "")]
+        entries = {}
+        for idx, (label, default) in enumerate(fields):
+            tk.Label(form, text=f"{label}:", font=("Arial", 10)).grid(row=idx, column=0, sticky=tk.W, padx=10, pady=5)
+            entry = tk.Entry(form, width=30)
+            entry.insert(0, default)
+            entry.grid(row=idx, column=1, padx=10, pady=5)
+            entries[label] = entry
+        tk.Label(form, text="Separate copy IDs with commas or spaces", font=("Arial", 9), fg="#7f8c8d").grid(
+            row=len(fields), column=0, columnspan=2)
+        
+        pager = self.grid.pager
+        
+        def save():
+            try:
+                copy_ids = [int(v) for v in entries["Copy IDs"].get().replace(',', ' ').split()]
+                if new_reservation:
+                    args = {'member_id': int(entries["Member ID"].get()), 'staff_id': self.staff_data['staff_id'],
+                            'loan_days': int(entries["Loan days"].get())}
+                else:
+                    args = {'reservation_id': int(entries["Reservation ID"].get())}
+            except ValueError:
+                messagebox.showerror("Error", "IDs and loan days must be whole numbers", parent=dialog)
+                return
+            def reserved(rows):
+                dialog.destroy()
+                queued = ', '.join(f"copy {copy_id} at position {position}" for _, copy_id, position in rows)
+                self.circulation_done(pager, f"Reservation {rows[0][0]}: {queued}")
+            self.executor.submit(lambda: self.circulation.reserve(copy_ids, **args), on_done=reserved)
+        
+        btn_frame = tk.Frame(dialog)
+        btn_frame.pack(side="bottom", pady=15)
+        tk.Button(btn_frame, text="Reserve", command=save, bg="#27ae60", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Cancel", command=dialog.destroy, bg="#95a5a6", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
+        
+    def circulation_done(self, pager, message):
+        for table_name in CIRCULATION_TABLES | {'book_copy', 'book_catalog'}:
+            self.search_cache.invalidate(table_name)
+        messagebox.showinfo("Success", message)
+        self.sync_table(pager)
+        
+    def return_reservations(self):
+        selected = self.selected_records('reservation')
+        if not selected:
+            messagebox.showwarning("Warning", "Select one or more reservations")
+            return
+        count = len(selected)
+        if not messagebox.askyesno("Confirm", "Return this reservation?" if count == 1 else f"Return {count} reservations?"):
+            return
+        ids = [row['reservation_id'] for _, row in selected]
+        pager = self.grid.pager
+        self.executor.submit(lambda: self.circulation.return_reservations(ids),
+                             on_done=lambda returned: self.circulation_done(pager, f"{returned} reservation(s) returned!"))
+        
+    def expire_reservations(self):
+        if not messagebox.askyesno("Confirm", "Expire every open reservation past its expiration date?"):
+            return
+        pager = self.grid.pager
+        self.executor.submit(self.circulation.expire,
+                             on_done=lambda expired: self.circulation_done(pager, f"{expired} reservation(s) expired"))
+        
+    def import_records(self, table_name):
+        can_add, can_edit = self.has_permission('add', table_name), self.has_permission('edit', table_name)
+        if not (can_add or can_edit):
+            messagebox.showerror("Access Denied", "No permission")
+            return
+        
+        columns = self.get_table_columns(table_name)
+        if not columns:
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Import {table_name}")
+        dialog.geometry("640x480")
+        tk.Label(dialog, text=f"Paste rows with a header line, comma or tab separated, or load a CSV file.\n"
+                              f"Columns: {', '.join(columns)}", font=("Arial", 10), justify=tk.LEFT,
+                 wraplength=600).pack(anchor=tk.W, padx=10, pady=10)
+        
+        mode = tk.StringVar(value="insert" if can_add else "update")
+        mode_frame = tk.Frame(dialog)
+        mode_frame.pack(anchor=tk.W, padx=10)
+        tk.Radiobutton(mode_frame, text="Insert new rows", variable=mode, value="insert",
+                       state=tk.NORMAL if can_add else tk.DISABLED).pack(side=tk.LEFT)
+        tk.Radiobutton(mode_frame, text="Update existing rows (matched on key)", variable=mode, value="update",
+                       state=tk.NORMAL if can_edit else tk.DISABLED).pack(side=tk.LEFT, padx=10)
+        
+        btn_frame = tk.Frame(dialog)
+        btn_frame.pack(side="bottom", pady=15)
+        text = tk.Text(dialog, height=15, font=("Courier", 9))
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def load_file():
+            path = filedialog.askopenfilename(parent=dialog, filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+            if not path:
+                return
+            try:
+                with open(path, newline='', encoding='utf-8-sig') as f:
+                    content = f.read()
+            except Exception as e:
+                messagebox.showerror("Error", str(e), parent=dialog)
+                return
+            text.delete("1.0", tk.END)
+            text.insert("1.0", content)
+        
+        def run():
+            try:
+                header, rows = self.parse_import(table_name, text.get("1.0", tk.END))
+                if mode.get() == "update":
+                    self.import_updates(table_name, header, rows, dialog)
+                else:
+                    self.import_inserts(table_name, header, rows, dialog)
+            except ValueError as e:
+                messagebox.showerror("Import", str(e), parent=dialog)
+        
+        tk.Button(btn_frame, text="Load CSV...", command=load_file, bg="#3498db", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Import", command=run, bg="#27ae60", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Cancel", command=dialog.destroy, bg="#95a5a6", fg="white", padx=20).pack(side=tk.LEFT, padx=5)
+        
+    def parse_import(self, table_name, content):
+        content = content.strip()
+        if not content:
+            raise ValueError("Nothing to import")
+        try:
+            dialect = csv.Sniffer().sniff(content[:4096], delimiters=",\t;")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(io.StringIO(content), dialect)
+        lookup = {col.lower(): col for col in self.get_table_columns(table_name)}
+        header = [lookup.get(col.strip().lower(), col.strip()) for col in next(reader)]
+        unknown = [col for col in header if col not in lookup.values()]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+        rows = []
+        for line, record in enumerate(reader, start=2):
+            if not any(value.strip() for value in record):
+                continue
+            if len(record) != len(header):
+                raise ValueError(f"Line {line}: expected {len(header)} values, got {len(record)}")
+            try:
+                rows.append([self.schema.coerce(table_name, col, value.strip()) for col, value in zip(header, record)])
+            except ValueError as e:
+                raise ValueError(f"Line {line}: {e}") from e
+        if not rows:
+            raise ValueError("No data rows")
+        return header, rows
+        
+    def import_inserts(self, table_name, header, rows, dialog):
+        if table_name in CIRCULATION_TABLES:
+            raise ValueError("Reservations are created with Add New, which assigns queue positions")
+        generated = [col for col in header if col in self.schema.identity_columns(table_name)]
+        if generated:
+            raise ValueError(f"{', '.join(generated)} is generated by the database; remove it to insert new rows")
+        pager = self.grid.pager
+        self.execute_batch(table_name, self.data.insert_statement(table_name, header), rows, f"{len(rows)} record(s) imported!",
+                           lambda _: self.close_and_refresh(dialog, pager))
+        
+    def import_updates(self, table_name, header, rows, dialog):
+        key = self.schema.primary_key(table_name)
+        missing = [col for col in key if col not in header]
+        if missing:
+            raise ValueError(f"Updating needs the key column(s): {', '.join(missing)}")
+        fixed = set(key) | set(self.schema.identity_columns(table_name))
+        assigned = [col for col in header if col not in fixed]
+        if not assigned:
+            raise ValueError("No columns to update besides the key")
+        positions = [header.index(col) for col in assigned + key]
+        params = [[row[i] for i in positions] for row in rows]
+        keys = [param[len(assigned):] for param in params]
+        pager = self.grid.pager
+        def saved(updated):
+            dialog.destroy()
+            grid = self.current_grid(pager)
+            if grid:
+                grid.update_rows(updated)
+        self.execute_batch(table_name, self.data.update_statement(table_name, assigned), params,
+                           lambda found: f"{len(found)} of {len(rows)} record(s) updated!", saved,
+                           reload=lambda: pager.fetch_keys(keys))
+            
+    def export_records(self, table_name):
+        # Exports what the grid shows: the whole table, or the current search results
+        pager = self.grid.pager
+        path = filedialog.asksaveasfilename(parent=self.root, initialfile=table_name, defaultextension=".csv",
+                                            filetypes=[("CSV files", "*.csv"), ("Parquet files", "*.parquet")])
+        if not path:
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Export {table_name}")
+        dialog.geometry("400x150")
+        dialog.transient(self.root)
+        status = tk.Label(dialog, text="Starting export...", font=("Arial", 10))
+        status.pack(pady=(20, 10))
+        total = pager.total
+        progress = ttk.Progressbar(dialog, length=340, mode="determinate" if total else "indeterminate",
+                                   maximum=total or 100)
+        progress.pack(padx=20)
+        if not total:
+            progress.start()
+        
+        def update(written):
+            if not dialog.winfo_exists():
+                return
+            if total:
+                progress["value"] = written
+            status.config(text=f"{written:,} of {total:,} rows written" if total else f"{written:,} rows written")
+        
+        def done(written):
+            timer.finish(rows=written)
+            dialog.destroy()
+            messagebox.showinfo("Export", f"{written:,} row(s) exported to {path}")
+        
+        def failed(error):
+            dialog.destroy()
+            self.failed_action(timer)(error)
+        
+        def cancel():
+            task.cancel()
+            timer.finish(cancelled=True)
+            dialog.destroy()
+        
+        timer = self.metrics.start("export", table=table_name)
+        task = self.executor.stream(lambda task: self.data.export(table_name, path, (pager.where, pager.params),
+                                                                  progress=task.emit),
+                                    on_batch=update, on_done=done, on_error=failed)
+        tk.Button(dialog, text="Cancel", command=cancel, bg="#95a5a6", fg="white", padx=20).pack(pady=15)
+        dialog.protocol("WM_DELETE_WINDOW", cancel)
             
     def delete_record(self, table_name):
         if not self.has_permission('delete', table_name):
             messagebox.showerror("Access Denied", "No permission")
             return
         
-        selected = self.tree.selection()
+        selected = self.selected_records(table_name)
         if not selected:
             messagebox.showwarning("Warning", "Select a record")
             return
         
-        if not messagebox.askyesno("Confirm", "Delete this record?"):
+        count = len(selected)
+        if not messagebox.askyesno("Confirm", "Delete this record?" if count == 1 else f"Delete {count} records?"):
             return
         
-        item = self.tree.item(selected[0])
-        values = item['values']
-        columns = self.get_table_columns(table_name)
-        
-        conn = self.db.get_connection()
-        if not conn:
-            return
         try:
-            cursor = conn.cursor()
-            cursor.execute(f"DELETE FROM {table_name} WHERE {columns[0]}=?", [values[0]])
-            conn.commit()
-            messagebox.showinfo("Success", "Record deleted!")
-            self.show_table_view(table_name)
+            params = [self.schema.key_values(table_name, row) for _, row in selected]
         except Exception as e:
             messagebox.showerror("Error", str(e))
-        finally:
-            conn.close()
+            return
+        pager = self.grid.pager
+        indexes = [index for index, _ in selected]
+        keys = [pager.row_key(list(row.values())) for _, row in selected]
+        def deleted(_):
+            grid = self.current_grid(pager)
+            if grid:
+                grid.remove_rows(indexes, keys)
+        self.execute_batch(table_name, self.data.delete_statement(table_name), params,
+                           "Record deleted!" if count == 1 else f"{count} records deleted!", deleted)
 
 if __name__ == "__main__":
+    import argparse
+    import os
+    parser = argparse.ArgumentParser(description="Library Management System")
+    parser.add_argument('--api', default=os.environ.get('BOOK_HAVEN_API'),
+                        help='URL of the API service (api_server.py) to use instead of connecting to SQL Server '
+                             '(default: $BOOK_HAVEN_API)')
+    args = parser.parse_args()
+    if args.api:
+        from api_client import RemoteSession
+        session = RemoteSession(args.api)
+    else:
+        session = Session()
     root = tk.Tk()
-    def on_login(staff_data):
-        root.destroy()
-        main_root = tk.Tk()
-        LibraryManagementSystem(main_root, staff_data)
-        main_root.mainloop()
-    LoginWindow(root, on_login)
-    root.mainloop()
\ No newline at end of file
+    def show_login():
+        reset_root(root)
+        LoginWindow(root, show_main, session)
+    def show_main(staff_data):
+        reset_root(root)
+        LibraryManagementSystem(root, staff_data, session, on_logout=show_login)
+    show_login()
+    root.after_idle(lambda: session.metrics.record_action("startup: login window", (time.perf_counter() - STARTED) * 1000))
+    try:
+        root.mainloop()
+    finally:
+        session.db.close_all()
\ No newline at end of file
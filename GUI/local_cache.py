@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from changes import VERSIONS_QUERY
+from search import SEARCH_FIELDS
+from schema import INTEGER_TYPES
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.expanduser('~'), '.book_haven', 'catalog.sqlite3')
+
+# Read-heavy, slow-changing tables mirrored locally. Everything else, and every write, goes to the server.
+CATALOG_TABLES = ['author', 'description', 'category', 'book', 'book_author', 'book_category', 'book_catalog']
+
+FETCH_SIZE = 5000
+
+# The few T-SQL constructs the pager and search emit, rewritten for SQLite
+REWRITES = [
+    (re.compile(r"^SELECT TOP \((\d+)\) (.*)$", re.S), r"SELECT \2 LIMIT \1"),
+    (re.compile(r"OFFSET \? ROWS FETCH NEXT \? ROWS ONLY"), "LIMIT ?, ?"),
+    (re.compile(r"CAST\(\? AS N?VARCHAR\(\d+\)\)"), "?"),
+    (re.compile(r"COUNT_BIG\("), "COUNT("),
+    (re.compile(r"LEFT\((\w+), (\d+)\)"), r"SUBSTR(\1, 1, \2)"),
+]
+
+
+def to_sqlite(sql):
+    for pattern, replacement in REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def contains(value, query):
+    # Same word-prefix semantics as SearchEngine.field_matcher for full-text columns.
+    words = [word.lower() for word in re.findall(r'"(\w+)\*"', query or '')]
+    tokens = re.findall(r"\w+", str(value or '').lower())
+    return int(all(any(token.startswith(word) for token in tokens) for word in words))
+
+
+def local_value(value):
+    return value if value is None or isinstance(value, (int, float, str, bytes)) else str(value)
+
+
+class LocalCatalog:
+    # Read-through mirror of the catalog tables in an embedded SQLite file. A table is served
+    # locally once it has been copied; from then on sync() applies Change Tracking deltas.
+    metadata_counts = False
+
+    def __init__(self, db, schema, tracker, path=DEFAULT_CATALOG_PATH):
+        self.db = db
+        self.schema = schema
+        self.tracker = tracker
+        self.path = path
+        self.versions = {}
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.create_function("CONTAINS", 2, contains, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def writing(self):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def open(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = self.connection()
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state (table_name TEXT PRIMARY KEY, source TEXT, "
+                         "columns TEXT, version INTEGER)")
+            rows = conn.execute("SELECT table_name, source, columns, version FROM sync_state").fetchall()
+        except sqlite3.Error:
+            self.versions = {}
+            return
+        self.versions = {table: version for table, source, columns, version in rows
+                         if source == self.source() and columns == self.signature(table)}
+
+    def source(self):
+        return f"{self.db.server}/{self.db.database}"
+
+    def signature(self, table_name):
+        return json.dumps(self.schema.columns(table_name))
+
+    def covers(self, table_name):
+        return table_name in CATALOG_TABLES and self.versions.get(table_name) is not None
+
+    def current_version(self, table_name):
+        return self.versions.get(table_name)
+
+    def query(self, sql, params=(), retries=1):
+        started = time.perf_counter()
+        cursor = self.connection().execute(to_sqlite(sql), [local_value(v) for v in params])
+        columns = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
+        self.db.metrics.record_query(sql, (time.perf_counter() - started) * 1000, len(rows), source='local')
+        return columns, rows
+
+    def create_table(self, conn, table_name):
+        definitions = []
+        for col in self.schema.columns(table_name):
+            data_type = self.schema.column_type(table_name, col)
+            if data_type in INTEGER_TYPES or data_type == 'bit':
+                definitions.append(f"{col} INTEGER")
+            elif data_type in ('decimal', 'numeric', 'money', 'float', 'real'):
+                definitions.append(f"{col} NUMERIC")
+            else:
+                # SQL Server's default collation is case-insensitive, so ordering and equality match it
+                definitions.append(f"{col} TEXT COLLATE NOCASE")
+        definitions.append(f"PRIMARY KEY ({', '.join(self.schema.primary_key(table_name))})")
+        conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+        conn.execute(f"CREATE TABLE {table_name} ({', '.join(definitions)})")
+        key = self.schema.primary_key(table_name)
+        for col, _ in SEARCH_FIELDS.get(table_name, []):
+            if col != key[0]:
+                conn.execute(f"CREATE INDEX ix_{table_name}_{col} ON {table_name} ({col})")
+
+    def set_version(self, conn, table_name, version):
+        conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                     [table_name, self.source(), self.signature(table_name), version])
+
+    def reload(self, table_name, version):
+        # The version is read before the copy, so rows committed during it are replayed by the next sync.
+        insert = f"INSERT INTO {table_name} VALUES ({', '.join(['?'] * len(self.schema.columns(table_name)))})"
+        def copy(conn):
+            cursor = self.db.cursor(conn)
+            cursor.execute(f"SELECT * FROM {table_name}")
+            with self.writing() as local:
+                self.create_table(local, table_name)
+                while True:
+                    rows = cursor.fetchmany(FETCH_SIZE)
+                    if not rows:
+                        break
+                    local.executemany(insert, [[local_value(v) for v in row] for row in rows])
+                self.set_version(local, table_name, version)
+        self.db.run(copy)
+
+    def apply(self, table_name, changes, version):
+        key = self.schema.primary_key(table_name)
+        delete = f"DELETE FROM {table_name} WHERE {' AND '.join(f'{col}=?' for col in key)}"
+        upsert = f"INSERT OR REPLACE INTO {table_name} VALUES ({', '.join(['?'] * len(self.schema.columns(table_name)))})"
+        with self.writing() as local:
+            for _, changed_key, row in changes:
+                local.execute(delete, list(changed_key))
+                if row is not None:
+                    local.execute(upsert, [local_value(v) for v in row])
+            self.set_version(local, table_name, version)
+
+    def sync(self, table_name):
+        # Brings one table up to the server's current version and returns that version.
+        # Tables without Change Tracking (migration 002) are never mirrored.
+        if table_name not in CATALOG_TABLES or not self.tracker.tracks(table_name):
+            return None
+        with self._sync_lock:
+            _, rows = self.db.query(VERSIONS_QUERY, [table_name])
+            version, min_valid = rows[0]
+            local_version = self.versions.get(table_name)
+            if local_version is None or min_valid is None or local_version < min_valid:
+                self.reload(table_name, version)
+            elif version != local_version:
+                self.apply(table_name, self.tracker.changes(table_name, local_version), version)
+            self.versions[table_name] = version
+            return version
+
+    def sync_all(self):
+        changed = []
+        for table_name in CATALOG_TABLES:
+            before = self.versions.get(table_name)
+            if self.sync(table_name) != before:
+                changed.append(table_name)
+        return changed
+
+    def catch_up(self, table_name):
+        # After a write through the server. If the mirror cannot follow, reads of the
+        # table go back to the server until a later sync succeeds.
+        if not self.covers(table_name):
+            return
+        try:
+            self.sync(table_name)
+        except Exception:
+            self.versions.pop(table_name, None)
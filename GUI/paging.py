@@ -0,0 +1,260 @@
+import threading
+from collections import OrderedDict
+
+from schema import INTEGER_TYPES
+
+# Characters of each (MAX) column sent to the grid; the full value is read when a row is edited
+PREVIEW_CHARS = 200
+
+
+class KeysetPager:
+    def __init__(self, db, schema, table_name, where='', params=(), page_size=200, max_pages=20, tracker=None):
+        self.db = db
+        self.schema = schema
+        self.table_name = table_name
+        self.where = where
+        self.params = list(params)
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.columns = schema.columns(table_name)
+        self.key = schema.primary_key(table_name)
+        self.key_index = [self.columns.index(col) for col in self.key]
+        self.preview_columns = schema.max_columns(table_name)
+        self.pages = OrderedDict()
+        self.total = None
+        self.tracker = tracker
+        self.version = None
+        self._lock = threading.Lock()
+
+    def seed(self, first_page, total, version=None):
+        with self._lock:
+            self.pages[0] = list(first_page)
+            self.total = total
+            self.version = version
+        return self
+
+    def projection(self):
+        if not self.preview_columns:
+            return '*'
+        return ', '.join(f"LEFT({col}, {PREVIEW_CHARS}) AS {col}" if col in self.preview_columns else col
+                         for col in self.columns)
+
+    def order_by(self, descending=False):
+        direction = " DESC" if descending else ""
+        return ', '.join(f"{col}{direction}" for col in self.key)
+
+    def keyset_predicate(self, key_values, op):
+        # T-SQL has no row-value comparison, so (a, b) > (x, y) is spelled out
+        # as a > x OR (a = x AND b > y), which the PK index can still seek on.
+        clauses, params = [], []
+        for i, col in enumerate(self.key):
+            parts = [f"{prev}={self.schema.placeholder(self.table_name, prev)}" for prev in self.key[:i]]
+            parts.append(f"{col}{op}{self.schema.placeholder(self.table_name, col)}")
+            clauses.append(f"({' AND '.join(parts)})")
+            params.extend(key_values[:i + 1])
+        return f"({' OR '.join(clauses)})", params
+
+    def filtered(self, extra=''):
+        conditions = [c for c in (self.where, extra) if c]
+        return f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    def count(self):
+        if self.total is None:
+            if self.where or not self.db.metadata_counts:
+                _, rows = self.db.query(f"SELECT COUNT_BIG(*) FROM {self.table_name}{self.filtered()}", self.params)
+                self.total = rows[0][0]
+            else:
+                # Partition metadata is exact outside of in-flight transactions and avoids a scan.
+                _, rows = self.db.query("SELECT SUM(rows) FROM sys.partitions WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)",
+                                        [self.table_name])
+                self.total = rows[0][0]
+                if self.total is None:
+                    _, rows = self.db.query(f"SELECT COUNT_BIG(*) FROM {self.table_name}")
+                    self.total = rows[0][0]
+        return self.total
+
+    def key_of(self, row):
+        return [row[i] for i in self.key_index]
+
+    def row_key(self, row):
+        # Same cleaning the grid applies, so keys of displayed rows and fetched rows compare equal.
+        return tuple(str(row[i]).strip() if row[i] is not None else "" for i in self.key_index)
+
+    def fetch_keys(self, keys, chunk_size=1000):
+        rows = []
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            if len(self.key) == 1:
+                placeholder = self.schema.placeholder(self.table_name, self.key[0])
+                where = f"{self.key[0]} IN ({', '.join([placeholder] * len(chunk))})"
+            else:
+                where = ' OR '.join([f"({self.schema.key_predicate(self.table_name)})"] * len(chunk))
+            _, found = self.db.query(f"SELECT {self.projection()} FROM {self.table_name} WHERE {where}", [v for key in chunk for v in key])
+            rows.extend(found)
+        return rows
+
+    def read(self, offset=0, after=None, before=None):
+        # One page in key order: keyset-seeked past the key after or up to the key before,
+        # otherwise from a row offset.
+        select = f"SELECT TOP ({self.page_size}) {self.projection()} FROM {self.table_name}"
+        if after is not None:
+            predicate, params = self.keyset_predicate(after, '>')
+            _, rows = self.db.query(f"{select}{self.filtered(predicate)} ORDER BY {self.order_by()}", self.params + params)
+        elif before is not None:
+            predicate, params = self.keyset_predicate(before, '<')
+            _, rows = self.db.query(f"{select}{self.filtered(predicate)} ORDER BY {self.order_by(True)}", self.params + params)
+            rows.reverse()
+        else:
+            _, rows = self.db.query(f"SELECT {self.projection()} FROM {self.table_name}{self.filtered()} ORDER BY {self.order_by()} "
+                                    f"OFFSET ? ROWS FETCH NEXT ? ROWS ONLY", self.params + [offset, self.page_size])
+        return rows
+
+    def fetch_page(self, index):
+        if self.tracker and self.version is None:
+            # Taken before reading, so anything committed meanwhile is picked up by the next sync.
+            self.version = self.tracker.current_version(self.table_name)
+        with self._lock:
+            previous, following = self.pages.get(index - 1), self.pages.get(index + 1)
+        if previous and len(previous) == self.page_size:
+            return self.read(after=self.key_of(previous[-1]))
+        if following:
+            return self.read(before=self.key_of(following[0]))
+        return self.read(offset=index * self.page_size)
+
+    def cached_page(self, index):
+        with self._lock:
+            if index in self.pages:
+                self.pages.move_to_end(index)
+            return self.pages.get(index)
+
+    def page(self, index):
+        rows = self.cached_page(index)
+        if rows is not None:
+            return rows
+        rows = self.fetch_page(index)
+        with self._lock:
+            self.pages[index] = rows
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+        return rows
+
+    def collect(self, start, count, get_page):
+        result = []
+        index = start // self.page_size
+        offset = start % self.page_size
+        while len(result) < count:
+            page = get_page(index)
+            if page is None:
+                return None
+            result.extend(page[offset:offset + count - len(result)])
+            if len(page) < self.page_size:
+                break
+            index += 1
+            offset = 0
+        return result
+
+    def rows(self, start, count):
+        return self.collect(start, count, self.page)
+
+    def cached_rows(self, start, count):
+        return self.collect(start, count, self.cached_page)
+
+    def replace_rows(self, rows):
+        updated = {self.row_key(row): row for row in rows}
+        with self._lock:
+            for page in self.pages.values():
+                for i, row in enumerate(page):
+                    new_row = updated.get(self.row_key(row))
+                    if new_row is not None:
+                        page[i] = new_row
+
+    def remove_rows(self, indexes, keys):
+        # Pages before the first deleted row keep their offsets. The contiguous cached pages
+        # from there on are re-cut without the deleted rows so the window re-renders without
+        # a round trip; pages past a gap have shifted by an unknown amount and are dropped.
+        keys = set(keys)
+        with self._lock:
+            first = min(indexes) // self.page_size
+            run, index, last = [], first, None
+            while index in self.pages:
+                last = self.pages[index]
+                run.extend(last)
+                index += 1
+            at_end = last is not None and len(last) < self.page_size
+            for i in [i for i in self.pages if i >= first]:
+                del self.pages[i]
+            if run and all(i < index * self.page_size for i in indexes):
+                kept = [row for row in run if self.row_key(row) not in keys]
+                for n, offset in enumerate(range(0, max(len(kept), 1), self.page_size)):
+                    page = kept[offset:offset + self.page_size]
+                    if len(page) == self.page_size or at_end:
+                        self.pages[first + n] = page
+            if self.total is not None:
+                self.total = max(0, self.total - len(keys))
+
+    def integer_key(self):
+        return all(self.schema.column_type(self.table_name, col) in INTEGER_TYPES for col in self.key)
+
+    def sort_key(self, key):
+        return tuple(int(value) for value in key)
+
+    def append_rows(self, rows):
+        # Only given rows that sort after every cached row: they extend the final page when
+        # that is cached, and otherwise belong to pages that have not been fetched yet.
+        with self._lock:
+            # Empty pages past the end say nothing about where the data ends.
+            for index in [index for index, page in self.pages.items() if index and not page]:
+                del self.pages[index]
+            if not self.pages:
+                return
+            last = max(self.pages)
+            if len(self.pages[last]) >= self.page_size:
+                return
+            combined = self.pages[last] + list(rows)
+            for n, offset in enumerate(range(0, len(combined), self.page_size)):
+                self.pages[last + n] = combined[offset:offset + self.page_size]
+
+    def apply_changes(self, changes):
+        # Patches a change-tracking delta of (operation, key, current row or None) into the
+        # cached pages. Returns the absolute indexes of removed rows, or None when positions
+        # cannot be known and the caller has to re-read instead.
+        with self._lock:
+            positions = {self.row_key(row): index * self.page_size + offset
+                         for index, page in self.pages.items() for offset, row in enumerate(page)}
+        updated, inserted, removed, shifted = [], [], [], []
+        for operation, key, row in changes:
+            if key in positions:
+                if row is None:
+                    removed.append(key)
+                else:
+                    updated.append(row)
+            elif row is not None:
+                # In a filtered view an updated row may have just started to match.
+                if operation == 'I' or self.where:
+                    inserted.append(row)
+            elif operation != 'I':
+                shifted.append(key)
+        outside = [self.row_key(row) for row in inserted] + shifted
+        if outside:
+            # Rows outside the cache leave cached positions alone only when they sort after all
+            # of it, which the client can decide for integer keys without the server's collation.
+            if not self.integer_key():
+                return None
+            last = max(map(self.sort_key, positions), default=None)
+            if last is not None and any(self.sort_key(key) <= last for key in outside):
+                return None
+        self.replace_rows(updated)
+        indexes = sorted(positions[key] for key in removed)
+        if removed:
+            self.remove_rows(indexes, removed)
+        if inserted:
+            self.append_rows(sorted(inserted, key=lambda row: self.sort_key(self.row_key(row))))
+        if outside:
+            with self._lock:
+                self.total = None
+        return indexes
+
+    def invalidate(self):
+        with self._lock:
+            self.pages.clear()
+            self.total = None
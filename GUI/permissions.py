@@ -0,0 +1,46 @@
+# Role matrix shared by the Tk client and the API service (api_server.py), so a desk and
+# the service never disagree on what a role may do.
+PERMISSIONS = {
+    'Assistant': {'tables': ['book_catalog', 'member', 'reservation', 'reservation_details'], 
+                 'can_add': ['member', 'reservation', 'reservation_details'], 
+                 'can_edit': ['reservation', 'reservation_details'], 'can_delete': []},
+    'Librarian': {'tables': ['book_catalog', 'author', 'book', 'book_copy', 'category', 'description', 'book_author', 'book_category', 'member'],
+                 'can_add': ['author', 'book', 'book_copy', 'category', 'description', 'book_author', 'book_category'],
+                 'can_edit': ['author', 'book', 'book_copy', 'category', 'description', 'book_author', 'book_category'],
+                 'can_delete': ['book_copy', 'book_author', 'book_category']},
+    'Manager': {'tables': ['book_catalog', 'author', 'book', 'book_copy', 'category', 'description', 'staff', 'member', 'reservation', 'reservation_details', 'book_author', 'book_category'],
+               'can_add': 'all', 'can_edit': 'all', 'can_delete': 'all'},
+    'Technician': {'tables': ['book_copy'], 'can_add': [], 'can_edit': ['book_copy'], 'can_delete': []}
+}
+
+# Maintained by the database (migration 003), so only ever viewed
+READ_ONLY_TABLES = {'book_catalog'}
+
+# New rows go through the circulation procedures (migration 004), which assign queue positions
+CIRCULATION_TABLES = {'reservation', 'reservation_details'}
+
+# Roles that see Tools > Reports (migration 005)
+REPORT_ROLES = {'Manager', 'Librarian'}
+
+
+def has_permission(role, action, table_name, permissions=PERMISSIONS):
+    if role not in permissions:
+        return False
+    perms = permissions[role]
+    if table_name not in perms['tables']:
+        return False
+    if action == 'view':
+        return True
+    if table_name in READ_ONLY_TABLES:
+        return False
+    elif action == 'add':
+        return perms['can_add'] == 'all' or table_name in perms['can_add']
+    elif action == 'edit':
+        return perms['can_edit'] == 'all' or table_name in perms['can_edit']
+    elif action == 'delete':
+        return perms['can_delete'] == 'all' or table_name in perms['can_delete']
+    return False
+
+
+def viewable_tables(role, permissions=PERMISSIONS):
+    return list(permissions.get(role, {}).get('tables', []))
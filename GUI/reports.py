@@ -0,0 +1,81 @@
+import datetime
+
+# Reports screen tabs over the summary tables of migration 005: (title, query, parameter).
+# 'since' queries take the first day of the chosen period, 'today' ones today's date; the
+# catalog-wide ones cover all time and read one summary row per copy at most.
+REPORTS = [
+    ("Daily activity",
+     "SELECT reservation_date, SUM(reservations) AS reservations, SUM(copies) AS copies, "
+     "SUM(returned) AS returned, SUM(expired) AS expired FROM report_daily_staff "
+     "WHERE reservation_date >= ? GROUP BY reservation_date ORDER BY reservation_date DESC", 'since'),
+    ("Staff",
+     "SELECT TOP (25) s.staff_id, s.fname, s.lname, SUM(d.reservations) AS reservations, SUM(d.copies) AS copies, "
+     "SUM(d.returned) AS returned, SUM(d.expired) AS expired "
+     "FROM report_daily_staff d JOIN staff s ON s.staff_id = d.staff_id WHERE d.reservation_date >= ? "
+     "GROUP BY s.staff_id, s.fname, s.lname ORDER BY reservations DESC, s.staff_id", 'since'),
+    ("Members",
+     "SELECT TOP (25) m.member_id, m.fname, m.lname, m.email, SUM(d.reservations) AS reservations, SUM(d.copies) AS copies "
+     "FROM report_daily_member d JOIN member m ON m.member_id = d.member_id WHERE d.reservation_date >= ? "
+     "GROUP BY m.member_id, m.fname, m.lname, m.email ORDER BY reservations DESC, m.member_id", 'since'),
+    ("Overdue",
+     "SELECT expiration_date, reservations, copies FROM report_open_by_due_date "
+     "WHERE expiration_date < ? ORDER BY expiration_date", 'today'),
+    ("Copies by condition",
+     "SELECT bc.condition, COUNT(*) AS copies, SUM(CASE WHEN u.open_loans > 0 THEN 1 ELSE 0 END) AS reserved_now, "
+     "SUM(CASE WHEN u.loans > 0 THEN 1 ELSE 0 END) AS ever_reserved, COALESCE(SUM(u.loans), 0) AS loans, "
+     "SUM(bc.price) AS stock_value, COALESCE(SUM(bc.price * u.loans), 0) AS reserved_value "
+     "FROM book_copy bc LEFT JOIN report_copy_usage u ON u.copy_id = bc.copy_id "
+     "GROUP BY bc.condition ORDER BY copies DESC", None),
+    ("Top categories",
+     "SELECT TOP (25) c.category_name, SUM(u.loans) AS loans, SUM(u.open_loans) AS open_loans, "
+     "SUM(u.days_reserved) AS days_reserved FROM report_copy_usage u "
+     "JOIN book_copy bc ON bc.copy_id = u.copy_id JOIN book_category bk ON bk.ISBN = bc.ISBN "
+     "JOIN category c ON c.category_id = bk.category_id "
+     "GROUP BY c.category_name ORDER BY loans DESC, c.category_name", None),
+    ("Top authors",
+     "SELECT TOP (25) a.name, SUM(u.loans) AS loans, SUM(u.open_loans) AS open_loans, "
+     "SUM(u.days_reserved) AS days_reserved FROM report_copy_usage u "
+     "JOIN book_copy bc ON bc.copy_id = u.copy_id JOIN book_author ba ON ba.ISBN = bc.ISBN "
+     "JOIN author a ON a.author_id = ba.author_id "
+     "GROUP BY a.author_id, a.name ORDER BY loans DESC, a.name", None),
+]
+
+# Days the Reports screen can look back over
+PERIODS = {"7 days": 7, "30 days": 30, "90 days": 90, "1 year": 365}
+
+
+class Reports:
+    # Client for the reporting summaries (Database scripts/migrations/005). refresh() folds in
+    # the reservations changed since the last refresh; the reads never touch the raw history.
+    def __init__(self, db):
+        self.db = db
+
+    def refresh(self, full=False):
+        # Commits on the server and is safe to re-run. Returns (full_rebuild, changed_reservations).
+        _, rows = self.db.query("EXEC refresh_reports @full=?", [int(full)])
+        return bool(rows[0][0]), rows[0][1]
+
+    def since(self, days, today=None):
+        return (today or datetime.date.today()) - datetime.timedelta(days=days - 1)
+
+    def summary(self, days, today=None):
+        today = today or datetime.date.today()
+        _, rows = self.db.query("SELECT COALESCE(SUM(reservations), 0), "
+                                "COALESCE(SUM(CASE WHEN expiration_date < ? THEN reservations ELSE 0 END), 0) "
+                                "FROM report_open_by_due_date", [today])
+        open_reservations, overdue = rows[0]
+        _, rows = self.db.query("SELECT COALESCE(SUM(reservations), 0), COALESCE(SUM(copies), 0) "
+                                "FROM report_daily_staff WHERE reservation_date >= ?", [self.since(days, today)])
+        reservations, copies = rows[0]
+        _, refreshed = self.db.query("SELECT refreshed_at, changed_reservations, duration_ms FROM report_refresh "
+                                     "WHERE refresh_id = 1")
+        return {'open': open_reservations, 'overdue': overdue, 'reservations': reservations, 'copies': copies,
+                'refreshed': tuple(refreshed[0]) if refreshed else None}
+
+    def report(self, title, days, today=None):
+        today = today or datetime.date.today()
+        for name, sql, parameter in REPORTS:
+            if name == title:
+                params = {'since': [self.since(days, today)], 'today': [today], None: []}[parameter]
+                return self.db.query(sql, params)
+        raise ValueError(f"Unknown report: {title}")
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.book_haven', 'schema.json')
+
+INTEGER_TYPES = {'int', 'bigint', 'smallint', 'tinyint'}
+
+DECIMAL_TYPES = {'decimal', 'numeric', 'money', 'smallmoney'}
+
+# Bumped when the cached table entries change shape, so older caches are rebuilt
+CACHE_FORMAT = 2
+
+CATALOG_QUERY = """
+SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE, c.CHARACTER_MAXIMUM_LENGTH, c.NUMERIC_PRECISION, c.NUMERIC_SCALE,
+       COLUMNPROPERTY(OBJECT_ID(c.TABLE_SCHEMA + '.' + c.TABLE_NAME), c.COLUMN_NAME, 'IsIdentity'),
+       k.ORDINAL_POSITION
+FROM INFORMATION_SCHEMA.COLUMNS c
+LEFT JOIN INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
+       ON tc.TABLE_SCHEMA = c.TABLE_SCHEMA AND tc.TABLE_NAME = c.TABLE_NAME AND tc.CONSTRAINT_TYPE = 'PRIMARY KEY'
+LEFT JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE k
+       ON k.CONSTRAINT_NAME = tc.CONSTRAINT_NAME AND k.TABLE_SCHEMA = c.TABLE_SCHEMA
+      AND k.TABLE_NAME = c.TABLE_NAME AND k.COLUMN_NAME = c.COLUMN_NAME
+WHERE c.TABLE_SCHEMA = 'dbo'
+ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+"""
+
+# modify_date moves on every ALTER/CREATE, so this pair changes whenever the catalog would
+VERSION_QUERY = """
+SELECT COUNT(*), CONVERT(VARCHAR(30), MAX(modify_date), 126)
+FROM sys.objects WHERE schema_id = SCHEMA_ID('dbo') AND type IN ('U', 'V')
+"""
+
+
+class SchemaCatalog:
+    def __init__(self, db, cache_path=None):
+        self.db = db
+        self.cache_path = cache_path
+        self.tables = None
+        self.version = None
+        self._lock = threading.Lock()
+
+    def fetch_version(self):
+        _, rows = self.db.query(VERSION_QUERY)
+        return f"{rows[0][0]}:{rows[0][1]}"
+
+    def catalog_rows(self):
+        # (table, column, data type, max length or -1 for MAX, numeric precision, numeric scale,
+        # is identity, PK ordinal) per column
+        _, rows = self.db.query(CATALOG_QUERY)
+        return rows
+
+    def load(self):
+        version = self.fetch_version()
+        cached = self._read_cache()
+        if cached and cached.get('version') == version:
+            with self._lock:
+                self.tables, self.version = cached['tables'], version
+        else:
+            self.refresh(version)
+
+    def refresh(self, version=None):
+        version = version or self.fetch_version()
+        tables = {}
+        for table, column, data_type, max_length, precision, scale, is_identity, pk_position in self.catalog_rows():
+            info = tables.setdefault(table, {'columns': [], 'types': {}, 'lengths': {}, 'precisions': {},
+                                             'identity': [], 'primary_key': []})
+            info['columns'].append(column)
+            info['types'][column] = data_type
+            info['lengths'][column] = max_length
+            if data_type in DECIMAL_TYPES and precision:
+                info['precisions'][column] = [precision, scale or 0]
+            if is_identity == 1:
+                info['identity'].append(column)
+            if pk_position is not None:
+                info['primary_key'].append((pk_position, column))
+        for info in tables.values():
+            info['primary_key'] = [col for _, col in sorted(info['primary_key'])]
+        with self._lock:
+            self.tables, self.version = tables, version
+        self._write_cache()
+
+    def refresh_if_changed(self):
+        version = self.fetch_version()
+        if version == self.version:
+            return False
+        self.refresh(version)
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self.tables, self.version = None, None
+
+    def table(self, table_name):
+        if self.tables is None:
+            self.load()
+        if table_name not in self.tables:
+            self.refresh()
+        return self.tables[table_name]
+
+    def columns(self, table_name):
+        return list(self.table(table_name)['columns'])
+
+    def identity_columns(self, table_name):
+        return list(self.table(table_name)['identity'])
+
+    def primary_key(self, table_name):
+        info = self.table(table_name)
+        return list(info['primary_key']) or info['columns'][:1]
+
+    def column_type(self, table_name, column):
+        return self.table(table_name)['types'].get(column)
+
+    def precisions(self, table_name):
+        # [precision, scale] of each decimal, numeric and money column
+        return dict(self.table(table_name).get('precisions', {}))
+
+    def column_length(self, table_name, column):
+        return self.table(table_name)['lengths'].get(column)
+
+    def max_columns(self, table_name):
+        info = self.table(table_name)
+        return [col for col in info['columns'] if info['lengths'].get(col) == -1]
+
+    def has_max_columns(self, table_name):
+        return bool(self.max_columns(table_name))
+
+    def placeholder(self, table_name, column, pad=0):
+        # pyodbc binds str as NVARCHAR; casting back to the column's own type keeps
+        # comparisons on VARCHAR keys sargable instead of converting every row.
+        info = self.table(table_name)
+        data_type, length = info['types'].get(column), info['lengths'].get(column)
+        if data_type in ('varchar', 'char') and length and length > 0:
+            return f"CAST(? AS VARCHAR({length + pad}))"
+        return "?"
+
+    def coerce(self, table_name, column, value):
+        if value is None or value == "":
+            return None
+        if self.column_type(table_name, column) in INTEGER_TYPES:
+            return int(value)
+        return value
+
+    def key_predicate(self, table_name):
+        return ' AND '.join(f"{col}={self.placeholder(table_name, col)}" for col in self.primary_key(table_name))
+
+    def key_values(self, table_name, row):
+        return [self.coerce(table_name, col, row[col]) for col in self.primary_key(table_name)]
+
+    def _read_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get('source') != self._source() or cached.get('format') != CACHE_FORMAT:
+            return None
+        return cached
+
+    def _write_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'source': self._source(), 'format': CACHE_FORMAT, 'version': self.version, 'tables': self.tables}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+
+    def _source(self):
+        return f"{self.db.server}/{self.db.database}"
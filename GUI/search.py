@@ -0,0 +1,163 @@
+import re
+from collections import OrderedDict
+
+# How each searchable column is matched. Every kind maps to a predicate an index can seek on:
+#   id       - equality on an integer key, only when the term is a number
+#   isbn     - equality for a full ISBN, prefix otherwise
+#   prefix   - LIKE 'term%' on an indexed VARCHAR column
+#   fulltext - CONTAINS() against the full-text catalog, prefix LIKE if the index is missing
+SEARCH_FIELDS = {
+    'author': [('author_id', 'id'), ('name', 'prefix')],
+    'book': [('ISBN', 'isbn'), ('title', 'fulltext'), ('description_id', 'id')],
+    'book_catalog': [('ISBN', 'isbn'), ('title', 'fulltext'), ('authors', 'fulltext'), ('categories', 'fulltext')],
+    'book_author': [('ISBN', 'isbn'), ('author_id', 'id')],
+    'book_category': [('ISBN', 'isbn'), ('category_id', 'id')],
+    'book_copy': [('copy_id', 'id'), ('ISBN', 'isbn')],
+    'category': [('category_id', 'id'), ('category_name', 'prefix')],
+    'description': [('description_id', 'id'), ('description', 'fulltext')],
+    'member': [('member_id', 'id'), ('email', 'prefix'), ('phone', 'prefix'), ('lname', 'prefix'), ('fname', 'prefix')],
+    'staff': [('staff_id', 'id'), ('email', 'prefix'), ('phone', 'prefix'), ('lname', 'prefix'), ('fname', 'prefix')],
+    'reservation': [('reservation_id', 'id'), ('member_id', 'id'), ('staff_id', 'id')],
+    'reservation_details': [('reservation_id', 'id'), ('copy_id', 'id')],
+}
+
+MAX_INT = 2 ** 31 - 1
+ISBN_PATTERN = re.compile(r'[0-9Xx-]{10,17}')
+
+
+def escape_like(term):
+    return re.sub(r'([\\%_\[])', r'\\\1', term)
+
+
+def fulltext_query(term):
+    words = re.findall(r"\w+", term)
+    return ' AND '.join(f'"{word}*"' for word in words)
+
+
+class SearchEngine:
+    def __init__(self, db, schema):
+        self.db = db
+        self.schema = schema
+        self.fulltext_columns = None
+
+    def load_fulltext_columns(self):
+        if self.fulltext_columns is None:
+            try:
+                _, rows = self.db.query("SELECT OBJECT_NAME(object_id), COL_NAME(object_id, column_id) FROM sys.fulltext_index_columns")
+                self.fulltext_columns = {(table, column) for table, column in rows}
+            except Exception:
+                self.fulltext_columns = set()
+        return self.fulltext_columns
+
+    def has_fields(self, table_name):
+        return bool(SEARCH_FIELDS.get(table_name))
+
+    def prefix(self, table_name, column, term):
+        length = self.schema.column_length(table_name, column) or 0
+        if 0 < length < len(term):
+            return None
+        # Escaping can double every character, so the cast holds twice the column plus the trailing %
+        return f"{column} LIKE {self.schema.placeholder(table_name, column, pad=length + 1)} ESCAPE '\\'", [escape_like(term) + '%']
+
+    def field_predicate(self, table_name, column, kind, term):
+        if kind == 'id':
+            if term.isdigit() and int(term) <= MAX_INT:
+                return f"{column}=?", [int(term)]
+            return None
+        if kind == 'isbn':
+            isbn = term.replace('-', '')
+            if ISBN_PATTERN.fullmatch(term) and len(isbn) in (10, 13):
+                return f"{column}={self.schema.placeholder(table_name, column)}", [isbn]
+            return self.prefix(table_name, column, term)
+        if kind == 'fulltext':
+            if (table_name, column) in self.load_fulltext_columns():
+                query = fulltext_query(term)
+                return (f"CONTAINS({column}, ?)", [query]) if query else None
+            return self.prefix(table_name, column, term)
+        return self.prefix(table_name, column, term)
+
+    def field_matcher(self, table_name, column_index, column, kind, term):
+        lowered = term.lower()
+        if kind == 'id':
+            if not (term.isdigit() and int(term) <= MAX_INT):
+                return None
+            return lambda row: row[column_index] == int(term)
+        if kind == 'isbn':
+            isbn = term.replace('-', '')
+            if ISBN_PATTERN.fullmatch(term) and len(isbn) in (10, 13):
+                return lambda row: str(row[column_index]) == isbn
+        if kind == 'fulltext' and (table_name, column) in self.load_fulltext_columns():
+            words = [w.lower() for w in re.findall(r"\w+", term)]
+            if not words:
+                return None
+            return lambda row: all(any(token.startswith(w) for token in re.findall(r"\w+", str(row[column_index] or '').lower()))
+                                   for w in words)
+        return lambda row: str(row[column_index] or '').lower().startswith(lowered)
+
+    def matcher(self, table_name, term):
+        # Python mirror of predicate() used to narrow cached results without a round trip;
+        # comparisons are case-insensitive like the default SQL Server collation.
+        columns = self.schema.columns(table_name)
+        checks = [self.field_matcher(table_name, columns.index(column), column, kind, term)
+                  for column, kind in SEARCH_FIELDS.get(table_name, []) if column in columns]
+        checks = [check for check in checks if check]
+        return lambda row: any(check(row) for check in checks)
+
+    def can_narrow(self, table_name, cached_term, term):
+        # Results only shrink as a term grows, except for exact matches: ID '42' can hit
+        # rows that '4' never returned, and a hyphenated ISBN is compared with its hyphens
+        # stripped, so those terms always go to the server.
+        if not term.startswith(cached_term) or self.fulltext_columns is None:
+            return False
+        # Cached rows only hold a preview of (MAX) columns, too short to match against
+        if any(column in self.schema.max_columns(table_name) for column, _ in SEARCH_FIELDS.get(table_name, [])):
+            return False
+        kinds = {kind for _, kind in SEARCH_FIELDS.get(table_name, [])}
+        return not ((term.isdigit() and 'id' in kinds) or ('-' in term and 'isbn' in kinds))
+
+    def predicate(self, table_name, term):
+        conditions, params = [], []
+        for column, kind in SEARCH_FIELDS.get(table_name, []):
+            predicate = self.field_predicate(table_name, column, kind, term)
+            if predicate:
+                conditions.append(predicate[0])
+                params.extend(predicate[1])
+        if not conditions:
+            return None
+        return f"({' OR '.join(conditions)})", params
+
+
+class SearchCache:
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, table_name, term):
+        entry = self.entries.get((table_name, term))
+        if entry:
+            self.entries.move_to_end((table_name, term))
+        return entry
+
+    def put(self, table_name, term, predicate, rows, total, version=None):
+        self.entries[(table_name, term)] = {'predicate': predicate, 'rows': list(rows), 'total': total,
+                                            'version': version}
+        self.entries.move_to_end((table_name, term))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def narrow(self, engine, table_name, term):
+        candidates = [(cached_term, entry) for (table, cached_term), entry in self.entries.items()
+                      if table == table_name and len(entry['rows']) >= entry['total']
+                      and engine.can_narrow(table_name, cached_term, term)]
+        if not candidates:
+            return None
+        _, entry = max(candidates, key=lambda candidate: len(candidate[0]))
+        matches = engine.matcher(table_name, term)
+        rows = [row for row in entry['rows'] if matches(row)]
+        predicate = engine.predicate(table_name, term)
+        self.put(table_name, term, predicate, rows, len(rows), entry['version'])
+        return self.get(table_name, term)
+
+    def invalidate(self, table_name=None):
+        for key in [key for key in self.entries if table_name is None or key[0] == table_name]:
+            del self.entries[key]
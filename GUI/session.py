@@ -0,0 +1,60 @@
+import threading
+import time
+
+from changes import ChangeTracker
+from data_access import LibraryData
+from database import DatabaseConnection, pyodbc
+from local_cache import LocalCatalog
+from schema import SchemaCatalog, DEFAULT_CACHE_PATH
+
+
+class Session:
+    # What outlives a login: the connection pool, schema catalog, change tracker, local catalog
+    # mirror and the data paths over them. Built once per process, warmed on a worker thread
+    # while the login window waits for input, and kept across logout/login.
+    def __init__(self, db=None):
+        self.db = db or DatabaseConnection()
+        self.metrics = self.db.metrics
+        self.schema = SchemaCatalog(self.db, DEFAULT_CACHE_PATH)
+        self.tracker = ChangeTracker(self.db, self.schema)
+        self.catalog = LocalCatalog(self.db, self.schema, self.tracker)
+        self.data = LibraryData(self.db, self.schema, self.tracker, self.catalog)
+        self.warmed = False
+        self.metadata_error = None
+        self._lock = threading.Lock()
+
+    def warm(self):
+        # Driver import, first pooled connection, then the metadata the main window reads. A
+        # second caller (the login query) waits for a warm-up in flight instead of racing it.
+        # Connection errors propagate and the next call retries; metadata errors are kept for
+        # the main window to report. Returns the step timings in ms, or None if already warm.
+        with self._lock:
+            if self.warmed:
+                return None
+            timer = self.metrics.start("startup: warm-up")
+            steps = {}
+            started = time.perf_counter()
+            try:
+                pyodbc.load()
+                steps['driver_ms'] = (time.perf_counter() - started) * 1000
+                self.db.warm()
+                steps['connect_ms'] = (time.perf_counter() - started) * 1000 - steps['driver_ms']
+            except Exception as e:
+                timer.finish(e, **steps)
+                raise
+            try:
+                self.schema.load()
+                self.tracker.load()
+                self.catalog.open()
+                self.metadata_error = None
+            except Exception as e:
+                self.metadata_error = e
+            steps['metadata_ms'] = (time.perf_counter() - started) * 1000 - steps['driver_ms'] - steps['connect_ms']
+            steps = {name: round(ms, 1) for name, ms in steps.items()}
+            timer.finish(**steps)
+            self.warmed = True
+            return steps
+
+    def logout(self):
+        # Nothing here depends on who logged in, so the next login reuses all of it
+        pass
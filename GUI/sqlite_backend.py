@@ -0,0 +1,473 @@
+import csv
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from circulation import Circulation
+from data_access import LibraryData
+from instrumentation import Instrumentation, InstrumentedCursor
+from local_cache import contains, local_value, to_sqlite
+from reports import Reports
+from schema import DECIMAL_TYPES, SchemaCatalog
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Database scripts')
+
+# The stand-in schema is read from the same scripts that build the real database
+SCHEMA_SCRIPTS = [
+    os.path.join(SCRIPTS_DIR, 'Book_haven_ddl.sql'),
+    os.path.join(SCRIPTS_DIR, 'migrations', '001_secondary_indexes.sql'),
+    os.path.join(SCRIPTS_DIR, 'migrations', '004_circulation.sql'),
+    os.path.join(SCRIPTS_DIR, 'migrations', '005_reporting.sql'),
+]
+
+CREATE_TABLE = re.compile(r"CREATE TABLE (\w+) \((.*?)\n\);", re.S)
+ADD_COLUMN = re.compile(r"ALTER TABLE (\w+) ADD (?!CONSTRAINT)(\w+) (.*?);")
+PRIMARY_KEY = re.compile(r"ALTER TABLE (\w+) ADD CONSTRAINT \w+ PRIMARY KEY \(([^)]*)\)")
+UNIQUE = re.compile(r"ALTER TABLE (\w+) ADD CONSTRAINT (\w+) UNIQUE \(([^)]*)\)")
+# Filtered and INCLUDE parts are dropped, and secondary indexes are never unique here:
+# SQLite checks uniqueness row by row, SQL Server at the end of the statement.
+INDEX = re.compile(r"CREATE (?:UNIQUE )?NONCLUSTERED INDEX (\w+) ON (\w+) \(([^)]*)\)")
+
+FETCH_SIZE = 5000
+
+
+def split_columns(text):
+    return [col.strip() for col in text.split(',')]
+
+
+def column_definition(line, primary_key):
+    # T-SQL column -> SQLite, keeping the declared type so SQLiteSchema can read it back
+    name, rest = line.split(None, 1)
+    data_type = re.match(r"\w+(?:\([^)]*\))?", rest).group(0).upper()
+    default = re.search(r"DEFAULT (\S+)", rest)
+    if 'IDENTITY' in rest and primary_key == [name]:
+        return f"{name} INTEGER PRIMARY KEY"
+    if data_type == 'VARCHAR(MAX)':
+        data_type = 'TEXT COLLATE NOCASE'
+    elif data_type.startswith(('VARCHAR', 'CHAR', 'NVARCHAR')):
+        # SQL Server's default collation is case-insensitive, so ordering and equality match it
+        data_type += ' COLLATE NOCASE'
+    return ' '.join([name, data_type] + (['NOT NULL'] if 'NOT NULL' in rest else [])
+                    + ([f"DEFAULT {default.group(1)}"] if default else []))
+
+
+def schema_statements(scripts=SCHEMA_SCRIPTS):
+    text = '\n'.join(open(path, encoding='utf-8').read() for path in scripts)
+    tables = {name: [line.strip().rstrip(',') for line in body.strip().splitlines() if line.strip()]
+              for name, body in CREATE_TABLE.findall(text)}
+    for table, column, rest in ADD_COLUMN.findall(text):
+        tables[table].append(f"{column} {rest}")
+    keys = {table: split_columns(cols) for table, cols in PRIMARY_KEY.findall(text)}
+    statements = []
+    for table, lines in tables.items():
+        definitions = [column_definition(line, keys.get(table)) for line in lines]
+        if not any('PRIMARY KEY' in definition for definition in definitions) and table in keys:
+            definitions.append(f"PRIMARY KEY ({', '.join(keys[table])})")
+        statements.append(f"CREATE TABLE {table} ({', '.join(definitions)})")
+    for table, name, cols in UNIQUE.findall(text):
+        statements.append(f"CREATE UNIQUE INDEX {name} ON {table} ({cols})")
+    # Migration 001 repeats two of the DDL's indexes
+    indexes = {name: f"CREATE INDEX {name} ON {table} ({cols})" for name, table, cols in INDEX.findall(text)}
+    return list(tables), statements + list(indexes.values())
+
+
+class SQLiteCursor:
+    # pyodbc-shaped cursor over sqlite3: T-SQL is rewritten and parameters converted on the way in.
+    fast_executemany = False
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(to_sqlite(sql), [local_value(v) for v in params])
+        return self
+
+    def executemany(self, sql, param_rows):
+        self.cursor.executemany(to_sqlite(sql), ([local_value(v) for v in row] for row in param_rows))
+        return self
+
+    def fetchmany(self, size=None):
+        return self.cursor.fetchmany(size) if size is not None else self.cursor.fetchmany()
+
+
+class SQLiteDatabase:
+    # Stand-in for DatabaseConnection over one SQLite file (or :memory:), for headless runs
+    # and benchmarks. Work is serialized over a single connection, like a pool of one.
+    metadata_counts = False
+
+    def __init__(self, path=':memory:', metrics=None):
+        self.server = 'sqlite'
+        self.database = path
+        self.metrics = metrics or Instrumentation(log_path=None)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.create_function("CONTAINS", 2, contains, deterministic=True)
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            yield self._conn
+
+    def cursor(self, conn):
+        return InstrumentedCursor(SQLiteCursor(conn.cursor()), self.metrics)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.cursor(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def run(self, func, retries=1):
+        with self.connection() as conn:
+            return func(conn)
+
+    def query(self, sql, params=(), retries=1):
+        def fetch(conn):
+            cursor = self.cursor(conn)
+            cursor.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description]
+            return columns, cursor.fetchall()
+        return self.run(fetch, retries)
+
+    def create_schema(self, scripts=SCHEMA_SCRIPTS):
+        tables, statements = schema_statements(scripts)
+        with self.transaction() as cursor:
+            for table in reversed(tables):
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            for statement in statements:
+                cursor.execute(statement)
+        return tables
+
+    def table_columns(self, table_name):
+        with self.connection() as conn:
+            return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+
+    def load_rows(self, table_name, columns, rows):
+        query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+        loaded = 0
+        batch = []
+        with self.transaction() as cursor:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= FETCH_SIZE:
+                    cursor.executemany(query, batch)
+                    loaded += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(query, batch)
+                loaded += len(batch)
+        return loaded
+
+    def close_all(self):
+        self._conn.close()
+
+
+class SQLiteSchema(SchemaCatalog):
+    # The same catalog, read from SQLite's own metadata instead of INFORMATION_SCHEMA.
+    def fetch_version(self):
+        _, rows = self.db.query("PRAGMA schema_version")
+        return str(rows[0][0])
+
+    def catalog_rows(self):
+        _, tables = self.db.query("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite%' ORDER BY name")
+        rows = []
+        for (table,) in tables:
+            _, info = self.db.query(f"PRAGMA table_info({table})")
+            single_key = sum(1 for col in info if col[5]) == 1
+            for _, column, declared, _, _, pk_position in info:
+                match = re.match(r"(\w+)(?:\((\d+)(?:,\s*(\d+))?)?", declared)
+                data_type = match.group(1).lower() if match else 'varchar'
+                length = int(match.group(2)) if match and match.group(2) else None
+                precision = scale = None
+                if data_type in DECIMAL_TYPES:
+                    precision, scale, length = length, int(match.group(3) or 0), None
+                if data_type == 'text':
+                    data_type, length = 'varchar', -1
+                identity = data_type == 'integer' and pk_position == 1 and single_key
+                rows.append((table, column, 'int' if data_type == 'integer' else data_type, length, precision, scale,
+                             int(identity), pk_position or None))
+        return rows
+
+
+class SQLiteCirculation(Circulation):
+    # The circulation procedures of migrations 004 and 006 as client-side statements in one
+    # transaction each, with the same queue model: open reservations hold positions
+    # 1..n per copy, closed ones 0. A copy of the T-SQL, kept in step by
+    # benchmarks/test_circulation_parity.py.
+    def marks(self, ids):
+        return ', '.join(['?'] * len(ids))
+
+    def promote(self, cursor, copies):
+        cursor.execute(f"SELECT reservation_id, copy_id, position_in_queue FROM reservation_details "
+                       f"WHERE copy_id IN ({self.marks(copies)}) AND position_in_queue > 0 "
+                       f"ORDER BY copy_id, position_in_queue, reservation_id", copies)
+        moved, previous, position = [], None, 0
+        for reservation_id, copy_id, current in cursor.fetchall():
+            position = position + 1 if copy_id == previous else 1
+            previous = copy_id
+            if current != position:
+                moved.append([position, reservation_id, copy_id])
+        if moved:
+            cursor.executemany("UPDATE reservation_details SET position_in_queue=? WHERE reservation_id=? AND copy_id=?", moved)
+        # Damaged and lost copies keep their status
+        cursor.execute(f"UPDATE book_copy SET status = CASE "
+                       f"WHEN status = 'Checked Out' THEN status "
+                       f"WHEN EXISTS (SELECT 1 FROM reservation_details rd WHERE rd.copy_id = book_copy.copy_id "
+                       f"AND rd.position_in_queue > 0) THEN 'Reserved' ELSE 'Available' END "
+                       f"WHERE copy_id IN ({self.marks(copies)}) "
+                       f"AND (status IS NULL OR status IN ('Available', 'Reserved', 'Checked Out'))", copies)
+
+    def reserve(self, copy_ids, member_id=None, staff_id=None, loan_days=14, reservation_id=None):
+        copies = [copy_id for (copy_id,) in self.id_list(copy_ids)]
+        with self.db.transaction() as cursor:
+            # The reservation before its copies, in the order migration 006 locks them
+            if reservation_id is not None:
+                cursor.execute("SELECT member_id FROM reservation WHERE reservation_id=? AND returned_at IS NULL", [reservation_id])
+                row = cursor.fetchone()
+                if row is None:
+                    raise ValueError("The reservation does not exist or is already closed.")
+                member_id = row[0]
+            cursor.execute(f"SELECT copy_id, status FROM book_copy WHERE copy_id IN ({self.marks(copies)})", copies)
+            statuses = dict(cursor.fetchall())
+            if len(statuses) < len(copies):
+                raise ValueError("One or more copies do not exist.")
+            if any(status in ('Damaged', 'Lost') for status in statuses.values()):
+                raise ValueError("Damaged or lost copies cannot be reserved.")
+            if reservation_id is None:
+                if member_id is None or staff_id is None:
+                    raise ValueError("A new reservation needs a member and a staff member.")
+                cursor.execute("INSERT INTO reservation (member_id, staff_id, reservation_date, expiration_date) "
+                               "VALUES (?, ?, DATE('now'), DATE('now', ?))", [member_id, staff_id, f"{int(loan_days):+d} days"])
+                reservation_id = cursor.lastrowid
+            cursor.execute(f"SELECT 1 FROM reservation_details rd JOIN reservation r ON r.reservation_id = rd.reservation_id "
+                           f"WHERE r.member_id = ? AND rd.position_in_queue > 0 AND rd.copy_id IN ({self.marks(copies)})",
+                           [member_id] + copies)
+            if cursor.fetchone():
+                raise ValueError("The member is already queued for one or more of these copies.")
+            cursor.executemany("INSERT INTO reservation_details (reservation_id, copy_id, position_in_queue) "
+                               "SELECT ?, ?, COALESCE(MAX(position_in_queue), 0) + 1 FROM reservation_details "
+                               "WHERE copy_id = ? AND position_in_queue > 0",
+                               [[reservation_id, copy_id, copy_id] for copy_id in copies])
+            self.promote(cursor, copies)
+            cursor.execute(f"SELECT reservation_id, copy_id, position_in_queue FROM reservation_details "
+                           f"WHERE reservation_id = ? AND copy_id IN ({self.marks(copies)}) ORDER BY copy_id",
+                           [reservation_id] + copies)
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def close(self, reservation_ids, closed_on, expired):
+        ids = [reservation_id for (reservation_id,) in self.id_list(reservation_ids)]
+        with self.db.transaction() as cursor:
+            cursor.execute(f"SELECT DISTINCT copy_id FROM reservation_details WHERE reservation_id IN ({self.marks(ids)})", ids)
+            copies = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f"UPDATE reservation SET returned_at=?, expired=? "
+                           f"WHERE reservation_id IN ({self.marks(ids)}) AND returned_at IS NULL", [closed_on, int(expired)] + ids)
+            closed = cursor.rowcount
+            # A returned copy is back on the shelf; an expired hold never had it lent out
+            if not expired:
+                cursor.execute(f"UPDATE book_copy SET status = 'Available' WHERE status = 'Checked Out' AND copy_id IN "
+                               f"(SELECT copy_id FROM reservation_details WHERE position_in_queue = 1 "
+                               f"AND reservation_id IN ({self.marks(ids)}))", ids)
+            cursor.execute(f"UPDATE reservation_details SET position_in_queue = 0 "
+                           f"WHERE reservation_id IN ({self.marks(ids)}) AND position_in_queue > 0", ids)
+            if copies:
+                self.promote(cursor, copies)
+            return closed
+
+    def return_reservations(self, reservation_ids):
+        return self.close(reservation_ids, datetime.date.today(), False)
+
+    def expire(self, as_of=None, batch_size=500):
+        as_of = as_of or datetime.date.today()
+        expired = 0
+        while True:
+            _, rows = self.db.query("SELECT reservation_id FROM reservation WHERE returned_at IS NULL AND expiration_date < ? "
+                                    "ORDER BY expiration_date LIMIT ?", [as_of, batch_size])
+            if not rows:
+                return expired
+            expired += self.close([row[0] for row in rows], as_of, True)
+
+
+# refresh_reports (migration 005), statement by statement. The capture statements run before
+# and after the facts are replaced, collecting the dates and copies to recount. Checked with
+# the circulation copy in benchmarks/test_circulation_parity.py.
+REPORT_CAPTURE = [
+    "INSERT OR IGNORE INTO temp.report_dates SELECT reservation_date FROM report_reservation_facts "
+    "WHERE reservation_id IN (SELECT id FROM temp.report_changed)",
+    "INSERT OR IGNORE INTO temp.report_due SELECT expiration_date FROM report_reservation_facts "
+    "WHERE returned_at IS NULL AND reservation_id IN (SELECT id FROM temp.report_changed)",
+    "INSERT OR IGNORE INTO temp.report_copies SELECT copy_id FROM report_loan_facts "
+    "WHERE reservation_id IN (SELECT id FROM temp.report_changed)",
+]
+
+REPORT_FACTS = [
+    "DELETE FROM report_reservation_facts WHERE reservation_id IN (SELECT id FROM temp.report_changed)",
+    "DELETE FROM report_loan_facts WHERE reservation_id IN (SELECT id FROM temp.report_changed)",
+    "INSERT INTO report_reservation_facts (reservation_id, reservation_date, staff_id, member_id, expiration_date, "
+    "returned_at, expired, copies) "
+    "SELECT r.reservation_id, r.reservation_date, r.staff_id, r.member_id, r.expiration_date, r.returned_at, r.expired, "
+    "(SELECT COUNT(*) FROM reservation_details rd WHERE rd.reservation_id = r.reservation_id) "
+    "FROM reservation r WHERE r.reservation_id IN (SELECT id FROM temp.report_changed)",
+    "INSERT INTO report_loan_facts (reservation_id, copy_id, reservation_date, is_open, days_reserved) "
+    "SELECT rd.reservation_id, rd.copy_id, r.reservation_date, r.returned_at IS NULL, "
+    "CAST(julianday(r.returned_at) - julianday(r.reservation_date) AS INTEGER) "
+    "FROM reservation_details rd JOIN reservation r ON r.reservation_id = rd.reservation_id "
+    "WHERE rd.reservation_id IN (SELECT id FROM temp.report_changed)",
+]
+
+REPORT_RECOUNT = [
+    "DELETE FROM report_daily_staff WHERE reservation_date IN (SELECT day FROM temp.report_dates)",
+    "INSERT INTO report_daily_staff (reservation_date, staff_id, reservations, copies, returned, expired) "
+    "SELECT reservation_date, staff_id, COUNT(*), SUM(copies), "
+    "SUM(CASE WHEN returned_at IS NOT NULL AND expired = 0 THEN 1 ELSE 0 END), SUM(CASE WHEN expired = 1 THEN 1 ELSE 0 END) "
+    "FROM report_reservation_facts WHERE reservation_date IN (SELECT day FROM temp.report_dates) "
+    "GROUP BY reservation_date, staff_id",
+    "DELETE FROM report_daily_member WHERE reservation_date IN (SELECT day FROM temp.report_dates)",
+    "INSERT INTO report_daily_member (reservation_date, member_id, reservations, copies) "
+    "SELECT reservation_date, member_id, COUNT(*), SUM(copies) FROM report_reservation_facts "
+    "WHERE reservation_date IN (SELECT day FROM temp.report_dates) GROUP BY reservation_date, member_id",
+    "DELETE FROM report_open_by_due_date WHERE expiration_date IN (SELECT day FROM temp.report_due)",
+    "INSERT INTO report_open_by_due_date (expiration_date, reservations, copies) "
+    "SELECT expiration_date, COUNT(*), SUM(copies) FROM report_reservation_facts "
+    "WHERE returned_at IS NULL AND expiration_date IN (SELECT day FROM temp.report_due) GROUP BY expiration_date",
+    "DELETE FROM report_copy_usage WHERE copy_id IN (SELECT id FROM temp.report_copies)",
+    "INSERT INTO report_copy_usage (copy_id, loans, open_loans, days_reserved, last_reserved) "
+    "SELECT copy_id, COUNT(*), SUM(is_open), COALESCE(SUM(days_reserved), 0), MAX(reservation_date) "
+    "FROM report_loan_facts WHERE copy_id IN (SELECT id FROM temp.report_copies) GROUP BY copy_id",
+]
+
+REPORT_TABLES = ['report_reservation_facts', 'report_loan_facts', 'report_daily_staff', 'report_daily_member',
+                 'report_open_by_due_date', 'report_copy_usage']
+
+
+class SQLiteReports(Reports):
+    # SQLite has no Change Tracking: triggers log the reservation IDs touched into report_changes,
+    # and refresh() reads the log from where it left off, then trims it (AUTOINCREMENT, so IDs
+    # never go back below the last one read).
+    def install(self):
+        with self.db.transaction() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS report_changes (change_id INTEGER PRIMARY KEY AUTOINCREMENT, reservation_id INT NOT NULL)")
+            for table in ('reservation', 'reservation_details'):
+                for event, rows in (('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])):
+                    logged = ' '.join(f"INSERT INTO report_changes (reservation_id) VALUES ({row}.reservation_id);" for row in rows)
+                    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS report_{table}_{event.lower()} AFTER {event} ON {table} "
+                                   f"BEGIN {logged} END")
+
+    def refresh(self, full=False):
+        started = time.perf_counter()
+        with self.db.transaction() as cursor:
+            for table, key in (('report_changed', 'id INTEGER'), ('report_dates', 'day TEXT'),
+                               ('report_due', 'day TEXT'), ('report_copies', 'id INTEGER')):
+                cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {table} ({key} PRIMARY KEY)")
+                cursor.execute(f"DELETE FROM temp.{table}")
+            cursor.execute("SELECT last_version FROM report_refresh WHERE refresh_id = 1")
+            last = cursor.fetchone()
+            cursor.execute("SELECT COALESCE(MAX(change_id), 0) FROM report_changes")
+            version = cursor.fetchone()[0]
+            full = full or last is None
+            if full:
+                for table in REPORT_TABLES:
+                    cursor.execute(f"DELETE FROM {table}")
+                cursor.execute("INSERT INTO temp.report_changed SELECT reservation_id FROM reservation")
+            else:
+                cursor.execute("INSERT OR IGNORE INTO temp.report_changed SELECT reservation_id FROM report_changes "
+                               "WHERE change_id > ?", [last[0]])
+            for statement in REPORT_CAPTURE + REPORT_FACTS + REPORT_CAPTURE + REPORT_RECOUNT:
+                cursor.execute(statement)
+            cursor.execute("SELECT COUNT(*) FROM temp.report_changed")
+            changed = cursor.fetchone()[0]
+            cursor.execute("INSERT OR REPLACE INTO report_refresh (refresh_id, last_version, refreshed_at, full_rebuild, "
+                           "changed_reservations, duration_ms) VALUES (1, ?, datetime('now'), ?, ?, ?)",
+                           [version, int(full), changed, int((time.perf_counter() - started) * 1000)])
+            cursor.execute("DELETE FROM report_changes WHERE change_id <= ?", [version])
+        return full, changed
+
+
+def csv_rows(path, columns):
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        positions = [header.index(col) for col in columns]
+        for record in reader:
+            yield [None if record[i].strip() in ('', 'nan') else record[i] for i in positions]
+
+
+# Migration 004's queue model for loaded data: closed reservations at 0, open ones 1..n per copy.
+# Notebooks/data predates it and leaves returned holds in their queues.
+QUEUE_RENUMBER = [
+    "UPDATE reservation_details SET position_in_queue = 0 WHERE position_in_queue <> 0 AND reservation_id IN "
+    "(SELECT reservation_id FROM reservation WHERE returned_at IS NOT NULL)",
+    "UPDATE reservation_details SET position_in_queue = queue.position FROM "
+    "(SELECT reservation_id, copy_id, ROW_NUMBER() OVER (PARTITION BY copy_id ORDER BY position_in_queue, reservation_id) AS position "
+    "FROM reservation_details WHERE position_in_queue > 0) AS queue "
+    "WHERE reservation_details.reservation_id = queue.reservation_id AND reservation_details.copy_id = queue.copy_id "
+    "AND reservation_details.position_in_queue <> queue.position",
+]
+
+
+def load_csv(db, data_dir):
+    # Notebooks/data layout: one <table>.csv per table with a header row; extra columns are ignored.
+    loaded = {}
+    for table_name in db.create_schema():
+        path = os.path.join(data_dir, f"{table_name}.csv")
+        if not os.path.exists(path):
+            continue
+        with open(path, newline='', encoding='utf-8') as f:
+            header = next(csv.reader(f))
+        columns = [col for col in db.table_columns(table_name) if col in header]
+        loaded[table_name] = db.load_rows(table_name, columns, csv_rows(path, columns))
+    with db.transaction() as cursor:
+        for statement in QUEUE_RENUMBER:
+            cursor.execute(statement)
+    return loaded
+
+
+def column_values(values):
+    # Columns of a generate_data.py chunk (numpy arrays) as plain Python values
+    if values.dtype.kind == 'M':
+        return [None if text == 'NaT' else text for text in values.astype('datetime64[D]').astype(str).tolist()]
+    if values.dtype.kind == 'f':
+        return [None if value != value else round(value, 2) for value in values.tolist()]
+    return values.tolist()
+
+
+def load_generated(db, generator):
+    # Streams a Notebooks/generate_data.py DataGenerator straight into the stand-in.
+    db.create_schema()
+    loaded = {}
+    for table_name, chunk in generator.generate():
+        columns = list(chunk)
+        rows = zip(*(column_values(chunk[col]) for col in columns))
+        loaded[table_name] = loaded.get(table_name, 0) + db.load_rows(table_name, columns, rows)
+    return loaded
+
+
+def stand_in(path=':memory:', data_dir=None, generator=None):
+    # A LibraryData over a freshly loaded SQLite database: from a generator when given,
+    # otherwise from a directory of CSVs, otherwise empty.
+    db = SQLiteDatabase(path)
+    if generator is not None:
+        load_generated(db, generator)
+    elif data_dir:
+        load_csv(db, data_dir)
+    else:
+        db.create_schema()
+    # Installed after loading, so the first refresh() is a full build rather than a replay of the load
+    reports = SQLiteReports(db)
+    reports.install()
+    schema = SQLiteSchema(db)
+    schema.load()
+    return LibraryData(db, schema, circulation=SQLiteCirculation(db), reports=reports)
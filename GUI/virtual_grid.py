@@ -0,0 +1,200 @@
+import tkinter as tk
+from bisect import bisect_left
+from tkinter import ttk, font as tkfont
+
+
+class VirtualTreeview:
+    def __init__(self, parent, columns, executor=None):
+        self.columns = columns
+        self.executor = executor
+        self.on_loaded = None
+        self.pager = None
+        self.start = 0
+        self.visible = 1
+        self.rows = {}
+        self.selected_rows = {}
+
+        frame = tk.Frame(parent)
+        frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        self.status = tk.Label(parent, text="", font=("Arial", 9), anchor=tk.W)
+        self.status.pack(fill=tk.X)
+
+        self.vsb = ttk.Scrollbar(frame, orient="vertical", command=self.on_scrollbar)
+        hsb = ttk.Scrollbar(frame, orient="horizontal")
+        self.tree = ttk.Treeview(frame, columns=columns, show="headings", xscrollcommand=hsb.set)
+        hsb.config(command=self.tree.xview)
+
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=120)
+
+        self.vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        hsb.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.row_height = ttk.Style().lookup("Treeview", "rowheight") or tkfont.nametofont("TkDefaultFont").metrics("linespace") + 4
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_by(-3 if e.delta > 0 else 3, "units"))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-3, "units"))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(3, "units"))
+        self.tree.bind("<Down>", lambda e: self.on_key(1))
+        self.tree.bind("<Up>", lambda e: self.on_key(-1))
+        self.tree.bind("<Next>", lambda e: self.scroll_by(1, "pages"))
+        self.tree.bind("<Prior>", lambda e: self.scroll_by(-1, "pages"))
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0))
+        self.tree.bind("<End>", lambda e: self.scroll_to(self.total()))
+
+    def set_source(self, pager, on_loaded=None):
+        self.pager = pager
+        self.on_loaded = on_loaded
+        self.start = 0
+        self.selected_rows = {}
+        self.render()
+
+    def total(self):
+        if not self.pager:
+            return 0
+        if self.pager.total is None:
+            # Until the count arrives, allow scrolling as far as rows have been seen.
+            return self.start + len(self.rows)
+        return self.pager.total
+
+    def on_resize(self, event):
+        visible = max(1, int(event.height // int(self.row_height)) - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total()))
+        else:
+            self.scroll_by(int(amount), unit)
+
+    def scroll_by(self, amount, unit):
+        step = self.visible if unit == "pages" else 1
+        self.scroll_to(self.start + amount * step)
+        return "break"
+
+    def scroll_to(self, start):
+        start = max(0, min(start, self.total() - self.visible))
+        if start != self.start:
+            self.start = start
+            self.render()
+        return "break"
+
+    def on_key(self, direction):
+        items = self.tree.get_children()
+        if not items or self.tree.focus() != items[-1 if direction > 0 else 0]:
+            return None
+        target = str(int(self.tree.focus()) + direction)
+        self.scroll_to(self.start + direction)
+        if self.tree.exists(target):
+            self.tree.focus(target)
+            self.tree.selection_set(target)
+        return "break"
+
+    def render(self):
+        if not self.pager:
+            self.show([])
+            return
+        pager, start, visible = self.pager, self.start, self.visible
+        rows = pager.cached_rows(start, visible)
+        if rows is not None and pager.total is not None:
+            self.show(rows)
+        elif self.executor is None:
+            pager.count()
+            self.show(pager.rows(start, visible))
+        else:
+            self.status.config(text="Loading...")
+
+            def load(task):
+                task.emit(pager.rows(start, visible))
+                return pager.count()
+
+            # One shared channel: scrolling or switching tables supersedes the previous load.
+            self.executor.stream(load, on_batch=self.show, on_done=lambda total: self.show_total(),
+                                 channel="grid")
+
+    def show(self, rows):
+        self.tree.delete(*self.tree.get_children())
+        self.rows = {}
+        for offset, row in enumerate(rows):
+            cleaned_row = self.clean(row)
+            iid = str(self.start + offset)
+            self.rows[iid] = cleaned_row
+            self.tree.insert("", tk.END, iid=iid, values=cleaned_row)
+        self.tree.selection_set([iid for iid in self.rows if int(iid) in self.selected_rows])
+        if self.pager and self.pager.total is not None:
+            self.show_total()
+
+    def show_total(self):
+        total = self.pager.total if self.pager else 0
+        if total:
+            self.vsb.set(self.start / total, (self.start + len(self.rows)) / total)
+            self.status.config(text=f"Rows {self.start + 1:,}-{self.start + len(self.rows):,} of {total:,}")
+        else:
+            self.vsb.set(0, 1)
+            self.status.config(text="No records" if self.pager else "")
+        if self.on_loaded:
+            on_loaded, self.on_loaded = self.on_loaded, None
+            on_loaded(total)
+
+    def on_select(self, event=None):
+        for iid in self.rows:
+            self.selected_rows.pop(int(iid), None)
+        for iid in self.tree.selection():
+            self.selected_rows[int(iid)] = self.rows[iid]
+
+    def selection(self):
+        return sorted(self.selected_rows.items())
+
+    def clean(self, row):
+        return tuple(str(v).strip() if v is not None else "" for v in row)
+
+    def reselect(self, rows=(), removed=()):
+        # Keep remembered selections pointing at the same records after rows above them
+        # are removed, with values refreshed for rows that changed.
+        updated = {self.pager.row_key(row): self.clean(row) for row in rows}
+        gone = set(removed)
+        selected = {}
+        for index, row in self.selected_rows.items():
+            if index not in gone:
+                key = tuple(row[i] for i in self.pager.key_index)
+                selected[index - bisect_left(removed, index)] = updated.get(key, row)
+        self.selected_rows = selected
+
+    def update_rows(self, rows):
+        if not self.pager:
+            return
+        self.pager.replace_rows(rows)
+        self.reselect(rows)
+        self.render()
+
+    def remove_rows(self, indexes, keys):
+        if not self.pager or not indexes:
+            return
+        indexes = sorted(indexes)
+        self.pager.remove_rows(indexes, keys)
+        self.reselect(removed=indexes)
+        self.start = max(0, min(self.start, self.total() - self.visible))
+        self.render()
+
+    def apply_changes(self, changes):
+        if not self.pager or not changes:
+            return
+        removed = self.pager.apply_changes(changes)
+        if removed is None:
+            self.selected_rows = {}
+            self.refresh()
+            return
+        self.reselect([row for _, _, row in changes if row is not None], removed)
+        self.start = max(0, min(self.start, self.total() - self.visible))
+        self.render()
+
+    def refresh(self):
+        if self.pager:
+            self.pager.invalidate()
+            self.start = min(self.start, max(0, self.total() - self.visible))
+        self.render()
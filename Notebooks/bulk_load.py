@@ -0,0 +1,267 @@
+import argparse
+import csv
+import datetime
+import os
+import sys
+import time
+from decimal import Decimal
+
+# The connection helpers are shared with the app and the migration scripts (GUI/database.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'GUI'))
+from database import add_connection_args, connect
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Load order respects foreign keys. 'references' maps a column to the table whose
+# generated keys it must be translated through when keys are not preserved.
+TABLES = [
+    {'name': 'description', 'columns': ['description_id', 'description'], 'identity': 'description_id',
+     'required': ['description']},
+    {'name': 'author', 'columns': ['author_id', 'name'], 'identity': 'author_id', 'required': ['name']},
+    {'name': 'category', 'columns': ['category_id', 'category_name'], 'identity': 'category_id',
+     'required': ['category_name']},
+    {'name': 'member', 'columns': ['member_id', 'fname', 'lname', 'phone', 'email', 'city', 'street', 'bdate'],
+     'identity': 'member_id', 'required': ['fname', 'lname', 'email'], 'truncate': {'phone': 20}},
+    {'name': 'staff', 'columns': ['staff_id', 'fname', 'lname', 'phone', 'email', 'role', 'password', 'salary'],
+     'identity': 'staff_id', 'required': ['fname', 'lname', 'email', 'password'], 'truncate': {'phone': 20}},
+    {'name': 'book', 'columns': ['ISBN', 'title', 'publication_year', 'description_id'],
+     'required': ['ISBN', 'title'], 'references': {'description_id': 'description'}},
+    {'name': 'book_author', 'columns': ['ISBN', 'author_id'], 'references': {'author_id': 'author'}},
+    {'name': 'book_category', 'columns': ['ISBN', 'category_id'], 'references': {'category_id': 'category'}},
+    {'name': 'book_copy', 'columns': ['copy_id', 'status', 'condition', 'price', 'ISBN'], 'identity': 'copy_id',
+     'required': ['ISBN']},
+    {'name': 'reservation', 'columns': ['reservation_id', 'member_id', 'staff_id', 'reservation_date',
+                                        'expiration_date', 'returned_at'],
+     'identity': 'reservation_id', 'references': {'member_id': 'member', 'staff_id': 'staff'}},
+    {'name': 'reservation_details', 'columns': ['reservation_id', 'copy_id', 'position_in_queue'],
+     'references': {'reservation_id': 'reservation', 'copy_id': 'book_copy'}},
+]
+
+INTEGER_COLUMNS = {'description_id', 'author_id', 'category_id', 'member_id', 'staff_id', 'copy_id',
+                   'reservation_id', 'publication_year', 'position_in_queue'}
+DECIMAL_COLUMNS = {'price', 'salary'}
+DATE_COLUMNS = {'bdate', 'reservation_date', 'expiration_date', 'returned_at'}
+
+# SQL Server accepts at most 2100 parameters per statement
+MAX_PARAMETERS = 2000
+
+# Migration 003 keeps book_catalog current with a trigger per source table. Each
+# fast_executemany row runs as its own statement, so the loader turns them off and
+# rebuilds the catalog once at the end instead.
+CATALOG_TRIGGERS = {'book': 'TR_book_catalog_book', 'book_author': 'TR_book_catalog_book_author',
+                    'book_category': 'TR_book_catalog_book_category', 'book_copy': 'TR_book_catalog_book_copy'}
+
+
+def convert(column, value):
+    value = value.strip()
+    if value == '' or value.lower() == 'nan':
+        return None
+    if column in INTEGER_COLUMNS:
+        return int(float(value))
+    if column in DECIMAL_COLUMNS:
+        return Decimal(value)
+    if column in DATE_COLUMNS:
+        return datetime.date.fromisoformat(value[:10])
+    return value
+
+
+def read_rows(path, spec, stats):
+    truncate = spec.get('truncate', {})
+    required = spec.get('required', [])
+    with open(path, newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f):
+            row = {}
+            for column in spec['columns']:
+                value = convert(column, record.get(column) or '')
+                if column in truncate and value is not None:
+                    value = value[:truncate[column]]
+                row[column] = value
+            if any(row[column] is None for column in required):
+                stats['skipped'] += 1
+                continue
+            yield row
+
+
+def chunks(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Migration 004's queue model: closed reservations hold position 0 and open ones 1..n per
+# copy. Closed ones are zeroed as they are read, since a returned hold may share its position
+# with an open one and the queue's unique index would reject it; this closes the gaps left.
+QUEUE_RENUMBER = (
+    "WITH queue AS ("
+    "SELECT position_in_queue, ROW_NUMBER() OVER (PARTITION BY copy_id ORDER BY position_in_queue, reservation_id) AS position "
+    "FROM reservation_details WHERE position_in_queue > 0) "
+    "UPDATE queue SET position_in_queue = position WHERE position_in_queue <> position"
+)
+
+
+class BulkLoader:
+    def __init__(self, conn, data_dir=DATA_DIR, batch_size=10000, preserve_keys=True):
+        self.conn = conn
+        self.data_dir = data_dir
+        self.batch_size = batch_size
+        self.preserve_keys = preserve_keys
+        self.key_maps = {}
+        self.closed = set()
+        self.cursor = conn.cursor()
+        self.cursor.fast_executemany = True
+
+    def clear(self):
+        for spec in reversed(TABLES):
+            self.cursor.execute(f"DELETE FROM {spec['name']}")
+        for spec in TABLES:
+            if spec.get('identity'):
+                self.cursor.execute(f"DBCC CHECKIDENT ('{spec['name']}', RESEED, 0) WITH NO_INFOMSGS")
+
+    def catalog_triggers(self):
+        # Only the ones present and enabled: an older database has none, and a trigger someone
+        # disabled on purpose stays disabled
+        self.cursor.execute(f"SELECT OBJECT_NAME(parent_id), name FROM sys.triggers "
+                            f"WHERE is_disabled = 0 AND name IN ({', '.join('?' * len(CATALOG_TRIGGERS))})",
+                            list(CATALOG_TRIGGERS.values()))
+        return [tuple(row) for row in self.cursor.fetchall()]
+
+    def set_triggers(self, triggers, enabled):
+        for table, trigger in triggers:
+            self.cursor.execute(f"{'ENABLE' if enabled else 'DISABLE'} TRIGGER {trigger} ON {table}")
+
+    def rebuild_catalog(self):
+        # One set-based pass of refresh_book_catalog over every book, as the migration's initial build
+        self.cursor.execute("DELETE FROM book_catalog")
+        self.cursor.execute("DECLARE @isbns isbn_list; INSERT INTO @isbns SELECT ISBN FROM book; "
+                            "EXEC refresh_book_catalog @isbns;")
+
+    def close_queues(self, spec, batch):
+        # Keyed by the CSV's reservation IDs, so it runs before remap()
+        if spec['name'] == 'reservation':
+            self.closed.update(row['reservation_id'] for row in batch if row['returned_at'] is not None)
+        elif spec['name'] == 'reservation_details':
+            for row in batch:
+                if row['reservation_id'] in self.closed:
+                    row['position_in_queue'] = 0
+
+    def remap(self, spec, batch):
+        # Rows whose parent was not loaded are dropped rather than failing the FK check.
+        kept = []
+        for row in batch:
+            for column, parent in spec.get('references', {}).items():
+                if row[column] is not None:
+                    row[column] = self.key_maps[parent].get(row[column])
+                    if row[column] is None:
+                        break
+            else:
+                kept.append(row)
+        return kept
+
+    def insert_preserving_keys(self, spec, batch):
+        columns = spec['columns']
+        query = f"INSERT INTO {spec['name']} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        self.cursor.executemany(query, [[row[column] for column in columns] for row in batch])
+        return len(batch)
+
+    def insert_capturing_keys(self, spec, batch):
+        # MERGE ... ON 1 = 0 inserts every source row and, unlike INSERT ... OUTPUT, may
+        # reference source columns in OUTPUT, giving an exact old-key -> new-key map.
+        identity = spec['identity']
+        columns = [column for column in spec['columns'] if column != identity]
+        key_map = self.key_maps.setdefault(spec['name'], {})
+        rows_per_statement = max(1, MAX_PARAMETERS // (len(columns) + 1))
+        for start in range(0, len(batch), rows_per_statement):
+            part = batch[start:start + rows_per_statement]
+            values = ', '.join(f"({', '.join('?' * (len(columns) + 1))})" for _ in part)
+            query = (f"MERGE INTO {spec['name']} AS target "
+                     f"USING (VALUES {values}) AS source (old_key, {', '.join(columns)}) ON 1 = 0 "
+                     f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) "
+                     f"VALUES ({', '.join('source.' + column for column in columns)}) "
+                     f"OUTPUT source.old_key, INSERTED.{identity};")
+            params = [value for row in part for value in [row[identity]] + [row[column] for column in columns]]
+            self.cursor.execute(query, params)
+            key_map.update(self.cursor.fetchall())
+        return len(batch)
+
+    def load_table(self, spec):
+        path = os.path.join(self.data_dir, f"{spec['name']}.csv")
+        started = time.perf_counter()
+        stats = {'skipped': 0}
+        loaded = 0
+        capture = not self.preserve_keys and spec.get('identity')
+        if self.preserve_keys and spec.get('identity'):
+            self.cursor.execute(f"SET IDENTITY_INSERT {spec['name']} ON")
+        try:
+            for batch in chunks(read_rows(path, spec, stats), self.batch_size):
+                self.close_queues(spec, batch)
+                if not self.preserve_keys:
+                    before = len(batch)
+                    batch = self.remap(spec, batch)
+                    stats['skipped'] += before - len(batch)
+                if batch:
+                    loaded += self.insert_capturing_keys(spec, batch) if capture else self.insert_preserving_keys(spec, batch)
+        finally:
+            if self.preserve_keys and spec.get('identity'):
+                self.cursor.execute(f"SET IDENTITY_INSERT {spec['name']} OFF")
+        elapsed = time.perf_counter() - started
+        return {'table': spec['name'], 'rows': loaded, 'skipped': stats['skipped'],
+                'seconds': elapsed, 'rows_per_second': loaded / elapsed if elapsed else 0.0}
+
+    def load(self, replace=False, report=print):
+        results = []
+        try:
+            triggers = self.catalog_triggers()
+            self.set_triggers(triggers, False)
+            try:
+                if replace:
+                    self.clear()
+                for spec in TABLES:
+                    result = self.load_table(spec)
+                    results.append(result)
+                    report(f"{result['table']:20} {result['rows']:>10,} rows  {result['seconds']:8.2f}s  "
+                           f"{result['rows_per_second']:>10,.0f} rows/s"
+                           + (f"  ({result['skipped']} skipped)" if result['skipped'] else ""))
+                self.cursor.execute(QUEUE_RENUMBER)
+                if triggers:
+                    started = time.perf_counter()
+                    self.rebuild_catalog()
+                    report(f"{'book_catalog':20} {'rebuilt':>15}  {time.perf_counter() - started:8.2f}s")
+            finally:
+                self.set_triggers(triggers, True)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load the Book Haven CSV dataset into SQL Server in one transaction.")
+    add_connection_args(parser)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--batch-size', type=int, default=10000, help='Rows read and sent per round trip')
+    parser.add_argument('--replace', action='store_true', help='Delete existing rows and reseed identities first')
+    parser.add_argument('--generate-keys', action='store_true',
+                        help='Let SQL Server assign identity values and translate foreign keys through '
+                             'the captured keys (for appending to a populated database)')
+    args = parser.parse_args()
+
+    conn = connect(args, autocommit=False)
+    try:
+        loader = BulkLoader(conn, args.data_dir, args.batch_size, preserve_keys=not args.generate_keys)
+        started = time.perf_counter()
+        results = loader.load(replace=args.replace)
+        elapsed = time.perf_counter() - started
+        total = sum(result['rows'] for result in results)
+        print(f"{'total':20} {total:>10,} rows  {elapsed:8.2f}s  {total / elapsed if elapsed else 0:>10,.0f} rows/s")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
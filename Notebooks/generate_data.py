@@ -0,0 +1,370 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generated')
+
+# Entities are produced in fixed-size blocks, each with its own RNG stream, so the output
+# depends only on seed and scale while memory stays flat for any volume.
+BLOCK = 50000
+
+# Scale 1 matches the notebook dataset: 2,500 books and ~44k rows over all tables.
+BOOKS_PER_SCALE = 2500
+AUTHORS_PER_BOOK = 1.8
+MEMBERS_PER_BOOK = 1.2
+ROWS_PER_BOOK = 17.4
+CATEGORIES_PER_SCALE = 800
+STAFF_PER_SCALE = 100
+
+START_DATE = np.datetime64('2025-01-01')
+
+COLUMNS = {
+    'description': ['description_id', 'description'],
+    'author': ['author_id', 'name'],
+    'category': ['category_id', 'category_name'],
+    'member': ['member_id', 'fname', 'lname', 'email', 'phone', 'city', 'street', 'bdate'],
+    'staff': ['staff_id', 'fname', 'lname', 'email', 'phone', 'role', 'password', 'salary'],
+    'book': ['ISBN', 'title', 'publication_year', 'description_id'],
+    'book_author': ['ISBN', 'author_id'],
+    'book_category': ['ISBN', 'category_id'],
+    'book_copy': ['copy_id', 'status', 'condition', 'price', 'ISBN'],
+    'reservation': ['reservation_id', 'member_id', 'staff_id', 'reservation_date', 'expiration_date', 'returned_at'],
+    'reservation_details': ['reservation_id', 'copy_id', 'position_in_queue'],
+}
+
+FIRST_NAMES = ['James', 'Mary', 'Ahmed', 'Fatma', 'John', 'Linda', 'Omar', 'Sara', 'David', 'Nour', 'Michael',
+               'Mona', 'Robert', 'Hana', 'William', 'Laila', 'Youssef', 'Emily', 'Karim', 'Salma', 'Daniel', 'Aya',
+               'Thomas', 'Mariam', 'Mostafa', 'Grace', 'Hassan', 'Jessica', 'Ali', 'Rana']
+LAST_NAMES = ['Smith', 'Hassan', 'Johnson', 'Mahmoud', 'Williams', 'Ibrahim', 'Brown', 'Ali', 'Jones', 'Saleh',
+              'Garcia', 'Farouk', 'Miller', 'Mostafa', 'Davis', 'Kamal', 'Wilson', 'Nasser', 'Moore', 'Fawzy',
+              'Taylor', 'Adel', 'Anderson', 'Samir', 'Thomas', 'Younis', 'Murphy', 'Hamdy', 'Martin', 'Zaki']
+CITIES = ['Cairo', 'Alexandria', 'Giza', 'Mansoura', 'Tanta', 'Aswan', 'Luxor', 'Suez', 'Ismailia', 'Fayoum',
+          'Zagazig', 'Damietta', 'Minya', 'Sohag', 'Hurghada', 'Port Said']
+STREETS = ['Nile St', 'Tahrir St', 'Garden Rd', 'Palm Ave', 'Station Rd', 'Museum St', 'Corniche Rd',
+           'Market St', 'University Ave', 'Lotus St', 'Pyramids Rd', 'Canal St']
+ADJECTIVES = ['Silent', 'Hidden', 'Last', 'Golden', 'Broken', 'Distant', 'Secret', 'Forgotten', 'Crimson',
+              'Endless', 'Wild', 'Quiet', 'Burning', 'Lost', 'Bright', 'Shattered', 'Ancient', 'Little']
+NOUNS = ['River', 'Garden', 'Empire', 'Promise', 'Shadow', 'Kingdom', 'Journey', 'Letter', 'Harbor', 'Storm',
+         'Mirror', 'Station', 'Island', 'Voice', 'Orchard', 'Bridge', 'Winter', 'Library']
+PLACES = ['the North', 'Tomorrow', 'the Desert', 'Glass', 'the Sea', 'Memory', 'Stone', 'the City', 'Ashes']
+SENTENCES = [
+    'A sweeping story of love and loss across three generations.',
+    'When an unexpected letter arrives, nothing will ever be the same.',
+    'This practical guide walks readers through every step with clear examples.',
+    'Set against the backdrop of a changing nation, the novel explores family and belonging.',
+    'A bestselling author returns with a gripping tale of suspense.',
+    'Drawing on decades of research, the book offers a fresh perspective on history.',
+    'Readers will be captivated by its vivid characters and sharp dialogue.',
+    'An inspiring account of courage in the face of impossible odds.',
+    'Part memoir and part manifesto, it challenges everything we thought we knew.',
+    'The definitive reference for students and professionals alike.',
+    'A haunting mystery unfolds in a small town where everyone has a secret.',
+    'Beautifully illustrated and full of warmth, it is a book to treasure.',
+]
+GENRES = ['Fiction', 'History', 'Science', 'Biography', 'Poetry', 'Travel', 'Cooking', 'Religion', 'Philosophy',
+          'Business', 'Art', 'Music', 'Health', 'Education', 'Technology', 'Mystery', 'Romance', 'Fantasy',
+          'Children', 'Sports']
+QUALIFIERS = ['General', 'Modern', 'Classic', 'Reference', 'Essays', 'Criticism', 'Anthologies', 'Juvenile']
+STAFF_ROLES = ['Librarian', 'Assistant', 'Technician']
+COPY_STATUSES = ['Available', 'Reserved', 'Checked Out']
+COPY_CONDITIONS = ['New', 'Good', 'Fair', 'Poor']
+PASSWORD_ALPHABET = np.frombuffer(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789', dtype=np.uint8)
+
+# RNG stream ids, one per generation pass
+AUTHORS, STAFF, BOOKS, MEMBERS = range(4)
+
+
+def pick(rng, words, n):
+    return np.asarray(words)[rng.integers(0, len(words), n)]
+
+
+def concat(*parts):
+    result = parts[0]
+    for part in parts[1:]:
+        result = np.char.add(result, part)
+    return result
+
+
+def scramble(index, modulus):
+    # Multiplying by a constant coprime to 10^k permutes 0..10^k-1, so distinct ids give
+    # distinct, random-looking numbers without any lookup table.
+    return (index.astype(np.int64) * 387420489 + 123456789) % modulus
+
+
+def isbn10(index):
+    body = scramble(index, 10 ** 9)
+    digits = (body[:, None] // 10 ** np.arange(8, -1, -1)) % 10
+    check = (11 - (digits * np.arange(10, 1, -1)).sum(axis=1) % 11) % 11
+    return np.char.add(np.char.zfill(body.astype(str), 9), np.where(check == 10, 'X', check.astype(str)))
+
+
+def phone_numbers(ids, prefix):
+    return np.char.add(prefix, np.char.zfill(scramble(ids, 10 ** 9).astype(str), 9))
+
+
+def emails(ids, fname, lname, domain):
+    return concat(np.char.lower(fname), '.', np.char.lower(lname), ids.astype(str), domain)
+
+
+def passwords(rng, n, length=8):
+    codes = PASSWORD_ALPHABET[rng.integers(0, len(PASSWORD_ALPHABET), (n, length))]
+    return codes.view(f'S{length}').ravel().astype(str)
+
+
+def distinct_picks(rng, counts, population):
+    # Picks for one owner are spaced by a stride small enough that they never wrap onto each
+    # other, so composite keys like (ISBN, author_id) stay unique without a dedupe pass.
+    # The base id is skewed toward low ids to give popular authors/categories/copies.
+    counts = np.minimum(counts, population)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    nth = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    limit = max(1, (population - 1) // max(1, int(counts.max(initial=1)) - 1))
+    base = (population * rng.random(len(counts)) ** 2).astype(np.int64)
+    stride = rng.integers(1, limit + 1, len(counts))
+    return owner, (base[owner] + nth * stride[owner]) % population + 1
+
+
+def queue_positions(copy_ids, queued):
+    # Rank each copy's reservations in id order, continuing from the previous blocks.
+    order = np.argsort(copy_ids, kind='stable')
+    ordered = copy_ids[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    rank = np.empty(len(copy_ids), dtype=np.int64)
+    rank[order] = np.arange(len(ordered)) - np.repeat(starts, np.diff(np.r_[starts, len(ordered)]))
+    positions = queued[copy_ids] + rank + 1
+    np.add.at(queued, copy_ids, 1)
+    return positions
+
+
+class DataGenerator:
+    def __init__(self, scale=1.0, seed=42):
+        self.seed = seed
+        self.books = max(1, round(BOOKS_PER_SCALE * scale))
+        if self.books > 10 ** 9:
+            raise ValueError("Scale too large for unique 10-digit ISBNs")
+        self.authors = max(1, round(self.books * AUTHORS_PER_BOOK))
+        self.categories = max(len(GENRES), round(CATEGORIES_PER_SCALE * scale ** 0.5))
+        self.members = max(1, round(self.books * MEMBERS_PER_BOOK))
+        self.staff = max(len(STAFF_ROLES) + 3, round(STAFF_PER_SCALE * scale ** 0.5))
+        self.copies = 0
+        self.reservations = 0
+        self.assistants = None
+
+    def rng(self, stream, block):
+        return np.random.default_rng([self.seed, stream, block])
+
+    def blocks(self, total):
+        for block, start in enumerate(range(0, total, BLOCK)):
+            yield block, np.arange(start, min(start + BLOCK, total), dtype=np.int64)
+
+    def generate(self):
+        yield from self.author_rows()
+        yield from self.category_rows()
+        yield from self.staff_rows()
+        yield from self.book_rows()
+        yield from self.member_rows()
+
+    def author_rows(self):
+        for block, index in self.blocks(self.authors):
+            rng = self.rng(AUTHORS, block)
+            n = len(index)
+            first, last = pick(rng, FIRST_NAMES, n), pick(rng, LAST_NAMES, n)
+            initial = np.char.add(' ', np.char.add(pick(rng, list('ABCDEFGHJKLMNPRSTW'), n), '.'))
+            name = concat(first, np.where(rng.random(n) < 0.3, initial, ''), ' ', last)
+            yield 'author', {'author_id': index + 1, 'name': name}
+
+    def category_rows(self):
+        for _, index in self.blocks(self.categories):
+            names = []
+            for i in index.tolist():
+                tier, genre = divmod(i, len(GENRES))
+                name = GENRES[genre]
+                if tier:
+                    cycle, qualifier = divmod(tier - 1, len(QUALIFIERS))
+                    name += f" - {QUALIFIERS[qualifier]}" + (f" {cycle + 1}" if cycle else "")
+                names.append(name)
+            yield 'category', {'category_id': index + 1, 'category_name': np.array(names)}
+
+    def staff_rows(self):
+        rng = self.rng(STAFF, 0)
+        ids = np.arange(1, self.staff + 1)
+        n = len(ids)
+        role = pick(rng, STAFF_ROLES, n)
+        role[:3] = 'Manager'
+        self.assistants = ids[role == 'Assistant']
+        if not len(self.assistants):
+            self.assistants = ids
+        fname, lname = pick(rng, FIRST_NAMES, n), pick(rng, LAST_NAMES, n)
+        yield 'staff', {
+            'staff_id': ids, 'fname': fname, 'lname': lname,
+            'email': emails(ids, fname, lname, '@bookhaven.example'),
+            'phone': phone_numbers(ids, '02'), 'role': role, 'password': passwords(rng, n),
+            'salary': np.round(rng.uniform(5000, 15000, n), 2),
+        }
+
+    def book_rows(self):
+        for block, index in self.blocks(self.books):
+            rng = self.rng(BOOKS, block)
+            n = len(index)
+            isbn = isbn10(index)
+
+            sentences = [pick(rng, SENTENCES, n) for _ in range(4)]
+            extra = rng.random((2, n))
+            description = concat(sentences[0], ' ', sentences[1],
+                                 np.where(extra[0] < 0.7, np.char.add(' ', sentences[2]), ''),
+                                 np.where(extra[1] < 0.4, np.char.add(' ', sentences[3]), ''))
+            yield 'description', {'description_id': index + 1, 'description': description}
+
+            adjective, noun = pick(rng, ADJECTIVES, n), pick(rng, NOUNS, n)
+            template = rng.integers(0, 3, n)
+            title = np.where(template == 0, concat('The ', adjective, ' ', noun),
+                             np.where(template == 1, concat(noun, ' of ', pick(rng, PLACES, n)),
+                                      concat(adjective, ' ', noun, 's')))
+            yield 'book', {'ISBN': isbn, 'title': title, 'publication_year': rng.integers(1950, 2025, n),
+                           'description_id': index + 1}
+
+            owner, author_id = distinct_picks(rng, rng.integers(1, 5, n), self.authors)
+            yield 'book_author', {'ISBN': isbn[owner], 'author_id': author_id}
+
+            owner, category_id = distinct_picks(rng, rng.integers(1, 5, n), self.categories)
+            yield 'book_category', {'ISBN': isbn[owner], 'category_id': category_id}
+
+            counts = rng.integers(1, 4, n)
+            total = int(counts.sum())
+            yield 'book_copy', {
+                'copy_id': self.copies + np.arange(1, total + 1),
+                'status': np.asarray(COPY_STATUSES)[rng.choice(len(COPY_STATUSES), total, p=[0.6, 0.15, 0.25])],
+                'condition': pick(rng, COPY_CONDITIONS, total),
+                'price': np.round(rng.uniform(20, 150, total), 2),
+                'ISBN': np.repeat(isbn, counts),
+            }
+            self.copies += total
+
+    def member_rows(self):
+        queued = np.zeros(self.copies + 1, dtype=np.int64)
+        for block, index in self.blocks(self.members):
+            rng = self.rng(MEMBERS, block)
+            n = len(index)
+            ids = index + 1
+            fname, lname = pick(rng, FIRST_NAMES, n), pick(rng, LAST_NAMES, n)
+            street = concat(rng.integers(1, 500, n).astype(str), ' ', pick(rng, STREETS, n))
+            yield 'member', {
+                'member_id': ids, 'fname': fname, 'lname': lname,
+                'email': emails(ids, fname, lname, '@example.net'), 'phone': phone_numbers(ids, '01'),
+                'city': pick(rng, CITIES, n), 'street': street,
+                'bdate': START_DATE - rng.integers(18 * 365, 80 * 365, n).astype('timedelta64[D]'),
+            }
+
+            counts = rng.integers(1, 3, n)
+            total = int(counts.sum())
+            reservation_id = self.reservations + np.arange(1, total + 1)
+            reserved = START_DATE + rng.integers(0, 365 * 2, total).astype('timedelta64[D]')
+            loan_days = rng.integers(7, 22, total)
+            returned = reserved + rng.integers(1, loan_days + 1).astype('timedelta64[D]')
+            returned[rng.random(total) > 0.8] = np.datetime64('NaT')
+            yield 'reservation', {
+                'reservation_id': reservation_id, 'member_id': np.repeat(ids, counts),
+                'staff_id': self.assistants[rng.integers(0, len(self.assistants), total)],
+                'reservation_date': reserved, 'expiration_date': reserved + loan_days.astype('timedelta64[D]'),
+                'returned_at': returned,
+            }
+            self.reservations += total
+
+            owner, copy_id = distinct_picks(rng, rng.integers(1, 4, total), self.copies)
+            # Only open reservations hold a queue position; closed ones are 0 (migration 004)
+            waiting = np.isnat(returned)[owner]
+            position = np.zeros(len(copy_id), dtype=np.int64)
+            position[waiting] = queue_positions(copy_id[waiting], queued)
+            yield 'reservation_details', {'reservation_id': reservation_id[owner], 'copy_id': copy_id,
+                                          'position_in_queue': position}
+
+
+def csv_text(values):
+    if np.issubdtype(values.dtype, np.datetime64):
+        text = np.datetime_as_string(values, unit='D')
+        text[np.isnat(values)] = ''
+        return text.tolist()
+    if values.dtype.kind == 'f':
+        return np.char.mod('%.2f', values).tolist()
+    return values.tolist()
+
+
+class TableWriter:
+    def __init__(self, output_dir, table, fmt):
+        self.path = os.path.join(output_dir, f"{table}.{fmt}")
+        self.columns = COLUMNS[table]
+        self.fmt = fmt
+        self.rows = 0
+        self.writer = None
+        if fmt == 'csv':
+            import csv
+            self.file = open(self.path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.columns)
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise SystemExit(f"Parquet output requires pyarrow (pip install pyarrow): {e}") from e
+            self.pa, self.pq = pa, pq
+
+    def write(self, chunk):
+        if self.fmt == 'csv':
+            self.writer.writerows(zip(*(csv_text(chunk[column]) for column in self.columns)))
+        else:
+            table = self.pa.table({column: self.pa.array(chunk[column], from_pandas=True) for column in self.columns})
+            if self.writer is None:
+                self.writer = self.pq.ParquetWriter(self.path, table.schema, compression='snappy')
+            self.writer.write_table(table.cast(self.writer.schema))
+        self.rows += len(chunk[self.columns[0]])
+
+    def close(self):
+        if self.fmt == 'csv':
+            self.file.close()
+        elif self.writer is not None:
+            self.writer.close()
+
+
+def write_dataset(generator, output_dir, fmt='csv', report=print):
+    os.makedirs(output_dir, exist_ok=True)
+    writers = {}
+    started = time.perf_counter()
+    try:
+        for table, chunk in generator.generate():
+            if table not in writers:
+                writers[table] = TableWriter(output_dir, table, fmt)
+            writers[table].write(chunk)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    elapsed = time.perf_counter() - started
+    for table, writer in writers.items():
+        report(f"{table:20} {writer.rows:>12,} rows")
+    total = sum(writer.rows for writer in writers.values())
+    report(f"{'total':20} {total:>12,} rows  {elapsed:8.2f}s  {total / elapsed if elapsed else 0:>10,.0f} rows/s")
+    return {table: writer.rows for table, writer in writers.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic Book Haven dataset with referential integrity at any volume.")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--scale', type=float, default=1.0, help='1.0 is ~44k rows (2,500 books); scales linearly')
+    size.add_argument('--rows', type=int, help='Approximate total row count, e.g. 10000 or 100000000')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    scale = args.rows / (BOOKS_PER_SCALE * ROWS_PER_BOOK) if args.rows else args.scale
+    generator = DataGenerator(scale, args.seed)
+    print(f"Generating scale {scale:g} ({generator.books:,} books, {generator.members:,} members) "
+          f"into {args.output_dir} ...")
+    write_dataset(generator, args.output_dir, args.format)
+
+
+if __name__ == '__main__':
+    main()
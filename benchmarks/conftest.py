@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'GUI'), os.path.join(ROOT, 'Notebooks')]
+
+from sqlite_backend import stand_in
+
+CSV_DIR = os.path.join(ROOT, 'Notebooks', 'data')
+
+# Datasets to run every benchmark against: 'csv' is Notebooks/data, numbers are
+# generate_data.py scales (1 is ~44k rows). Override with BENCH_SCALES=csv,1,10
+SCALES = [scale.strip() for scale in os.environ.get('BENCH_SCALES', 'csv,0.2,2').split(',') if scale.strip()]
+
+
+@pytest.fixture(scope='session', params=SCALES)
+def library(request, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('stand_in') / f"book_haven_{request.param}.sqlite3")
+    if request.param == 'csv':
+        data = stand_in(path, data_dir=CSV_DIR)
+    else:
+        pytest.importorskip('numpy')
+        from generate_data import DataGenerator
+        data = stand_in(path, generator=DataGenerator(float(request.param)))
+    yield data
+    data.db.close_all()
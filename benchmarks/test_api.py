@@ -0,0 +1,167 @@
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from api_client import RemoteSession
+from api_server import MAX_BODY, LibraryApi
+
+DESKS = 8
+
+
+def call(server, method, path, token=None, body=None, **headers):
+    # One raw request, so the tests see status codes and headers as any HTTP client would
+    conn = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+    try:
+        conn.request(method, path, None if body is None else json.dumps(body), headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, response.getheader('ETag'), json.loads(data) if data else None
+    finally:
+        conn.close()
+
+
+def login(server, library, role):
+    _, staff = library.db.query("SELECT email, password FROM staff WHERE role = ? ORDER BY staff_id LIMIT 1", (role,))
+    status, _, body = call(server, 'POST', '/login', body={'email': staff[0][0], 'password': staff[0][1]})
+    assert status == 200
+    return body['token']
+
+
+@pytest.fixture(scope='session')
+def api(library):
+    # The service over the stand-in on a free port, and a desk logged in to it as a manager
+    server = LibraryApi(('127.0.0.1', 0), library)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    _, staff = library.db.query("SELECT email, password FROM staff WHERE role = 'Manager' ORDER BY staff_id LIMIT 1")
+    session = RemoteSession(url)
+    assert session.data.authenticate(*staff[0])
+    session.warm()
+    yield server, session, staff[0]
+    session.logout()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.benchmark(group='api')
+@pytest.mark.parametrize('table_name', ['member', 'reservation'])
+def test_api_view_load(benchmark, library, api, table_name):
+    # Count and first screen over HTTP, for comparison with test_view_load
+    _, session, _ = api
+    pager = benchmark(session.data.open_view, table_name)
+    assert pager.total == library.db.query(f"SELECT COUNT(*) FROM {table_name}")[1][0][0]
+
+
+@pytest.mark.benchmark(group='api')
+def test_api_catalog_cached(benchmark, api):
+    # Repeat catalog reads within the TTL are served from the response cache
+    server, session, _ = api
+    session.data.open_view('author')
+    hits = server.cache.hits
+    pager = benchmark(session.data.open_view, 'author')
+    assert pager.total and server.cache.hits > hits
+
+
+@pytest.mark.benchmark(group='api')
+def test_api_desks(benchmark, api):
+    # DESKS clients opening and scrolling views at once through the one service
+    server, _, staff = api
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    desks = [RemoteSession(url) for _ in range(DESKS)]
+    for desk in desks:
+        desk.data.authenticate(*staff)
+    def scroll(desk):
+        pager = desk.data.open_view('book')
+        return sum(len(pager.rows(start, pager.page_size)) for start in range(0, 5 * pager.page_size, pager.page_size))
+    def run():
+        with ThreadPoolExecutor(DESKS) as pool:
+            return list(pool.map(scroll, desks))
+    assert len(set(benchmark(run))) == 1
+    for desk in desks:
+        desk.logout()
+
+
+def test_api_requires_token(library, api):
+    server, _, _ = api
+    assert call(server, 'GET', '/tables/member')[0] == 401
+    assert call(server, 'GET', '/tables/member', token='not-a-token')[0] == 401
+    token = login(server, library, 'Manager')
+    assert call(server, 'GET', '/tables/member', token=token)[0] == 200
+    assert call(server, 'POST', '/logout', token=token)[0] == 200
+    assert call(server, 'GET', '/tables/member', token=token)[0] == 401
+
+
+def test_api_forbidden(library, api):
+    # A Technician may only view and edit book_copy
+    server, _, _ = api
+    token = login(server, library, 'Technician')
+    member_id = library.db.query("SELECT MIN(member_id) FROM member")[1][0][0]
+    assert call(server, 'GET', '/tables/member', token=token)[0] == 403
+    assert call(server, 'DELETE', '/tables/member', token=token, body={'keys': [[member_id]]})[0] == 403
+    assert call(server, 'DELETE', '/tables/book_copy', token=token, body={'keys': [[1]]})[0] == 403
+    assert library.db.query("SELECT COUNT(*) FROM member WHERE member_id = ?", (member_id,))[1][0][0] == 1
+    assert call(server, 'GET', '/tables/book_copy', token=token)[0] == 200
+
+
+def test_api_not_modified(library, api):
+    server, _, _ = api
+    token = login(server, library, 'Manager')
+    status, tag, body = call(server, 'GET', '/tables/member?limit=5', token=token)
+    assert status == 200 and tag and len(body['rows']) == 5
+    assert call(server, 'GET', '/tables/member?limit=5', token=token, **{'If-None-Match': tag}) == (304, tag, None)
+    assert call(server, 'GET', '/tables/member?limit=5', token=token, **{'If-None-Match': '"stale"'})[0] == 200
+
+
+def test_api_write_evicts_cache(library, api):
+    # A catalog page is served from the response cache until a write through the service
+    server, _, _ = api
+    token = login(server, library, 'Manager')
+    path = '/tables/author?limit=5'
+    _, tag, body = call(server, 'GET', path, token=token)
+    hits = server.cache.hits
+    assert call(server, 'GET', path, token=token)[1] == tag and server.cache.hits == hits + 1
+    author_id, name = body['rows'][0]
+    try:
+        assert call(server, 'PATCH', '/tables/author', token=token,
+                    body={'columns': ['name'], 'rows': [[f"{name} (renamed)", author_id]]})[0] == 200
+        status, fresh_tag, fresh = call(server, 'GET', path, token=token, **{'If-None-Match': tag})
+        assert status == 200 and fresh_tag != tag
+        assert fresh['rows'][0] == [author_id, f"{name} (renamed)"]
+    finally:
+        call(server, 'PATCH', '/tables/author', token=token, body={'columns': ['name'], 'rows': [[name, author_id]]})
+
+
+def test_api_checks_token_before_body(library, api):
+    # The body of an unauthenticated request is never read, whatever its size or content
+    server, _, _ = api
+    conn = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    try:
+        conn.putrequest('POST', '/tables/member')
+        conn.putheader('Content-Length', str(MAX_BODY + 1))
+        conn.endheaders()
+        response = conn.getresponse()
+        assert response.status == 401 and response.getheader('Connection') == 'close'
+    finally:
+        conn.close()
+    assert call(server, 'POST', '/reservations', body={'copy_ids': [1]})[0] == 401
+    token = login(server, library, 'Manager')
+    assert call(server, 'POST', '/tables/member', token=token, **{'Content-Length': str(MAX_BODY + 1)})[0] == 413
+
+
+def test_api_hides_staff_passwords(library, api):
+    server, _, _ = api
+    token = login(server, library, 'Manager')
+    _, _, page = call(server, 'GET', '/tables/staff?limit=5', token=token)
+    assert 'password' not in page['columns'] and len(page['rows'][0]) == len(page['columns'])
+    _, _, found = call(server, 'POST', '/tables/staff/lookup', token=token, body={'keys': [page['rows'][0][:1]], 'full': True})
+    assert found['columns'] == page['columns'] and found['rows'] == page['rows'][:1]
+    _, _, schema = call(server, 'GET', '/schema', token=token)
+    assert schema['tables']['staff']['columns'] == page['columns']
+    assert 'password' not in schema['tables']['staff']['types']
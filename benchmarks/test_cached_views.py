@@ -0,0 +1,177 @@
+import os
+
+import pytest
+
+from search import SearchCache
+from sqlite_backend import stand_in
+
+CSV_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Notebooks', 'data')
+
+# The grid patches cached pages in place after deletes, bulk updates and Change Tracking
+# deltas, and narrows cached search results locally. Each case here checks the cache against
+# a fresh read of the same view, so a wrong offset or a missed row shows up as a diff.
+PAGE = 10
+
+
+@pytest.fixture
+def data(tmp_path):
+    data = stand_in(str(tmp_path / 'book_haven.sqlite3'), data_dir=CSV_DIR)
+    yield data
+    data.db.close_all()
+
+
+def fresh(data, pager, count):
+    return data.pager(pager.table_name, (pager.where, pager.params), page_size=pager.page_size).rows(0, count)
+
+
+def change(pager, row, operation='U'):
+    # A ChangeTracker delta entry: the key as cleaned strings, the current row or None
+    return operation, pager.row_key(row), row
+
+
+def delete(data, pager, indexes):
+    rows = pager.cached_rows(0, max(indexes) + 1)
+    keys = [pager.key_of(rows[i]) for i in indexes]
+    data.delete_rows(pager.table_name, keys)
+    pager.remove_rows(indexes, [pager.row_key(rows[i]) for i in indexes])
+
+
+@pytest.mark.parametrize('table_name', ['author', 'book_author'])
+def test_delete_across_page_boundary(data, table_name):
+    # Rows 8..12 span pages 0 and 1; both pages are re-cut, the short remainder of page 2 is dropped
+    pager = data.pager(table_name, page_size=PAGE)
+    pager.count()
+    total = pager.total
+    pager.rows(0, 3 * PAGE)
+    delete(data, pager, list(range(PAGE - 2, PAGE + 3)))
+    assert pager.total == total - 5
+    assert pager.cached_rows(0, 2 * PAGE) == fresh(data, pager, 2 * PAGE)
+    assert pager.cached_page(2) is None
+    assert pager.rows(0, 4 * PAGE) == fresh(data, pager, 4 * PAGE)
+
+
+def test_delete_drops_pages_past_a_gap(data):
+    pager = data.pager('book_author', page_size=PAGE)
+    pager.rows(0, 2 * PAGE)
+    pager.rows(4 * PAGE, PAGE)
+    delete(data, pager, [PAGE + 1])
+    assert pager.cached_page(4) is None
+    assert pager.cached_rows(0, PAGE) == fresh(data, pager, PAGE)
+    assert pager.rows(4 * PAGE, PAGE) == fresh(data, pager, 5 * PAGE)[4 * PAGE:]
+
+
+def test_delete_on_last_page(data):
+    # The final, short page stays cached after the delete
+    pager = data.pager('member', data.predicate('member', 'Sm'), page_size=PAGE)
+    total = pager.count()
+    pager.rows(0, total)
+    delete(data, pager, [total - 2])
+    assert pager.cached_rows(0, total) == fresh(data, pager, total)
+
+
+def test_changes_on_composite_key(data):
+    # Updates patch in place; rows added outside the cache under a non-integer key cannot be
+    # placed without the server's collation, so the view is re-read
+    pager = data.pager('book_author', page_size=PAGE)
+    rows = pager.rows(0, 2 * PAGE)
+    other = data.db.query("SELECT MAX(author_id) FROM author")[1][0][0]
+    data.update_rows('book_author', ['author_id'], [[other] + pager.key_of(rows[3])])
+    moved = data.db.query("SELECT * FROM book_author WHERE ISBN = ? AND author_id = ?", (rows[3][0], other))[1][0]
+    assert pager.apply_changes([('D', pager.row_key(rows[3]), None), change(pager, moved, 'I')]) is None
+    pager = data.pager('book_author', page_size=PAGE)
+    rows = pager.rows(0, 2 * PAGE)
+    assert pager.apply_changes([change(pager, rows[PAGE])]) == []
+    assert pager.cached_rows(0, 2 * PAGE) == rows
+
+
+def test_update_moves_row_out_of_filtered_view(data):
+    # A row that stops matching the search leaves the window; later rows shift up a place
+    pager = data.pager('member', data.predicate('member', 'S'), page_size=PAGE)
+    pager.count()
+    total = pager.total
+    rows = pager.rows(0, 3 * PAGE)
+    leaving = rows[PAGE - 1]
+    data.update_rows('member', ['fname', 'lname', 'email'], [['Zed', 'Zed', f"zed{leaving[0]}@example.com", leaving[0]]])
+    assert pager.apply_changes([('U', pager.row_key(leaving), None)]) == [PAGE - 1]
+    assert pager.total == total - 1
+    assert pager.cached_rows(0, 2 * PAGE) == fresh(data, pager, 2 * PAGE)
+
+
+def test_update_moves_row_into_filtered_view(data):
+    # A row that starts to match sorts inside the cached key range: positions are unknown
+    pager = data.pager('member', data.predicate('member', 'S'), page_size=PAGE)
+    rows = pager.rows(0, 2 * PAGE)
+    outside = data.db.query("SELECT MIN(member_id) FROM member WHERE member_id > ? AND member_id < ? "
+                            "AND fname NOT LIKE 'S%' AND lname NOT LIKE 'S%' AND email NOT LIKE 'S%'",
+                            (rows[0][0], rows[-1][0]))[1][0][0]
+    data.update_rows('member', ['lname'], [['Smith', outside]])
+    row = data.full_rows('member', [outside])[0]
+    assert pager.apply_changes([change(pager, row)]) is None
+
+
+def test_insert_after_cached_end(data):
+    # New rows past the last key extend a cached final page
+    pager = data.pager('author', page_size=PAGE)
+    total = pager.count()
+    pager.rows(total - 3, 3)
+    data.insert_rows('author', ['name'], [['Appended author one'], ['Appended author two']])
+    added = data.db.query("SELECT * FROM author WHERE author_id > ? ORDER BY author_id", (pager.cached_rows(total - 1, 1)[0][0],))[1]
+    assert pager.apply_changes([change(pager, row, 'I') for row in added]) == []
+    assert pager.cached_rows(total - 3, 5) == fresh(data, pager, total + 2)[total - 3:]
+
+
+def full_result(data, table_name, term):
+    pager = data.pager(table_name, data.predicate(table_name, term))
+    return pager.rows(0, pager.count())
+
+
+def cached(data, table_name, term):
+    cache = SearchCache()
+    predicate = data.predicate(table_name, term)
+    rows = full_result(data, table_name, term)
+    cache.put(table_name, term, predicate, rows, len(rows))
+    return cache
+
+
+@pytest.mark.parametrize('table_name,cached_term,term', [('member', 'S', 'Sm'), ('author', 'Ma', 'Mar'),
+                                                         ('book', 'th', 'the')])
+def test_narrow_matches_server(data, table_name, cached_term, term):
+    data.search.load_fulltext_columns()
+    entry = cached(data, table_name, cached_term).narrow(data.search, table_name, term)
+    assert entry['rows'] == full_result(data, table_name, term)
+
+
+def test_narrow_fulltext_matches_server(data):
+    # With a full-text index the title is matched word by word, through CONTAINS on the server
+    data.search.fulltext_columns = {('book', 'title')}
+    entry = cached(data, 'book', 'the').narrow(data.search, 'book', 'the w')
+    assert entry['rows'] == full_result(data, 'book', 'the w')
+
+
+@pytest.mark.parametrize('table_name,cached_term,term', [
+    ('book_copy', '4', '42'),                 # an ID grows into rows '4' never returned
+    ('book', '0-1', '0-19'),                  # ISBNs are compared with hyphens stripped
+    ('description', 'the', 'them'),           # full-text over a (MAX) column the cache only holds a preview of
+])
+def test_narrow_falls_back_to_server(data, table_name, cached_term, term):
+    data.search.load_fulltext_columns()
+    data.search.fulltext_columns.add(('description', 'description'))
+    assert cached(data, table_name, cached_term).narrow(data.search, table_name, term) is None
+
+
+def test_narrow_needs_complete_result(data):
+    data.search.load_fulltext_columns()
+    cache = SearchCache()
+    rows = full_result(data, 'member', 'S')
+    cache.put('member', 'S', data.predicate('member', 'S'), rows[:PAGE], len(rows))
+    assert cache.narrow(data.search, 'member', 'Sm') is None
+
+
+def test_prefix_cast_holds_escaped_term(data):
+    # Every '_' escapes to two characters; the VARCHAR cast must not cut the pattern short
+    length = data.schema.column_length('category', 'category_name')
+    sql, params = data.search.prefix('category', 'category_name', '_' * length)
+    assert len(params[0]) == 2 * length + 1
+    assert f"VARCHAR({2 * length + 1})" in sql
+    # A term longer than the column matches nothing there, so the column is left out
+    assert data.search.prefix('category', 'category_name', 'x' * (length + 1)) is None
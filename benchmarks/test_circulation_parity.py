@@ -0,0 +1,142 @@
+import os
+
+import pytest
+
+from data_access import LibraryData
+from reports import REPORTS
+from sqlite_backend import stand_in
+
+CSV_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Notebooks', 'data')
+
+# The stand-in's SQLiteCirculation and SQLiteReports re-implement the procedures of migrations
+# 004 and 005, so the reservation and report benchmarks time that copy. These scenarios pin down
+# what the procedures do and run against both backends: the stand-in always, SQL Server when
+# BOOK_HAVEN_PARITY_DATABASE names a scratch database built by migrate.py (the tests write to it).
+PARITY_DATABASE = os.environ.get('BOOK_HAVEN_PARITY_DATABASE')
+
+
+@pytest.fixture(scope='module', params=['stand-in', 'sql server'])
+def backend(request, tmp_path_factory):
+    if request.param == 'stand-in':
+        data = stand_in(str(tmp_path_factory.mktemp('parity') / 'book_haven.sqlite3'), data_dir=CSV_DIR)
+    else:
+        if not PARITY_DATABASE:
+            pytest.skip("BOOK_HAVEN_PARITY_DATABASE is not set")
+        pytest.importorskip('pyodbc')
+        from database import DatabaseConnection
+        from schema import SchemaCatalog
+        db = DatabaseConnection()
+        db.server = os.environ.get('BOOK_HAVEN_PARITY_SERVER', db.server)
+        db.database = PARITY_DATABASE
+        data = LibraryData(db, SchemaCatalog(db))
+    yield data
+    data.db.close_all()
+
+
+def value(data, sql, params=()):
+    return data.db.query(sql, params)[1][0][0]
+
+
+def idle_copies(data, count):
+    # Available copies nobody is queued for
+    _, rows = data.db.query(f"SELECT TOP ({count}) copy_id FROM book_copy bc WHERE status = 'Available' AND NOT EXISTS "
+                            f"(SELECT 1 FROM reservation_details rd WHERE rd.copy_id = bc.copy_id AND rd.position_in_queue > 0) "
+                            f"ORDER BY copy_id")
+    assert len(rows) == count
+    return [row[0] for row in rows]
+
+
+def queue(data, copy_id):
+    _, rows = data.db.query("SELECT reservation_id, position_in_queue FROM reservation_details "
+                            "WHERE copy_id = ? AND position_in_queue > 0 ORDER BY position_in_queue", (copy_id,))
+    return [tuple(row) for row in rows]
+
+
+def status(data, copy_id):
+    return value(data, "SELECT status FROM book_copy WHERE copy_id = ?", (copy_id,))
+
+
+def people(data):
+    _, members = data.db.query("SELECT TOP (3) member_id FROM member ORDER BY member_id")
+    staff_id = value(data, "SELECT MIN(staff_id) FROM staff")
+    return [row[0] for row in members], staff_id
+
+
+def test_queues_are_numbered(backend):
+    # Migration 004's invariant, which every promotion relies on: closed reservations hold no
+    # position, open ones 1..n per copy without gaps or ties
+    assert value(backend, "SELECT COUNT(*) FROM reservation_details rd JOIN reservation r ON r.reservation_id = rd.reservation_id "
+                          "WHERE r.returned_at IS NOT NULL AND rd.position_in_queue <> 0") == 0
+    assert value(backend, "SELECT COUNT(*) FROM (SELECT copy_id FROM reservation_details WHERE position_in_queue > 0 GROUP BY copy_id "
+                          "HAVING MIN(position_in_queue) <> 1 OR MAX(position_in_queue) <> COUNT(*) "
+                          "OR COUNT(DISTINCT position_in_queue) <> COUNT(*)) AS broken") == 0
+    assert value(backend, "SELECT COUNT(*) FROM reservation_details rd JOIN reservation r ON r.reservation_id = rd.reservation_id "
+                          "WHERE r.returned_at IS NULL AND rd.position_in_queue = 0") == 0
+
+
+def test_reserve_queues_and_return_promotes(backend):
+    first, second = idle_copies(backend, 2)
+    members, staff_id = people(backend)
+    circulation = backend.circulation
+    rows = circulation.reserve([second, first], member_id=members[0], staff_id=staff_id)
+    reservation_id = rows[0][0]
+    assert rows == [(reservation_id, first, 1), (reservation_id, second, 1)]
+    assert status(backend, first) == status(backend, second) == 'Reserved'
+    waiting = circulation.reserve([first], member_id=members[1], staff_id=staff_id)[0]
+    assert waiting[2] == 2
+    with pytest.raises(Exception, match='already queued'):
+        circulation.reserve([first], member_id=members[1], staff_id=staff_id)
+    assert circulation.return_reservations([reservation_id]) == 1
+    assert circulation.return_reservations([reservation_id]) == 0
+    assert queue(backend, first) == [(waiting[0], 1)]
+    assert queue(backend, second) == []
+    assert (status(backend, first), status(backend, second)) == ('Reserved', 'Available')
+    with pytest.raises(Exception, match='already closed'):
+        circulation.reserve([second], reservation_id=reservation_id)
+    assert circulation.return_reservations([waiting[0]]) == 1
+    assert status(backend, first) == 'Available'
+
+
+def test_damaged_copies_are_refused(backend):
+    copy_id, = idle_copies(backend, 1)
+    members, staff_id = people(backend)
+    backend.update_rows('book_copy', ['status'], [['Damaged', copy_id]])
+    try:
+        with pytest.raises(Exception, match='Damaged or lost'):
+            backend.circulation.reserve([copy_id], member_id=members[0], staff_id=staff_id)
+        assert queue(backend, copy_id) == []
+    finally:
+        backend.update_rows('book_copy', ['status'], [['Available', copy_id]])
+
+
+def test_expire_closes_overdue_holds(backend):
+    copy_id, = idle_copies(backend, 1)
+    members, staff_id = people(backend)
+    backend.circulation.expire()
+    overdue = backend.circulation.reserve([copy_id], member_id=members[0], staff_id=staff_id, loan_days=-1)[0][0]
+    current = backend.circulation.reserve([copy_id], member_id=members[1], staff_id=staff_id)[0]
+    assert backend.circulation.expire() == 1
+    assert value(backend, "SELECT expired FROM reservation WHERE reservation_id = ?", (overdue,)) == 1
+    assert queue(backend, copy_id) == [(current[0], 1)]
+    backend.circulation.return_reservations([current[0]])
+    assert status(backend, copy_id) == 'Available'
+
+
+def test_report_refresh_matches_history(backend):
+    # Summaries after an incremental refresh equal both a full rebuild and the raw tables
+    copy_id, = idle_copies(backend, 1)
+    members, staff_id = people(backend)
+    reports = backend.reports
+    reports.refresh()
+    reservation_id = backend.circulation.reserve([copy_id], member_id=members[2], staff_id=staff_id)[0][0]
+    backend.circulation.return_reservations([reservation_id])
+    full, changed = reports.refresh()
+    assert not full and changed >= 1
+    incremental = [reports.report(title, 365) for title, _, _ in REPORTS]
+    assert value(backend, "SELECT SUM(reservations) FROM report_daily_staff") == value(backend, "SELECT COUNT(*) FROM reservation")
+    assert value(backend, "SELECT SUM(copies) FROM report_daily_staff") == value(backend, "SELECT COUNT(*) FROM reservation_details")
+    assert value(backend, "SELECT COALESCE(SUM(reservations), 0) FROM report_open_by_due_date") == \
+        value(backend, "SELECT COUNT(*) FROM reservation WHERE returned_at IS NULL")
+    assert value(backend, "SELECT SUM(loans) FROM report_copy_usage") == value(backend, "SELECT COUNT(*) FROM reservation_details")
+    reports.refresh(full=True)
+    assert incremental == [reports.report(title, 365) for title, _, _ in REPORTS]
@@ -0,0 +1,149 @@
+import itertools
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from reports import REPORTS
+
+VIEWS = ['book', 'member', 'book_copy', 'reservation', 'description']
+
+# One term per search kind: prefix, full-text fallback, numeric ID, full ISBN, no match
+SEARCHES = [('member', 'Smi'), ('author', 'Mar'), ('book', 'the'), ('book_copy', '42'),
+            ('book', '0195153448'), ('member', 'zzzz')]
+
+PAGES_SCROLLED = 10
+BULK_ROWS = 500
+
+# The stand-in runs Python copies of the circulation and report refresh procedures (migrations
+# 004 and 005), so these groups time the copy, not the T-SQL; test_circulation_parity.py holds
+# both to the same scenarios. The report reads run the shared REPORTS queries.
+CIRCULATION_GROUP = 'reservations (stand-in copy of migration 004)'
+REFRESH_GROUP = 'report refresh (stand-in copy of migration 005)'
+
+
+@pytest.mark.benchmark(group='view load')
+@pytest.mark.parametrize('table_name', VIEWS)
+def test_view_load(benchmark, library, table_name):
+    pager = benchmark(library.open_view, table_name)
+    assert pager.total == library.db.query(f"SELECT COUNT(*) FROM {table_name}")[1][0][0]
+
+
+@pytest.mark.benchmark(group='search')
+@pytest.mark.parametrize('table_name,term', SEARCHES)
+def test_search(benchmark, library, table_name, term):
+    pager = benchmark(library.open_view, table_name, term)
+    assert pager.total is not None
+
+
+@pytest.mark.benchmark(group='paging')
+@pytest.mark.parametrize('table_name', ['book', 'reservation_details'])
+def test_paging(benchmark, library, table_name):
+    # A fresh view scrolled page by page: OFFSET for the first page, keyset seeks after it
+    def scroll():
+        pager = library.pager(table_name)
+        return [len(pager.rows(start, pager.page_size))
+                for start in range(0, PAGES_SCROLLED * pager.page_size, pager.page_size)]
+    sizes = benchmark(scroll)
+    assert sum(sizes) == min(PAGES_SCROLLED * library.pager(table_name).page_size, library.pager(table_name).count())
+
+
+@pytest.mark.benchmark(group='bulk write')
+def test_bulk_insert(benchmark, library):
+    batches = itertools.count()
+    def insert():
+        batch = next(batches)
+        library.insert_rows('author', ['name'], [[f"Benchmark author {batch}-{i}"] for i in range(BULK_ROWS)])
+    benchmark(insert)
+
+
+@pytest.mark.benchmark(group='bulk write')
+def test_bulk_update(benchmark, library):
+    # Bulk Update on a page of copies, re-reading the changed rows like the grid does
+    _, rows = library.db.query(f"SELECT copy_id FROM book_copy ORDER BY copy_id LIMIT {BULK_ROWS}")
+    pager = library.pager('book_copy')
+    updated = benchmark(library.update_rows, 'book_copy', ['condition'], [['Good', copy_id] for copy_id, in rows], pager)
+    assert len(updated) == len(rows)
+
+
+def circulation_fixture(library, copies):
+    _, available = library.db.query(f"SELECT copy_id FROM book_copy WHERE status = 'Available' ORDER BY copy_id LIMIT {copies}")
+    _, members = library.db.query("SELECT member_id FROM member ORDER BY member_id LIMIT 50")
+    _, staff = library.db.query("SELECT staff_id FROM staff ORDER BY staff_id LIMIT 1")
+    return [row[0] for row in available], [row[0] for row in members], staff[0][0]
+
+
+@pytest.mark.benchmark(group=CIRCULATION_GROUP)
+def test_reserve_and_return(benchmark, library):
+    # Reserve three copies for a member, then return them: queue positions, copy status and promotion
+    copies, members, staff_id = circulation_fixture(library, 60)
+    cycle = itertools.count()
+    def reserve_and_return():
+        n = next(cycle)
+        picked = [copies[(n * 3 + i) % len(copies)] for i in range(3)]
+        rows = library.circulation.reserve(picked, member_id=members[n % len(members)], staff_id=staff_id)
+        return library.circulation.return_reservations([rows[0][0]])
+    assert benchmark(reserve_and_return) == 1
+
+
+@pytest.mark.benchmark(group=CIRCULATION_GROUP)
+def test_expire_overdue(benchmark, library):
+    # Each round expires a fresh batch of 100 overdue holds; overdue data already loaded is expired first
+    copies, members, staff_id = circulation_fixture(library, 100)
+    library.circulation.expire()
+    def overdue():
+        for n, copy_id in enumerate(copies):
+            library.circulation.reserve([copy_id], member_id=members[n % len(members)], staff_id=staff_id, loan_days=-1)
+        return (), {}
+    expired = benchmark.pedantic(library.circulation.expire, setup=overdue, rounds=5)
+    assert expired == len(copies)
+
+
+@pytest.mark.benchmark(group=REFRESH_GROUP)
+def test_report_refresh(benchmark, library):
+    # Each round folds one new, returned reservation into the summaries: the cost follows
+    # the change, not the history. The result must match a full rebuild.
+    copies, members, staff_id = circulation_fixture(library, 30)
+    library.reports.refresh(full=True)
+    cycle = itertools.count()
+    def changed():
+        n = next(cycle)
+        rows = library.circulation.reserve([copies[n % len(copies)]], member_id=members[n % len(members)], staff_id=staff_id)
+        library.circulation.return_reservations([rows[0][0]])
+        return (), {}
+    assert benchmark.pedantic(library.reports.refresh, setup=changed, rounds=10) == (False, 1)
+    incremental = [library.reports.report(title, 365) for title, _, _ in REPORTS]
+    library.reports.refresh(full=True)
+    assert incremental == [library.reports.report(title, 365) for title, _, _ in REPORTS]
+
+
+@pytest.mark.benchmark(group='reports')
+@pytest.mark.parametrize('title', [title for title, _, _ in REPORTS])
+def test_report(benchmark, library, title):
+    library.reports.refresh()
+    columns, _ = benchmark(library.reports.report, title, 365)
+    assert columns
+
+
+@pytest.mark.benchmark(group='export')
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_export(benchmark, library, tmp_path, extension):
+    # Whole reservation_details table streamed to disk in EXPORT_BATCH fetchmany batches
+    if extension == '.parquet':
+        pytest.importorskip('pyarrow')
+    written = benchmark(library.export, 'reservation_details', str(tmp_path / f"reservation_details{extension}"))
+    assert written == library.db.query("SELECT COUNT(*) FROM reservation_details")[1][0][0]
+
+
+def test_parquet_keeps_decimals(library, tmp_path):
+    # NUMERIC(10,2) prices come back as exact decimals at the column's scale, not doubles
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'book_copy.parquet')
+    library.export('book_copy', path)
+    table = pq.read_table(path)
+    assert table.schema.field('price').type == pa.decimal128(10, 2)
+    _, prices = library.db.query("SELECT price FROM book_copy ORDER BY copy_id")
+    expected = [None if price is None else Decimal(str(price)).quantize(Decimal('0.01')) for price, in prices]
+    assert table.column('price').to_pylist() == expected
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('tkinter')
+
+GUI_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'GUI')
+
+# What the app does before it can draw the login window, in a fresh interpreter each round
+IMPORT_APP = "import sys, library_app; print('pyodbc' in sys.modules)"
+
+
+@pytest.mark.benchmark(group='startup')
+def test_import_app(benchmark):
+    # The database driver must not be on the path to the first paint
+    def start():
+        return subprocess.run([sys.executable, '-c', IMPORT_APP], cwd=GUI_DIR, capture_output=True, text=True, check=True)
+    result = benchmark.pedantic(start, rounds=5)
+    assert result.stdout.strip() == 'False'